@@ -0,0 +1,301 @@
+import json
+import time
+from typing import List, Optional
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, tuple_
+from backend.app.db import AsyncSessionLocal, get_session
+from backend.app.downsampling import aggregate, lttb, rebucket
+from backend.app.models import ROLLUP_MODELS, WeatherData
+from backend.app.partitions import rollup_retained_since
+from backend.app.state import latest_state, row_to_dict
+
+HISTORY_DEFAULT_RANGE_S = 86400
+HISTORY_DEFAULT_LIMIT = 500
+HISTORY_MAX_LIMIT = 5000
+HISTORY_STREAM_CHUNK_ROWS = 1000
+SERIES_DEFAULT_POINTS = 500
+SERIES_MAX_POINTS = 5000
+SERIES_METRICS = ("temperature", "humidity")
+
+router = APIRouter(prefix="/api/weather", tags=["weather"])
+
+
+def _resolve_city(city: str) -> str:
+    """
+    Maps a requested city name onto the name stored in weather_data.
+
+    History queries compare the stored name exactly so they can use the
+    (city, timestamp) index; the latest state knows the stored spelling.
+
+    Raises:
+        HTTPException: 404 if no data has been ingested for the city
+    """
+    row = latest_state.get(city)
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"No weather data for {city}")
+    return row["city"]
+
+
+def _time_range(start: Optional[int], end: Optional[int]):
+    end = end if end is not None else int(time.time())
+    start = start if start is not None else end - HISTORY_DEFAULT_RANGE_S
+    if start > end:
+        raise HTTPException(status_code=422, detail="start must not be after end")
+    return start, end
+
+
+def _encode_cursor(record: WeatherData) -> str:
+    return f"{record.timestamp}:{record.id}"
+
+
+def _decode_cursor(cursor: str):
+    try:
+        timestamp, record_id = cursor.split(":")
+        return int(timestamp), int(record_id)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid cursor")
+
+
+def _history_query(city: str, start: int, end: int):
+    return (
+        select(WeatherData)
+        .where(WeatherData.city == city, WeatherData.timestamp >= start, WeatherData.timestamp <= end)
+        .order_by(WeatherData.timestamp, WeatherData.id)
+    )
+
+
+@router.get("/latest")
+async def get_latest_snapshot(city: Optional[List[str]] = Query(None)):
+    """
+    Returns the latest weather of several cities in one response.
+
+    Served from the in-memory latest state without touching the database.
+
+    Args:
+        city (list): City names (?city=Kyiv&city=Lviv); every known city if omitted
+
+    Returns:
+        dict: {"items": [...]} ordered by city; unknown cities are left out
+    """
+    return {"items": latest_state.snapshot(city)}
+
+
+@router.get("/latest/{city}")
+async def get_latest(city: str):
+    """
+    Returns the latest weather of a city from the in-memory latest state.
+
+    Raises:
+        HTTPException: 404 if no data has been ingested for the city
+    """
+    row = latest_state.get(city)
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"No weather data for {city}")
+    return row
+
+
+@router.get("/history/{city}")
+async def get_history(
+    city: str,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    limit: int = Query(HISTORY_DEFAULT_LIMIT, ge=1, le=HISTORY_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    session=Depends(get_session),
+):
+    """
+    Returns one page of a city's history, oldest first.
+
+    Pages are delimited by keyset pagination on (timestamp, id), so fetching a
+    page costs the same index range scan however deep into the range it is.
+
+    Args:
+        city (str): City name
+        start (int): Unix time to start at, defaults to one day before end
+        end (int): Unix time to end at (inclusive), defaults to now
+        limit (int): Maximum number of rows in the page
+        cursor (str): next_cursor of the previous page
+
+    Returns:
+        dict: {"items": [...], "next_cursor": str or None}
+    """
+    stored_city = _resolve_city(city)
+    start, end = _time_range(start, end)
+    query = _history_query(stored_city, start, end)
+    if cursor:
+        query = query.where(tuple_(WeatherData.timestamp, WeatherData.id) > _decode_cursor(cursor))
+    records = list(await session.scalars(query.limit(limit + 1)))
+    next_cursor = _encode_cursor(records[limit - 1]) if len(records) > limit else None
+    return {"items": [row_to_dict(record) for record in records[:limit]], "next_cursor": next_cursor}
+
+
+async def _stream_history(city: str, start: int, end: int):
+    async with AsyncSessionLocal() as session:
+        result = await session.stream_scalars(
+            _history_query(city, start, end).execution_options(yield_per=HISTORY_STREAM_CHUNK_ROWS)
+        )
+        yield "["
+        separator = ""
+        async for records in result.partitions():
+            chunk = ",".join(json.dumps(row_to_dict(record), ensure_ascii=False) for record in records)
+            yield separator + chunk
+            separator = ","
+        yield "]"
+
+
+@router.get("/history/{city}/stream")
+async def stream_history(city: str, start: Optional[int] = None, end: Optional[int] = None):
+    """
+    Streams a city's whole history over a time range as one JSON array.
+
+    Rows are read through a server-side cursor and written in chunks of
+    HISTORY_STREAM_CHUNK_ROWS, so memory stays flat for ranges of any size.
+
+    Args:
+        city (str): City name
+        start (int): Unix time to start at, defaults to one day before end
+        end (int): Unix time to end at (inclusive), defaults to now
+
+    Returns:
+        StreamingResponse: application/json array of rows, oldest first
+    """
+    stored_city = _resolve_city(city)
+    start, end = _time_range(start, end)
+    return StreamingResponse(_stream_history(stored_city, start, end), media_type="application/json")
+
+
+def _retained_models(start: int, now: int = None) -> tuple:
+    """
+    Returns the rollup models, widest first, that still hold the buckets from
+    `start` on, given the horizons apply_retention deletes them at.
+    """
+    retained = []
+    for model in ROLLUP_MODELS:
+        since = rollup_retained_since(model.__tablename__, now)
+        if since is None or start >= since:
+            retained.append(model)
+    return tuple(retained)
+
+
+def _auto_resolution(start: int, end: int, points: int, models: tuple = ROLLUP_MODELS) -> int:
+    """
+    Picks the bucket width giving at most `points` buckets, rounded up to a
+    multiple of the widest rollup it spans so it can be served from that table.
+    Only `models` are considered, so the width is never finer than the
+    narrowest of them.
+    """
+    resolution = max(-(-(end - start) // points), models[-1].bucket_s if models else 1)
+    for model in models:
+        if resolution >= model.bucket_s:
+            return -(-resolution // model.bucket_s) * model.bucket_s
+    return resolution
+
+
+def _rollup_model(resolution: int, models: tuple = ROLLUP_MODELS):
+    for model in models:
+        if resolution % model.bucket_s == 0:
+            return model
+    return None
+
+
+async def _load_columns(session, query) -> list:
+    """
+    Runs a query and returns its result as one numpy array per selected column.
+    """
+    rows = (await session.execute(query)).all()
+    if not rows:
+        return [np.empty(0) for _ in query.selected_columns]
+    return [np.asarray(column) for column in zip(*rows)]
+
+
+def _series_payload(buckets: dict) -> dict:
+    return {field: buckets[field].tolist() for field in ("min", "max", "avg")}
+
+
+@router.get("/series/{city}")
+async def get_series(
+    city: str,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    mode: str = Query("buckets", pattern="^(buckets|lttb)$"),
+    resolution: Optional[int] = Query(None, ge=1),
+    points: int = Query(SERIES_DEFAULT_POINTS, ge=3, le=SERIES_MAX_POINTS),
+    session=Depends(get_session),
+):
+    """
+    Returns a city's temperature and humidity downsampled for charting.
+
+    In "buckets" mode the range is split into fixed-width buckets with the
+    min/max/avg of each. When the width is a multiple of a rollup resolution
+    the buckets are merged from the widest such rollup table instead of the
+    raw rows, among the tables retention still keeps back to `start`. In
+    "lttb" mode the raw series is reduced to `points` points that keep its
+    visual shape. All arithmetic runs on columnar numpy arrays.
+
+    Args:
+        city (str): City name
+        start (int): Unix time to start at, defaults to one day before end
+        end (int): Unix time to end at (inclusive), defaults to now
+        mode (str): "buckets" or "lttb"
+        resolution (int): Bucket width in seconds, derived from points if omitted
+        points (int): Target number of buckets or points
+
+    Returns:
+        dict: Columnar series, e.g. {"timestamp": [...], "temperature": {"min": [...], ...}}
+    """
+    stored_city = _resolve_city(city)
+    start, end = _time_range(start, end)
+
+    if mode == "lttb":
+        timestamps, *metrics = await _load_columns(session, (
+            select(WeatherData.timestamp, WeatherData.temperature, WeatherData.humidity)
+            .where(WeatherData.city == stored_city, WeatherData.timestamp >= start, WeatherData.timestamp <= end)
+            .order_by(WeatherData.timestamp)
+        ))
+        series = {}
+        for name, values in zip(SERIES_METRICS, metrics):
+            keep = lttb(timestamps, values, points)
+            series[name] = {"timestamp": timestamps[keep].tolist(), "value": values[keep].tolist()}
+        return {"city": stored_city, "mode": mode, **series}
+
+    # Rollups retention has already thinned out past `start` are skipped;
+    # raw rows that old are compacted to hourly ones but still there
+    models = _retained_models(start)
+    resolution = resolution or _auto_resolution(start, end, points, models)
+    model = _rollup_model(resolution, models)
+    if model is None:
+        timestamps, *metrics = await _load_columns(session, (
+            select(WeatherData.timestamp, WeatherData.temperature, WeatherData.humidity)
+            .where(WeatherData.city == stored_city, WeatherData.timestamp >= start, WeatherData.timestamp <= end)
+            .order_by(WeatherData.timestamp)
+        ))
+        buckets = [aggregate(timestamps, values, resolution) for values in metrics]
+        source = WeatherData.__tablename__
+    else:
+        columns = await _load_columns(session, (
+            select(
+                model.bucket, model.samples,
+                model.temperature_min, model.temperature_max, model.temperature_sum,
+                model.humidity_min, model.humidity_max, model.humidity_sum,
+            )
+            .where(model.city == stored_city, model.bucket >= start - start % model.bucket_s, model.bucket <= end)
+            .order_by(model.bucket)
+        ))
+        timestamps, samples = columns[:2]
+        buckets = [
+            rebucket(timestamps, *columns[2 + 3 * index:5 + 3 * index], samples, resolution)
+            for index in range(len(SERIES_METRICS))
+        ]
+        source = model.__tablename__
+
+    return {
+        "city": stored_city,
+        "mode": mode,
+        "resolution": resolution,
+        "source": source,
+        "timestamp": buckets[0]["timestamp"].tolist(),
+        "count": buckets[0]["count"].tolist(),
+        **{name: _series_payload(metric) for name, metric in zip(SERIES_METRICS, buckets)},
+    }
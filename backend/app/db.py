@@ -1,11 +1,84 @@
 from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import declarative_base, sessionmaker
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+
+_url = make_url(DATABASE_URL)
+_pool_options = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+}
+
+if _url.get_backend_name() == "sqlite":
+    # SQLite is supported for benchmarks and local experiments only: no
+    # partitioning, and a single writer at a time.
+    async_engine = create_async_engine(
+        _url.set(drivername="sqlite+aiosqlite"), query_cache_size=DB_STATEMENT_CACHE_SIZE,
+    )
+    engine = create_engine(_url.set(drivername="sqlite"))
+else:
+    # The async engine is shared by the Kafka consumer and the API endpoints.
+    # asyncpg keeps a per-connection cache of prepared statements on top of
+    # SQLAlchemy's own compiled-statement cache.
+    async_engine = create_async_engine(
+        _url.set(drivername="postgresql+asyncpg"),
+        connect_args={"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE},
+        query_cache_size=DB_STATEMENT_CACHE_SIZE,
+        **_pool_options,
+    )
+    # Synchronous engine for tooling (migrations, scripts) that cannot run on asyncio.
+    engine = create_engine(_url.set(drivername="postgresql+psycopg2"), **_pool_options)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
+
+
+async def get_session():
+    """
+    FastAPI dependency yielding an AsyncSession from the shared pool.
+
+    Yields:
+        AsyncSession: A session that is closed when the request finishes
+    """
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+def dialect_insert(session, model):
+    """
+    Returns an INSERT construct for the session's database supporting ON CONFLICT clauses.
+
+    Args:
+        session (AsyncSession): The session the statement will run on
+        model: The mapped class to insert into
+
+    Returns:
+        Insert: A PostgreSQL or SQLite INSERT construct
+    """
+    if session.bind.dialect.name == "sqlite":
+        return sqlite_insert(model)
+    return postgresql_insert(model)
+
+
+async def dispose_engines():
+    """
+    Closes every pooled connection of both engines.
+    """
+    await async_engine.dispose()
+    engine.dispose()
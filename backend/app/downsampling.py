@@ -0,0 +1,93 @@
+import numpy as np
+
+
+def rebucket(timestamps: np.ndarray, mins: np.ndarray, maxs: np.ndarray, sums: np.ndarray,
+             counts: np.ndarray, bucket_s: int) -> dict:
+    """
+    Merges partial aggregates into fixed-width time buckets.
+
+    Inputs are columnar arrays sorted by timestamp, e.g. rollup rows or raw
+    readings (where min = max = sum = value and count = 1). Bucket boundaries
+    are found with one vectorized comparison and every aggregate is a single
+    ufunc.reduceat over those boundaries.
+
+    Args:
+        timestamps (np.ndarray): Start of each input bucket, ascending
+        mins (np.ndarray): Minimum of each input bucket
+        maxs (np.ndarray): Maximum of each input bucket
+        sums (np.ndarray): Sum of each input bucket
+        counts (np.ndarray): Number of readings in each input bucket
+        bucket_s (int): Width of the output buckets in seconds
+
+    Returns:
+        dict: Arrays "timestamp", "min", "max", "avg" and "count", one entry per non-empty bucket
+    """
+    if len(timestamps) == 0:
+        empty = np.empty(0)
+        return {"timestamp": empty.astype(np.int64), "min": empty, "max": empty, "avg": empty,
+                "count": empty.astype(np.int64)}
+    buckets = timestamps // bucket_s * bucket_s
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    count = np.add.reduceat(counts, starts)
+    return {
+        "timestamp": buckets[starts],
+        "min": np.minimum.reduceat(mins, starts),
+        "max": np.maximum.reduceat(maxs, starts),
+        "avg": np.add.reduceat(sums, starts) / count,
+        "count": count,
+    }
+
+
+def aggregate(timestamps: np.ndarray, values: np.ndarray, bucket_s: int) -> dict:
+    """
+    Computes min/max/avg of raw readings per fixed-width time bucket.
+
+    Args:
+        timestamps (np.ndarray): Reading times, ascending
+        values (np.ndarray): Reading values
+        bucket_s (int): Width of the buckets in seconds
+
+    Returns:
+        dict: See rebucket
+    """
+    values = values.astype(np.float64)
+    return rebucket(timestamps, values, values, values, np.ones(len(values), dtype=np.int64), bucket_s)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Picks the points that best preserve the shape of a series (Largest-Triangle-Three-Buckets).
+
+    The first and last points are always kept. The points in between are split
+    into threshold - 2 buckets, and from each bucket the point forming the
+    largest triangle with the previously kept point and the average of the next
+    bucket is kept. Each bucket is one vectorized area computation.
+
+    Args:
+        x (np.ndarray): Point times, ascending
+        y (np.ndarray): Point values
+        threshold (int): Number of points to keep
+
+    Returns:
+        np.ndarray: Indices of the kept points, ascending
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    every = (n - 2) / (threshold - 2)
+    edges = np.floor(np.arange(threshold - 1) * every).astype(np.int64) + 1
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        low, high = edges[i], edges[i + 1]
+        next_low, next_high = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x = x[next_low:next_high].mean()
+        avg_y = y[next_low:next_high].mean()
+        area = np.abs((x[a] - avg_x) * (y[low:high] - y[a]) - (x[a] - x[low:high]) * (avg_y - y[a]))
+        a = low + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from backend.app.db import DATABASE_URL, async_engine
+
+logger = logging.getLogger(__name__)
+
+# Workers uvicorn starts when --workers is not given
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# "postgres": relay updates between workers with LISTEN/NOTIFY; "none": single worker.
+# On by default only when WEB_CONCURRENCY runs several workers
+BACKEND_FANOUT = os.getenv("BACKEND_FANOUT", "postgres" if WEB_CONCURRENCY > 1 else "none")
+FANOUT_CHANNEL = os.getenv("FANOUT_CHANNEL", "weather_updates")
+FANOUT_RECONNECT_S = float(os.getenv("FANOUT_RECONNECT_S", "2"))
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+_MAX_PAYLOAD_BYTES = 7900
+
+
+def encode_notifications(origin: str, rows: list):
+    """
+    Packs rows into as few NOTIFY payloads as fit under the size limit.
+
+    Args:
+        origin (str): Id of the publishing worker
+        rows (list): Column value dicts
+
+    Yields:
+        str: JSON payloads of the form {"o": origin, "r": [row, ...]}
+    """
+    prefix = json.dumps({"o": origin})[:-1] + ', "r": ['
+    chunk, size = [], len(prefix) + 2
+    for row in rows:
+        encoded = json.dumps(row, ensure_ascii=False)
+        length = len(encoded.encode("utf-8")) + 1
+        if chunk and size + length > _MAX_PAYLOAD_BYTES:
+            yield prefix + ",".join(chunk) + "]}"
+            chunk, size = [], len(prefix) + 2
+        chunk.append(encoded)
+        size += length
+    if chunk:
+        yield prefix + ",".join(chunk) + "]}"
+
+
+class FanoutBus:
+    """
+    Relays ingested rows between backend workers over Postgres LISTEN/NOTIFY.
+
+    Workers share one Kafka consumer group, so each one ingests only the
+    partitions assigned to it. Every worker publishes the rows it ingested on
+    FANOUT_CHANNEL and hands the rows published by the others to its local
+    handlers (latest state, WebSocket hub), so a client sees every city
+    whichever worker it is connected to. Delivery is best effort: a worker that
+    misses notifications while reconnecting catches up with the next update of
+    each city.
+    """
+
+    def __init__(self, channel: str = FANOUT_CHANNEL):
+        self.channel = channel
+        self.worker_id = uuid.uuid4().hex[:12]
+        self.received = 0
+        self._handlers = []
+        self._task = None
+        self._dispatches = set()
+
+    @property
+    def enabled(self) -> bool:
+        return BACKEND_FANOUT == "postgres"
+
+    async def start(self, handlers: list):
+        """
+        Starts listening for rows published by other workers.
+
+        Args:
+            handlers (list): Coroutine functions receiving each list of relayed rows
+        """
+        self._handlers = handlers
+        self._task = asyncio.create_task(self._listen(), name="fanout-listener")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._dispatches:
+            await asyncio.gather(*self._dispatches, return_exceptions=True)
+
+    async def publish(self, rows: list):
+        """
+        Sends ingested rows to the other workers.
+
+        Used as a listener sink of the Kafka consumer.
+
+        Args:
+            rows (list): Column value dicts of the ingested batch
+        """
+        async with async_engine.connect() as conn:
+            for payload in encode_notifications(self.worker_id, rows):
+                await conn.execute(text("SELECT pg_notify(:channel, :payload)"),
+                                   {"channel": self.channel, "payload": payload})
+            await conn.commit()
+
+    async def _listen(self):
+        # LISTEN needs a connection of its own for as long as the worker runs,
+        # so it is opened outside the SQLAlchemy pool
+        dsn = make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(self.channel, self._on_notification)
+                logger.info("Worker %s listening for fan-out on %s", self.worker_id, self.channel)
+                await closed.wait()
+                logger.warning("Fan-out connection lost, reconnecting")
+            except asyncio.CancelledError:
+                if connection is not None:
+                    await connection.close()
+                raise
+            except Exception:
+                logger.exception("Fan-out listener failed, reconnecting")
+            await asyncio.sleep(FANOUT_RECONNECT_S)
+
+    def _on_notification(self, connection, pid: int, channel: str, payload: str):
+        try:
+            message = json.loads(payload)
+            if message["o"] == self.worker_id:
+                return
+            rows = message["r"]
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring malformed fan-out notification")
+            return
+        self.received += len(rows)
+        # Referenced until done, so a dispatch is not garbage-collected mid-flight
+        task = asyncio.get_running_loop().create_task(self._dispatch(rows))
+        self._dispatches.add(task)
+        task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, rows: list):
+        for handler in self._handlers:
+            try:
+                await handler(rows)
+            except Exception:
+                logger.exception("Fan-out handler failed")
+
+
+fanout_bus = FanoutBus()
@@ -1,39 +1,536 @@
-from kafka import KafkaConsumer
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
+from aiokafka.errors import KafkaError
+import asyncio
 import json
-from backend.app.db import SessionLocal
+import logging
+import os
+import time
+from sqlalchemy.exc import DataError, IntegrityError
+from common.metrics import counter, gauge, histogram
+from common.weather_record import decode_record
+from backend.app.db import AsyncSessionLocal, dialect_insert
+from backend.app.fanout import fanout_bus
 from backend.app.models import WeatherData
+from backend.app.rollups import update_rollups
+from backend.app.state import latest_state
+from backend.app.websocket import hub
 
-consumer = KafkaConsumer(
-    "weather-topic",  # Назва топіка
-    bootstrap_servers=["kafka:9092"],
-    group_id="weather-group",
-    value_deserializer=lambda m: json.loads(m.decode('utf-8'))
-)
+logger = logging.getLogger(__name__)
 
-def consume_weather_data():
+KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092")
+KAFKA_TOPIC = os.getenv("KAFKA_TOPIC", "weather-topic")
+KAFKA_GROUP_ID = os.getenv("KAFKA_GROUP_ID", "weather-group")
+KAFKA_BATCH_SIZE = int(os.getenv("KAFKA_BATCH_SIZE", "500"))
+KAFKA_BATCH_LINGER_MS = int(os.getenv("KAFKA_BATCH_LINGER_MS", "200"))
+KAFKA_MAX_PENDING_BATCHES = int(os.getenv("KAFKA_MAX_PENDING_BATCHES", "4"))
+KAFKA_SHUTDOWN_TIMEOUT_S = float(os.getenv("KAFKA_SHUTDOWN_TIMEOUT_S", "10"))
+KAFKA_STATS_INTERVAL_S = float(os.getenv("KAFKA_STATS_INTERVAL_S", "30"))
+# Records that cannot be ingested are published here; empty to only log them
+KAFKA_DLQ_TOPIC = os.getenv("KAFKA_DLQ_TOPIC", "weather-topic-dlq")
+
+RECORDS_CONSUMED = counter("kafka_records_consumed_total", "Records fetched from the weather topic")
+RECORDS_DEAD_LETTERED = counter("kafka_records_dead_lettered_total", "Records sent to the dead-letter queue")
+ROWS_STORED = counter("weather_rows_stored_total", "Rows handed to the database, by outcome", ("outcome",))
+DB_WRITE_SECONDS = histogram("weather_db_write_seconds", "Time to store a batch with its rollups")
+SINK_SECONDS = histogram("kafka_sink_seconds", "Time a sink takes to handle a batch", ("sink",))
+SINK_QUEUE_BATCHES = gauge("kafka_sink_queue_batches", "Batches waiting for a sink", ("sink",))
+BATCH_LATENCY_SECONDS = histogram("kafka_batch_latency_seconds", "Time from fetching a batch to committing its offsets")
+CONSUMER_LAG = gauge("kafka_consumer_lag", "Records behind the end of the partition after the last commit",
+                     ("partition",))
+CONSUMER_PAUSES = counter("kafka_consumer_pauses_total", "Times fetching was paused by a saturated sink")
+SINK_BATCHES_DROPPED = counter("kafka_sink_batches_dropped_total", "Batches a full listener sink did not take",
+                               ("sink",))
+COMMIT_FAILURES = counter("kafka_commit_failures_total", "Offset commits that failed")
+
+
+def _to_row(weather_info: dict) -> dict:
+    """
+    Maps a deserialized Kafka message onto WeatherData column values.
+
+    Args:
+        weather_info (dict): The decoded message payload
+
+    Returns:
+        dict: Column values ready for a bulk insert
+    """
+    return {
+        "city": weather_info["city"],
+        "temperature": weather_info["temperature"],
+        "humidity": weather_info["humidity"],
+        "weather_description": weather_info.get("weather_description"),
+        "timestamp": weather_info["timestamp"],
+    }
+
+
+async def write_batch(session, rows: list) -> list:
+    """
+    Writes a batch of rows with a single multi-row INSERT, merges the new ones
+    into the rollup tables and commits both in one transaction.
+
+    Rows whose (city, timestamp) is already stored are skipped by
+    ON CONFLICT DO NOTHING, so re-reading the topic never duplicates data.
+
+    Args:
+        session (AsyncSession): The session to write with
+        rows (list): Column value dicts produced by _to_row
+
+    Returns:
+        list: The rows actually inserted, in their original order
+    """
+    if not rows:
+        return []
+    statement = (
+        dialect_insert(session, WeatherData)
+        .on_conflict_do_nothing(index_elements=[WeatherData.city, WeatherData.timestamp])
+        .returning(WeatherData.city, WeatherData.timestamp)
+    )
+    inserted = set((await session.execute(statement, rows)).all())
+    new_rows = []
+    for row in rows:
+        key = (row["city"], row["timestamp"])
+        if key in inserted:
+            inserted.discard(key)
+            new_rows.append(row)
+    if new_rows:
+        await update_rollups(session, new_rows)
+    await session.commit()
+    return new_rows
+
+
+async def store_rows(rows: list) -> list:
+    """
+    Durably stores a batch of rows in the database.
+
+    Uses a session from the shared async pool, so the INSERT never blocks
+    the event loop that serves WebSocket clients.
+
+    Args:
+        rows (list): Column value dicts produced by _to_row
+
+    Returns:
+        list: The rows actually inserted
+    """
+    async with AsyncSessionLocal() as session:
+        return await write_batch(session, rows)
+
+
+class DeadLetterQueue:
+    """
+    Sets aside records that cannot be ingested, so they never stall the consumer.
+
+    Records are published unchanged to KAFKA_DLQ_TOPIC with the reason and
+    their origin in the "error" and "source" headers, from where they can be
+    inspected, fixed and re-published.
+    """
+
+    def __init__(self, topic: str = KAFKA_DLQ_TOPIC):
+        self.topic = topic
+        self.count = 0
+        self._producer = None
+
+    async def start(self):
+        if self.topic:
+            self._producer = AIOKafkaProducer(bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS)
+            await self._producer.start()
+
+    async def stop(self):
+        if self._producer:
+            await self._producer.stop()
+
+    async def send(self, value: bytes, reason: str, source: str):
+        """
+        Publishes a rejected record.
+
+        Args:
+            value (bytes): The record as it was received
+            reason (str): Why it was rejected
+            source (str): Where it came from, e.g. "weather-topic:0:1234"
+        """
+        self.count += 1
+        RECORDS_DEAD_LETTERED.inc()
+        logger.warning("Dead-lettering record from %s: %s", source, reason)
+        if self._producer is None:
+            return
+        try:
+            await self._producer.send(self.topic, value, headers=[
+                ("error", reason.encode("utf-8")),
+                ("source", source.encode("utf-8")),
+            ])
+        except Exception:
+            logger.exception("Could not publish to dead-letter topic %s", self.topic)
+
+
+async def store_or_dead_letter(rows: list, dead_letters: DeadLetterQueue, writer=store_rows) -> list:
     """
-    Consumes weather data from a Kafka topic and stores it in the database.
+    Stores rows with the writer, isolating rows the database rejects.
 
-    This function continuously listens to the 'weather-topic' Kafka topic,
-    deserializes the received messages, and stores the weather data in the database
-    using the WeatherData model.
+    Constraint and data errors are not transient, so retrying the batch would
+    never succeed; the rows are written one by one instead and the offending
+    ones dead-lettered. Other errors propagate to the caller.
 
-    Note:
-        This function runs in an infinite loop until interrupted.
+    Args:
+        rows (list): Column value dicts produced by _to_row
+        dead_letters (DeadLetterQueue): Where rejected rows go
+        writer: Coroutine function that stores a list of rows and returns the rows inserted
+
+    Returns:
+        list: The rows actually inserted
     """
-    db = SessionLocal()
     try:
-        for message in consumer:
-            weather_info = message.value
-
-            weather = WeatherData(
-                city=weather_info["city"],
-                temperature=weather_info["temperature"],
-                humidity=weather_info["humidity"],
-                weather_description=weather_info.get("weather_description"),
-                timestamp=weather_info["timestamp"]
+        return await writer(rows)
+    except (DataError, IntegrityError) as e:
+        logger.warning("Database rejected a batch of %d rows (%s), writing them one by one", len(rows), e.orig)
+    inserted = []
+    for row in rows:
+        try:
+            inserted.extend(await writer([row]))
+        except (DataError, IntegrityError) as e:
+            await dead_letters.send(
+                json.dumps(row, ensure_ascii=False).encode("utf-8"), f"Rejected by the database: {e.orig}", "db",
             )
-            db.add(weather)
-            db.commit()
-    finally:
-        db.close()
+    return inserted
+
+
+class Batch:
+    """
+    A slice of the topic handed to the sinks.
+
+    Attributes:
+        rows (list): Column value dicts, one per valid message
+        offsets (dict): Next offset to commit for every partition in the batch
+        size (int): Number of Kafka messages in the batch, including rejected ones
+        rejected (list): (value, reason, source) of the messages that failed to decode
+        fetched_at (float): Monotonic time the batch was fetched, for latency stats
+    """
+
+    def __init__(self, rows: list, offsets: dict, size: int, rejected: list = None):
+        self.rows = rows
+        self.offsets = offsets
+        self.size = size
+        self.rejected = rejected or []
+        self.fetched_at = time.monotonic()
+
+
+def build_batch(polled: dict) -> Batch:
+    """
+    Decodes fetched messages into a Batch, setting aside the ones that fail validation.
+
+    Args:
+        polled (dict): Messages grouped by TopicPartition, as returned by getmany
+
+    Returns:
+        Batch: The decoded rows, next offsets and rejected messages
+    """
+    rows = []
+    rejected = []
+    offsets = {}
+    size = 0
+    for tp, messages in polled.items():
+        for message in messages:
+            try:
+                rows.append(_to_row(decode_record(message.value)))
+            except (ValueError, KeyError, TypeError) as e:
+                rejected.append((message.value, str(e), f"{tp.topic}:{tp.partition}:{message.offset}"))
+        offsets[tp] = messages[-1].offset + 1
+        size += len(messages)
+    return Batch(rows, offsets, size, rejected)
+
+
+class SinkWorker:
+    """
+    Runs one downstream sink in its own task behind a bounded queue.
+
+    A full queue marks the sink as saturated, which is what the consumer uses to
+    pause fetching. Durable sinks retry a failed batch until it succeeds, so that
+    offsets are never committed past data that was not written. A failure after
+    the handler, in on_done, is logged and the worker moves on to the next batch.
+    """
+
+    def __init__(self, name: str, handler, durable: bool = False, on_done=None,
+                 maxsize: int = KAFKA_MAX_PENDING_BATCHES):
+        """
+        Args:
+            name (str): Sink name used in logs
+            handler: Coroutine function receiving the list of rows of a batch
+            durable (bool): Whether failed batches must be retried instead of dropped
+            on_done: Optional coroutine function called with the Batch and the handler's result once handled
+            maxsize (int): Number of batches that may wait in the queue
+        """
+        self.name = name
+        self.handler = handler
+        self.durable = durable
+        self.on_done = on_done
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self._task = None
+        self._seconds = SINK_SECONDS.labels(name)
+        SINK_QUEUE_BATCHES.labels(name).set_function(self.queue.qsize)
+
+    @property
+    def saturated(self) -> bool:
+        return self.queue.full()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name=f"sink-{self.name}")
+
+    async def put(self, batch: Batch):
+        await self.queue.put(batch)
+
+    def offer(self, batch: Batch) -> bool:
+        """
+        Enqueues a batch without waiting, dropping it if the queue is full.
+
+        Returns:
+            bool: Whether the batch was queued
+        """
+        try:
+            self.queue.put_nowait(batch)
+        except asyncio.QueueFull:
+            SINK_BATCHES_DROPPED.labels(self.name).inc()
+            return False
+        return True
+
+    async def _run(self):
+        while True:
+            batch = await self.queue.get()
+            try:
+                await self._handle(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # The worker must outlive any batch, or the queue fills and fetching blocks for good
+                logger.exception("Sink %s failed to finish a batch of %d rows", self.name, len(batch.rows))
+            finally:
+                self.queue.task_done()
+
+    async def _handle(self, batch: Batch):
+        delay = 0.5
+        while True:
+            try:
+                with self._seconds.time():
+                    result = await self.handler(batch.rows)
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                if not self.durable:
+                    logger.exception("Sink %s failed, dropping batch of %d rows", self.name, len(batch.rows))
+                    return
+                logger.exception("Sink %s failed, retrying in %.1f s", self.name, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+        if self.on_done:
+            await self.on_done(batch, result)
+
+    async def stop(self, timeout: float):
+        """
+        Waits for queued batches to be handled, then cancels the worker task.
+
+        Args:
+            timeout (float): Maximum number of seconds to wait for the queue to drain
+        """
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Sink %s did not drain within %.1f s", self.name, timeout)
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+class WeatherConsumer:
+    """
+    Asynchronous Kafka ingestion engine running on the application's event loop.
+
+    Records are fetched from 'weather-topic' in batches and handed to a durable
+    writer sink. Once the writer has stored a batch, its offsets are committed
+    manually and the rows actually inserted are fanned out to any number of
+    best-effort listener sinks (e.g. WebSocket fan-out); rows skipped as duplicates
+    or dead-lettered never reach them. A listener that falls behind loses batches
+    instead of holding up the writer. When the writer falls behind, the assigned
+    partitions are paused until it catches up.
+
+    Records that fail validation, and rows the database rejects, go to the
+    dead-letter queue instead of stopping the loop or being retried forever.
+    """
+
+    def __init__(self, writer=store_rows, listeners: dict = None, dead_letters: DeadLetterQueue = None,
+                 consumer_factory=AIOKafkaConsumer):
+        """
+        Args:
+            writer: Coroutine function that durably stores a list of rows and returns the rows inserted
+            listeners (dict): Mapping of sink name to coroutine function receiving the inserted rows
+            dead_letters (DeadLetterQueue): Where rejected records go
+            consumer_factory: Called like AIOKafkaConsumer to create the Kafka client
+        """
+        self._consumer = None
+        self._consumer_factory = consumer_factory
+        self._store = writer
+        self._dead_letters = dead_letters or DeadLetterQueue()
+        self._writer = SinkWorker("db", self._write, durable=True, on_done=self._on_stored)
+        self._listeners = [SinkWorker(name, handler) for name, handler in (listeners or {}).items()]
+        self._sinks = [self._writer] + self._listeners
+        self._stopping = asyncio.Event()
+        self._task = None
+        self._rows_total = 0
+        self._duplicates_total = 0
+        self._batches_total = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._window_start = time.monotonic()
+
+    async def start(self):
+        """
+        Connects to Kafka and starts the fetch loop and the sink workers.
+        """
+        self._consumer = self._consumer_factory(
+            KAFKA_TOPIC,
+            bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+            group_id=KAFKA_GROUP_ID,
+            enable_auto_commit=False,
+        )
+        await self._consumer.start()
+        await self._dead_letters.start()
+        for sink in self._sinks:
+            sink.start()
+        self._task = asyncio.create_task(self._run(), name="kafka-consumer")
+        logger.info("Kafka consumer started on %s, topic %s", KAFKA_BOOTSTRAP_SERVERS, KAFKA_TOPIC)
+
+    async def stop(self):
+        """
+        Stops fetching, lets the sinks drain, commits the final offsets and disconnects.
+        """
+        self._stopping.set()
+        if self._task:
+            await self._task
+        for sink in self._sinks:
+            await sink.stop(KAFKA_SHUTDOWN_TIMEOUT_S)
+        if self._consumer:
+            await self._consumer.stop()
+        await self._dead_letters.stop()
+        logger.info("Kafka consumer stopped")
+
+    async def _collect_batch(self) -> dict:
+        """
+        Fetches messages until the batch is full or the linger time runs out.
+
+        Returns:
+            dict: Messages grouped by TopicPartition (may be empty)
+        """
+        batch = {}
+        count = 0
+        deadline = time.monotonic() + KAFKA_BATCH_LINGER_MS / 1000
+        while count < KAFKA_BATCH_SIZE and not self._stopping.is_set():
+            remaining_ms = int((deadline - time.monotonic()) * 1000)
+            if remaining_ms <= 0:
+                break
+            polled = await self._consumer.getmany(timeout_ms=remaining_ms, max_records=KAFKA_BATCH_SIZE - count)
+            for tp, messages in polled.items():
+                batch.setdefault(tp, []).extend(messages)
+                count += len(messages)
+        return batch
+
+    async def _write(self, rows: list) -> list:
+        with DB_WRITE_SECONDS.time():
+            inserted = await store_or_dead_letter(rows, self._dead_letters, self._store)
+        ROWS_STORED.labels("inserted").inc(len(inserted))
+        ROWS_STORED.labels("duplicate").inc(len(rows) - len(inserted))
+        self._duplicates_total += len(rows) - len(inserted)
+        return inserted
+
+    async def _dispatch(self, batch: Batch):
+        paused = ()
+        if self._writer.saturated:
+            paused = self._consumer.assignment()
+            self._consumer.pause(*paused)
+            CONSUMER_PAUSES.inc()
+            logger.warning("Pausing consumption, sink %s is saturated", self._writer.name)
+        try:
+            await self._writer.put(batch)
+        finally:
+            if paused:
+                self._consumer.resume(*paused)
+
+    async def _on_stored(self, batch: Batch, inserted: list):
+        await self._commit(batch)
+        if inserted:
+            stored = Batch(inserted, batch.offsets, len(inserted))
+            for sink in self._listeners:
+                # Listeners are lossy: a slow one must not hold up storing and committing
+                if not sink.offer(stored):
+                    logger.warning("Sink %s is full, dropping %d rows", sink.name, len(inserted))
+
+    async def _commit(self, batch: Batch):
+        try:
+            await self._consumer.commit(batch.offsets)
+        except KafkaError as e:
+            # Typically a rebalance: the partitions moved and their new owner reads the batch
+            # again, skipping the stored rows as duplicates. Later commits supersede this one.
+            COMMIT_FAILURES.inc()
+            logger.warning("Committing offsets of a batch of %d records failed: %s", batch.size, e)
+            return
+        for tp, offset in batch.offsets.items():
+            highwater = self._consumer.highwater(tp)
+            if highwater is not None:
+                CONSUMER_LAG.labels(tp.partition).set(highwater - offset)
+        self._record_stats(batch)
+
+    def _record_stats(self, batch: Batch):
+        latency = time.monotonic() - batch.fetched_at
+        BATCH_LATENCY_SECONDS.observe(latency)
+        self._rows_total += len(batch.rows)
+        self._batches_total += 1
+        self._latency_total += latency
+        self._latency_max = max(self._latency_max, latency)
+
+        elapsed = time.monotonic() - self._window_start
+        if elapsed >= KAFKA_STATS_INTERVAL_S:
+            logger.info(
+                "Ingested %d rows in %d batches: %.1f rows/sec, batch latency avg %.1f ms, max %.1f ms, "
+                "%d duplicates skipped, %d records dead-lettered so far",
+                self._rows_total, self._batches_total, self._rows_total / elapsed,
+                self._latency_total / self._batches_total * 1000, self._latency_max * 1000,
+                self._duplicates_total, self._dead_letters.count,
+            )
+            self._rows_total = self._batches_total = self._duplicates_total = 0
+            self._latency_total = self._latency_max = 0.0
+            self._window_start = time.monotonic()
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                polled = await self._collect_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Kafka fetch failed")
+                await asyncio.sleep(1)
+                continue
+            if not polled:
+                continue
+            batch = build_batch(polled)
+            RECORDS_CONSUMED.inc(batch.size)
+            for value, reason, source in batch.rejected:
+                await self._dead_letters.send(value, reason, source)
+            await self._dispatch(batch)
+
+
+_listeners = {
+    "state": latest_state.apply_rows,
+    "websocket": hub.publish_rows,
+}
+if fanout_bus.enabled:
+    _listeners["fanout"] = fanout_bus.publish
+weather_consumer = WeatherConsumer(listeners=_listeners)
+
+
+async def consume_weather_data():
+    """
+    Starts the module-level WeatherConsumer.
+
+    Consumes weather data from the 'weather-topic' Kafka topic on the running
+    event loop and stores it in the database using the WeatherData model.
+    """
+    await weather_consumer.start()
@@ -1,9 +1,21 @@
-from fastapi import FastAPI, WebSocket
-from backend.app.websocket import websocket_endpoint
 import asyncio
-from backend.app.kafka_consumer import consume_weather_data
+import logging
+from fastapi import FastAPI, Response, WebSocket
+from backend.app.api import router as weather_router
+from backend.app.state import latest_state
+from backend.app.websocket import hub, websocket_endpoint
+from backend.app.kafka_consumer import consume_weather_data, weather_consumer
+from backend.app.db import dispose_engines
+from backend.app.fanout import fanout_bus
+from backend.app.partitions import maintenance_loop
+from common.logging_config import configure_logging
+from common.metrics import CONTENT_TYPE, render as render_metrics
+
+configure_logging("backend")
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
+app.include_router(weather_router)
 
 @app.websocket("/ws")
 async def websocket_route(websocket: WebSocket):
@@ -18,14 +30,50 @@ async def websocket_route(websocket: WebSocket):
     """
     await websocket_endpoint(websocket)
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Exposes the process metrics in the Prometheus text format.
+
+    Each worker reports its own metrics, so scrape every worker.
+    """
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
 @app.on_event("startup")
 async def startup_event():
     """
     FastAPI startup event handler.
 
     This function is executed when the FastAPI application starts.
-    It starts the Kafka consumer in a separate thread to continuously
-    process incoming weather data without blocking the main application.
+    It starts the asynchronous Kafka consumer on the application's event loop
+    to continuously process incoming weather data, and the periodic job that
+    creates upcoming weather_data partitions and compacts or drops old ones.
+    Before consuming, the latest row of every city is loaded from the database
+    into the in-memory latest state and the WebSocket hub, so both serve data
+    right after a restart.
+
+    When several workers run, each consumes its share of the Kafka partitions
+    and the fan-out bus relays the rows ingested by the others, so every
+    WebSocket client receives every update.
+    """
+    app.state.partition_maintenance = asyncio.create_task(maintenance_loop())
+    try:
+        await hub.publish_rows(await latest_state.rebuild())
+    except Exception:
+        logger.exception("Could not rebuild the latest state, it will fill up from Kafka")
+    if fanout_bus.enabled:
+        await fanout_bus.start([latest_state.apply_rows, hub.publish_rows])
+    await consume_weather_data()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    FastAPI shutdown event handler.
+
+    Stops the Kafka consumer, letting in-flight batches finish and committing
+    their offsets, then closes the database connection pools.
     """
-    loop = asyncio.get_event_loop()
-    loop.create_task(asyncio.to_thread(consume_weather_data))
+    app.state.partition_maintenance.cancel()
+    await weather_consumer.stop()
+    await fanout_bus.stop()
+    await dispose_engines()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float
+from sqlalchemy import BigInteger, Column, Index, Integer, Sequence, String, Float
 from backend.app.db import Base
 
 class WeatherData(Base):
@@ -6,18 +6,78 @@ class WeatherData(Base):
     SQLAlchemy model representing weather data in the database.
 
     Attributes:
-        id (int): Primary key for the weather data record
+        id (int): Surrogate key for the weather data record, unique together with timestamp
         city (str): Name of the city for which weather data is recorded
         temperature (float): Temperature in Celsius
         humidity (int): Humidity percentage
         weather_description (str): Text description of the weather conditions
         timestamp (int): Unix timestamp when the weather data was recorded
+
+    The table is range-partitioned by timestamp (see backend.app.partitions), so
+    the primary key has to include the partition key. (city, timestamp) is the
+    natural key of a reading: its unique index makes ingestion idempotent and
+    serves lookups by city and time range. Scans over recent time ranges use
+    the small BRIN index, which suits rows that arrive in timestamp order.
     """
     __tablename__ = "weather_data"
+    __table_args__ = (
+        Index("uq_weather_data_city_timestamp", "city", "timestamp", unique=True),
+        Index("ix_weather_data_timestamp_brin", "timestamp", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(BigInteger, Sequence("weather_data_id_seq"), primary_key=True)
     city = Column(String, nullable=False)
     temperature = Column(Float, nullable=False)
     humidity = Column(Integer, nullable=False)
     weather_description = Column(String, nullable=True)
-    timestamp = Column(Integer, nullable=False)
+    timestamp = Column(Integer, primary_key=True)
+
+
+class WeatherRollupMixin:
+    """
+    Columns of a pre-aggregated weather rollup table.
+
+    Each row summarizes the readings of one city in one time bucket. Sums and
+    counts are stored instead of averages so that rows can be merged
+    incrementally and re-bucketed to any coarser resolution.
+
+    Attributes:
+        city (str): Name of the city
+        bucket (int): Unix timestamp at which the bucket starts
+        samples (int): Number of readings in the bucket
+        temperature_min (float): Lowest temperature in the bucket
+        temperature_max (float): Highest temperature in the bucket
+        temperature_sum (float): Sum of the temperatures in the bucket
+        humidity_min (int): Lowest humidity in the bucket
+        humidity_max (int): Highest humidity in the bucket
+        humidity_sum (int): Sum of the humidities in the bucket
+    """
+    city = Column(String, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    samples = Column(Integer, nullable=False)
+    temperature_min = Column(Float, nullable=False)
+    temperature_max = Column(Float, nullable=False)
+    temperature_sum = Column(Float, nullable=False)
+    humidity_min = Column(Integer, nullable=False)
+    humidity_max = Column(Integer, nullable=False)
+    humidity_sum = Column(BigInteger, nullable=False)
+
+
+class WeatherRollup1m(WeatherRollupMixin, Base):
+    __tablename__ = "weather_rollup_1m"
+    bucket_s = 60
+
+
+class WeatherRollup1h(WeatherRollupMixin, Base):
+    __tablename__ = "weather_rollup_1h"
+    bucket_s = 3600
+
+
+class WeatherRollup1d(WeatherRollupMixin, Base):
+    __tablename__ = "weather_rollup_1d"
+    bucket_s = 86400
+
+
+# Coarsest first, so a resolution is served from the cheapest table that divides it
+ROLLUP_MODELS = (WeatherRollup1d, WeatherRollup1h, WeatherRollup1m)
@@ -0,0 +1,249 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from sqlalchemy import text
+from backend.app.db import async_engine
+from common.logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+WEATHER_PARTITION_DAYS = int(os.getenv("WEATHER_PARTITION_DAYS", "7"))
+WEATHER_PARTITIONS_AHEAD = int(os.getenv("WEATHER_PARTITIONS_AHEAD", "4"))
+# Partitions older than this are compacted to one row per city and hour...
+WEATHER_COMPACT_AFTER_DAYS = int(os.getenv("WEATHER_COMPACT_AFTER_DAYS", "30"))
+# ...and dropped entirely once older than this (0 keeps everything)
+WEATHER_RETENTION_DAYS = int(os.getenv("WEATHER_RETENTION_DAYS", "365"))
+PARTITION_MAINTENANCE_INTERVAL_S = float(os.getenv("PARTITION_MAINTENANCE_INTERVAL_S", "3600"))
+
+PARENT_TABLE = "weather_data"
+# Catches rows outside every partition; created by the 0001 migration
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+_COLUMNS = "id, city, temperature, humidity, weather_description, timestamp"
+COMPACTED_COMMENT = "compacted"
+# Arbitrary constant identifying the maintenance job for pg_advisory_xact_lock
+_MAINTENANCE_LOCK_ID = 7_302_114
+
+_SECONDS_PER_DAY = 86400
+
+# Days each rollup table is kept for: 1 minute buckets until the raw data is
+# compacted to hourly rows, 1 hour buckets until it is dropped. Tables not
+# listed (1 day buckets) are kept forever, as is any table set to 0.
+ROLLUP_RETENTION_DAYS = {
+    "weather_rollup_1m": WEATHER_COMPACT_AFTER_DAYS,
+    "weather_rollup_1h": WEATHER_RETENTION_DAYS,
+}
+
+
+def rollup_retained_since(table: str, now: int = None):
+    """
+    Returns the unix time before which apply_retention deletes the buckets of a rollup table.
+
+    Args:
+        table (str): Name of the rollup table
+        now (int): Unix time to measure from, defaults to now
+
+    Returns:
+        int or None: The horizon, or None if the table keeps all its buckets
+    """
+    days = ROLLUP_RETENTION_DAYS.get(table)
+    if not days:
+        return None
+    return (now or int(time.time())) - days * _SECONDS_PER_DAY
+
+
+def partition_bounds(timestamp: int, days: int = WEATHER_PARTITION_DAYS):
+    """
+    Returns the [start, end) unix time range of the partition holding timestamp.
+
+    Ranges are aligned to multiples of the partition length since the epoch,
+    so every process computes the same boundaries.
+    """
+    width = days * _SECONDS_PER_DAY
+    start = timestamp - timestamp % width
+    return start, start + width
+
+
+def partition_name(start: int) -> str:
+    return f"{PARENT_TABLE}_p{datetime.fromtimestamp(start, timezone.utc):%Y%m%d}"
+
+
+def create_partition_sql(start: int, end: int) -> str:
+    """
+    Returns the DDL creating the partition for [start, end) if it does not exist.
+    """
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(start)} "
+        f"PARTITION OF {PARENT_TABLE} FOR VALUES FROM ({start}) TO ({end})"
+    )
+
+
+def planned_partitions(first: int, last: int, days: int = WEATHER_PARTITION_DAYS):
+    """
+    Yields the (start, end) ranges covering unix times first..last.
+    """
+    start, _ = partition_bounds(first, days)
+    while start <= last:
+        yield start, start + days * _SECONDS_PER_DAY
+        start += days * _SECONDS_PER_DAY
+
+
+_LIST_PARTITIONS_SQL = text("""
+    SELECT child.relname,
+           pg_get_expr(child.relpartbound, child.oid),
+           obj_description(child.oid, 'pg_class')
+    FROM pg_inherits
+    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE parent.relname = :parent
+""")
+
+
+def _parse_bounds(bound: str):
+    # e.g. "FOR VALUES FROM (1700006400) TO (1700611200)"; None for the DEFAULT partition
+    if "FROM (" not in bound:
+        return None
+    start = int(bound.split("FROM (")[1].split(")")[0])
+    end = int(bound.split("TO (")[1].split(")")[0])
+    return start, end
+
+
+async def _relation_exists(conn, name: str) -> bool:
+    return (await conn.execute(text("SELECT to_regclass(CAST(:name AS text))"), {"name": name})).scalar() is not None
+
+
+async def create_partition(conn, start: int, end: int):
+    """
+    Creates the partition for [start, end) unless it exists, taking over the
+    rows the DEFAULT partition caught in that range.
+
+    PostgreSQL refuses to create a partition whose range the DEFAULT partition
+    already holds rows of, which would fail every later maintenance run. The
+    DEFAULT partition is detached for the time of the move and attached again,
+    all in the caller's transaction.
+    """
+    name = partition_name(start)
+    if await _relation_exists(conn, name):
+        return
+    stray = None
+    if await _relation_exists(conn, DEFAULT_PARTITION):
+        stray = (await conn.execute(
+            text(f"SELECT count(*) FROM {DEFAULT_PARTITION} WHERE timestamp >= :start AND timestamp < :end"),
+            {"start": start, "end": end},
+        )).scalar()
+    if not stray:
+        await conn.execute(text(create_partition_sql(start, end)))
+        return
+
+    await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+    await conn.execute(text(create_partition_sql(start, end)))
+    await conn.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= :start AND timestamp < :end
+            RETURNING {_COLUMNS}
+        )
+        INSERT INTO {PARENT_TABLE} ({_COLUMNS}) SELECT {_COLUMNS} FROM moved
+    """), {"start": start, "end": end})
+    await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+    logger.warning("Moved %d rows from %s into the new partition %s", stray, DEFAULT_PARTITION, name)
+
+
+async def ensure_partitions(conn, now: int = None):
+    """
+    Creates the partitions for the current period and WEATHER_PARTITIONS_AHEAD periods ahead.
+    """
+    now = now or int(time.time())
+    horizon = now + WEATHER_PARTITIONS_AHEAD * WEATHER_PARTITION_DAYS * _SECONDS_PER_DAY
+    for start, end in planned_partitions(now, horizon):
+        await create_partition(conn, start, end)
+
+
+async def compact_partition(conn, name: str):
+    """
+    Replaces the raw rows of a partition by one averaged row per city and hour.
+    """
+    await conn.execute(text(f"""
+        CREATE TEMP TABLE weather_compacted ON COMMIT DROP AS
+        SELECT city,
+               avg(temperature) AS temperature,
+               round(avg(humidity))::integer AS humidity,
+               (array_agg(weather_description ORDER BY timestamp DESC))[1] AS weather_description,
+               (timestamp / 3600) * 3600 AS timestamp
+        FROM {name}
+        GROUP BY city, timestamp / 3600
+    """))
+    await conn.execute(text(f"DELETE FROM {name}"))
+    await conn.execute(text(f"""
+        INSERT INTO {PARENT_TABLE} (city, temperature, humidity, weather_description, timestamp)
+        SELECT city, temperature, humidity, weather_description, timestamp FROM weather_compacted
+    """))
+    await conn.execute(text(f"COMMENT ON TABLE {name} IS '{COMPACTED_COMMENT}'"))
+
+
+async def apply_retention(conn, now: int = None):
+    """
+    Compacts partitions past WEATHER_COMPACT_AFTER_DAYS and drops those past WEATHER_RETENTION_DAYS.
+
+    The rollup tables follow the same horizons: 1 minute buckets are deleted once
+    the raw data is compacted to hourly rows, 1 hour buckets once it is dropped,
+    and 1 day buckets are kept (see ROLLUP_RETENTION_DAYS).
+    """
+    now = now or int(time.time())
+    compact_before = now - WEATHER_COMPACT_AFTER_DAYS * _SECONDS_PER_DAY
+    drop_before = now - WEATHER_RETENTION_DAYS * _SECONDS_PER_DAY
+
+    partitions = (await conn.execute(_LIST_PARTITIONS_SQL, {"parent": PARENT_TABLE})).all()
+    for name, bound, comment in partitions:
+        bounds = _parse_bounds(bound)
+        if bounds is None:
+            continue
+        _, end = bounds
+        if WEATHER_RETENTION_DAYS and end <= drop_before:
+            await conn.execute(text(f"DROP TABLE {name}"))
+            logger.info("Dropped partition %s", name)
+        elif WEATHER_COMPACT_AFTER_DAYS and end <= compact_before and comment != COMPACTED_COMMENT:
+            await compact_partition(conn, name)
+            logger.info("Compacted partition %s", name)
+
+    for table in ROLLUP_RETENTION_DAYS:
+        before = rollup_retained_since(table, now)
+        if before is not None:
+            await conn.execute(text(f"DELETE FROM {table} WHERE bucket < :before"), {"before": before})
+
+
+async def run_maintenance(engine=async_engine, now: int = None):
+    """
+    Runs one round of partition maintenance in a single transaction.
+
+    An advisory lock makes concurrent runs (several backend workers, cron) a no-op.
+
+    Args:
+        engine (AsyncEngine): The engine to run on, defaults to the application's
+        now (int): Unix time to maintain the partitions for, defaults to now
+    """
+    async with engine.begin() as conn:
+        locked = (await conn.execute(text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": _MAINTENANCE_LOCK_ID})).scalar()
+        if not locked:
+            return
+        await ensure_partitions(conn, now)
+        await apply_retention(conn, now)
+
+
+async def maintenance_loop():
+    """
+    Runs partition maintenance every PARTITION_MAINTENANCE_INTERVAL_S seconds.
+    """
+    while True:
+        try:
+            await run_maintenance()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Partition maintenance failed")
+        await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL_S)
+
+
+if __name__ == "__main__":
+    configure_logging("partitions")
+    asyncio.run(run_maintenance())
@@ -0,0 +1,194 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from aiokafka import AIOKafkaConsumer, TopicPartition
+from backend.app.db import dispose_engines
+from common.logging_config import configure_logging
+from backend.app.kafka_consumer import (
+    KAFKA_BOOTSTRAP_SERVERS, KAFKA_TOPIC, DeadLetterQueue, build_batch, store_or_dead_letter,
+)
+
+logger = logging.getLogger(__name__)
+
+REPLAY_BATCH_SIZE = int(os.getenv("REPLAY_BATCH_SIZE", "5000"))
+# Database writes running at once; each partition has one writer at most
+REPLAY_CONCURRENCY = int(os.getenv("REPLAY_CONCURRENCY", "4"))
+REPLAY_FETCH_MAX_BYTES = int(os.getenv("REPLAY_FETCH_MAX_BYTES", str(64 * 1024 * 1024)))
+REPLAY_STATS_INTERVAL_S = float(os.getenv("REPLAY_STATS_INTERVAL_S", "5"))
+
+
+def parse_time(value: str) -> int:
+    """
+    Parses a unix timestamp or an ISO 8601 date into milliseconds since the epoch.
+
+    Dates without a timezone are taken as UTC.
+    """
+    try:
+        return int(float(value) * 1000)
+    except ValueError:
+        moment = datetime.fromisoformat(value)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return int(moment.timestamp() * 1000)
+
+
+class Replayer:
+    """
+    Re-ingests a range of 'weather-topic' into the database as fast as possible.
+
+    Runs outside the consumer group, so it neither commits offsets nor takes
+    partitions from the live consumer, and relies on idempotent writes: rows
+    already stored are skipped. Every partition is fetched in large batches
+    into its own small queue and written by its own task, so fetching and
+    writing overlap and partitions progress in parallel, with at most
+    REPLAY_CONCURRENCY bulk INSERTs in flight.
+    """
+
+    def __init__(self, batch_size: int = REPLAY_BATCH_SIZE, concurrency: int = REPLAY_CONCURRENCY):
+        self.batch_size = batch_size
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._dead_letters = DeadLetterQueue()
+        self._consumer = None
+        self._failure = None
+        self.read = self.inserted = self.skipped = 0
+
+    async def run(self, partitions: list = None, from_offset: int = None, from_ms: int = None, to_ms: int = None):
+        """
+        Replays the selected partitions from the start position up to the
+        offsets they had when the replay started.
+
+        Args:
+            partitions (list): Partition numbers, all partitions of the topic by default
+            from_offset (int): Offset to start every partition at
+            from_ms (int): Start at the first record at or after this time (ms since the epoch)
+            to_ms (int): Stop at the first record after this time (ms since the epoch)
+        """
+        self._consumer = AIOKafkaConsumer(
+            bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+            group_id=None,
+            enable_auto_commit=False,
+            max_partition_fetch_bytes=REPLAY_FETCH_MAX_BYTES,
+            fetch_max_bytes=REPLAY_FETCH_MAX_BYTES,
+        )
+        await self._consumer.start()
+        await self._dead_letters.start()
+        try:
+            await self._consumer.topics()
+            numbers = partitions or sorted(self._consumer.partitions_for_topic(KAFKA_TOPIC) or ())
+            tps = [TopicPartition(KAFKA_TOPIC, number) for number in numbers]
+            self._consumer.assign(tps)
+            ends = await self._consumer.end_offsets(tps)
+            await self._seek(tps, ends, from_offset, from_ms)
+            await self._replay(tps, ends, to_ms)
+        finally:
+            await self._consumer.stop()
+            await self._dead_letters.stop()
+
+    async def _seek(self, tps: list, ends: dict, from_offset: int, from_ms: int):
+        if from_ms is not None:
+            found = await self._consumer.offsets_for_times({tp: from_ms for tp in tps})
+            for tp in tps:
+                # No record at or after from_ms: nothing to replay in this partition
+                self._consumer.seek(tp, found[tp].offset if found[tp] else ends[tp])
+        elif from_offset is not None:
+            for tp in tps:
+                self._consumer.seek(tp, from_offset)
+        else:
+            await self._consumer.seek_to_beginning(*tps)
+
+    async def _replay(self, tps: list, ends: dict, to_ms: int):
+        remaining = set()
+        for tp in tps:
+            if await self._consumer.position(tp) < ends[tp]:
+                remaining.add(tp)
+        queues = {tp: asyncio.Queue(maxsize=2) for tp in remaining}
+        writers = [asyncio.create_task(self._write(tp, queue)) for tp, queue in queues.items()]
+        logger.info("Replaying %d partitions of %s", len(remaining), KAFKA_TOPIC)
+
+        started = last_report = time.monotonic()
+        try:
+            while remaining:
+                if self._failure:
+                    raise self._failure
+                polled = await self._consumer.getmany(*remaining, timeout_ms=1000, max_records=self.batch_size)
+                for tp, messages in polled.items():
+                    done = messages[-1].offset + 1 >= ends[tp]
+                    messages = [message for message in messages if message.offset < ends[tp]]
+                    if to_ms is not None and messages and messages[-1].timestamp > to_ms:
+                        messages = [message for message in messages if message.timestamp <= to_ms]
+                        done = True
+                    if messages:
+                        self.read += len(messages)
+                        await queues[tp].put(messages)
+                    if done:
+                        remaining.discard(tp)
+                        self._consumer.pause(tp)
+                if time.monotonic() - last_report >= REPLAY_STATS_INTERVAL_S:
+                    last_report = time.monotonic()
+                    self._report(started, len(remaining))
+            for queue in queues.values():
+                await queue.put(None)
+            await asyncio.gather(*writers)
+            if self._failure:
+                raise self._failure
+        finally:
+            for writer in writers:
+                writer.cancel()
+        self._report(started, 0)
+
+    async def _write(self, tp: TopicPartition, queue: asyncio.Queue):
+        try:
+            while True:
+                messages = await queue.get()
+                if messages is None:
+                    return
+                batch = build_batch({tp: messages})
+                for value, reason, source in batch.rejected:
+                    await self._dead_letters.send(value, reason, source)
+                async with self._semaphore:
+                    inserted = await store_or_dead_letter(batch.rows, self._dead_letters)
+                self.inserted += len(inserted)
+                self.skipped += len(batch.rows) - len(inserted)
+        except Exception as e:
+            # Surface the error in the fetch loop and keep draining so it is not blocked on put()
+            logger.error("Writing partition %d failed: %s", tp.partition, e)
+            self._failure = self._failure or e
+            while await queue.get() is not None:
+                pass
+
+    def _report(self, started: float, partitions_left: int):
+        elapsed = max(time.monotonic() - started, 1e-9)
+        logger.info(
+            "Read %d records (%.0f/s), inserted %d, skipped %d already stored, dead-lettered %d; %d partitions left",
+            self.read, self.read / elapsed, self.inserted, self.skipped, self._dead_letters.count, partitions_left,
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description=f"Replay {KAFKA_TOPIC} into the database. Records already stored are skipped, "
+                    "so any range can be replayed safely while the backend is running.",
+    )
+    start = parser.add_mutually_exclusive_group()
+    start.add_argument("--from-offset", type=int, help="Offset to start every partition at")
+    start.add_argument("--from-time", type=parse_time, help="Unix time or ISO 8601 date to start at")
+    parser.add_argument("--to-time", type=parse_time, help="Unix time or ISO 8601 date to stop at")
+    parser.add_argument("--partitions", type=lambda value: [int(p) for p in value.split(",")],
+                        help="Comma-separated partition numbers, all by default")
+    parser.add_argument("--batch-size", type=int, default=REPLAY_BATCH_SIZE, help="Records per bulk INSERT")
+    parser.add_argument("--concurrency", type=int, default=REPLAY_CONCURRENCY, help="Bulk INSERTs in flight")
+    args = parser.parse_args()
+
+    replayer = Replayer(batch_size=args.batch_size, concurrency=args.concurrency)
+    try:
+        await replayer.run(args.partitions, args.from_offset, args.from_time, args.to_time)
+    finally:
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    configure_logging("replay")
+    asyncio.run(main())
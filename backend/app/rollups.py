@@ -0,0 +1,72 @@
+from sqlalchemy import func
+from backend.app.db import dialect_insert
+from backend.app.models import ROLLUP_MODELS
+
+
+def aggregate_rows(rows: list, bucket_s: int) -> list:
+    """
+    Folds a batch of weather rows into rollup rows of one resolution.
+
+    Args:
+        rows (list): Column value dicts as produced by the Kafka consumer
+        bucket_s (int): Width of the rollup buckets in seconds
+
+    Returns:
+        list: Rollup column value dicts, ordered by (city, bucket)
+    """
+    buckets = {}
+    for row in rows:
+        key = (row["city"], row["timestamp"] // bucket_s * bucket_s)
+        temperature, humidity = row["temperature"], row["humidity"]
+        rollup = buckets.get(key)
+        if rollup is None:
+            buckets[key] = {
+                "city": key[0], "bucket": key[1], "samples": 1,
+                "temperature_min": temperature, "temperature_max": temperature, "temperature_sum": temperature,
+                "humidity_min": humidity, "humidity_max": humidity, "humidity_sum": humidity,
+            }
+            continue
+        rollup["samples"] += 1
+        rollup["temperature_min"] = min(rollup["temperature_min"], temperature)
+        rollup["temperature_max"] = max(rollup["temperature_max"], temperature)
+        rollup["temperature_sum"] += temperature
+        rollup["humidity_min"] = min(rollup["humidity_min"], humidity)
+        rollup["humidity_max"] = max(rollup["humidity_max"], humidity)
+        rollup["humidity_sum"] += humidity
+    # A stable order makes concurrent writers lock rollup rows in the same order
+    return [buckets[key] for key in sorted(buckets)]
+
+
+def _merge_statement(session, model):
+    statement = dialect_insert(session, model)
+    excluded = statement.excluded
+    # SQLite spells LEAST/GREATEST as the two-argument forms of min/max
+    least, greatest = (func.min, func.max) if session.bind.dialect.name == "sqlite" else (func.least, func.greatest)
+    return statement.on_conflict_do_update(
+        index_elements=[model.city, model.bucket],
+        set_={
+            "samples": model.samples + excluded.samples,
+            "temperature_min": least(model.temperature_min, excluded.temperature_min),
+            "temperature_max": greatest(model.temperature_max, excluded.temperature_max),
+            "temperature_sum": model.temperature_sum + excluded.temperature_sum,
+            "humidity_min": least(model.humidity_min, excluded.humidity_min),
+            "humidity_max": greatest(model.humidity_max, excluded.humidity_max),
+            "humidity_sum": model.humidity_sum + excluded.humidity_sum,
+        },
+    )
+
+
+async def update_rollups(session, rows: list):
+    """
+    Merges a batch of weather rows into every rollup table.
+
+    Runs in the caller's transaction, so the rollups commit together with the
+    raw rows they were computed from. Callers must pass only rows that were
+    actually inserted, or replayed messages would be counted twice.
+
+    Args:
+        session (AsyncSession): The session the raw rows are written with
+        rows (list): Column value dicts as produced by the Kafka consumer
+    """
+    for model in ROLLUP_MODELS:
+        await session.execute(_merge_statement(session, model), aggregate_rows(rows, model.bucket_s))
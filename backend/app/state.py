@@ -0,0 +1,105 @@
+import logging
+from sqlalchemy import select
+from backend.app.db import AsyncSessionLocal
+from backend.app.models import WeatherData
+
+logger = logging.getLogger(__name__)
+
+
+def city_key(city: str) -> str:
+    return city.strip().casefold()
+
+
+def row_to_dict(record: WeatherData) -> dict:
+    return {
+        "city": record.city,
+        "temperature": record.temperature,
+        "humidity": record.humidity,
+        "weather_description": record.weather_description,
+        "timestamp": record.timestamp,
+    }
+
+
+class LatestState:
+    """
+    In-memory table of the latest weather row of every city.
+
+    The Kafka consumer feeds it as a listener sink, so "latest" reads never
+    touch the database. Rows are keyed by the casefolded city name and only
+    replace the current one when they are newer, which makes the table
+    indifferent to redelivered or out-of-order messages.
+    """
+
+    def __init__(self):
+        self._rows = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, city: str):
+        """
+        Returns the latest row of a city.
+
+        Args:
+            city (str): City name, in any case
+
+        Returns:
+            dict or None: The row, None if the city has never been seen
+        """
+        return self._rows.get(city_key(city))
+
+    def snapshot(self, cities: list = None) -> list:
+        """
+        Returns the latest rows of the given cities, or of every city.
+
+        Args:
+            cities (list): City names; unknown ones are left out
+
+        Returns:
+            list: Rows ordered by city
+        """
+        if cities is None:
+            rows = self._rows.values()
+        else:
+            rows = filter(None, (self._rows.get(city_key(city)) for city in cities))
+        return sorted(rows, key=lambda row: row["city"])
+
+    def apply(self, rows: list):
+        for row in rows:
+            key = city_key(row["city"])
+            current = self._rows.get(key)
+            if current is None or row["timestamp"] >= current["timestamp"]:
+                self._rows[key] = row
+
+    async def apply_rows(self, rows: list):
+        """
+        Listener sink of the Kafka consumer.
+
+        Args:
+            rows (list): Column value dicts of the ingested batch
+        """
+        self.apply(rows)
+
+    async def rebuild(self) -> list:
+        """
+        Loads the latest row of every city with one DISTINCT ON query.
+
+        The query walks the (city, timestamp) index of each partition instead of
+        sorting the table.
+
+        Returns:
+            list: The loaded rows
+        """
+        query = (
+            select(WeatherData)
+            .distinct(WeatherData.city)
+            .order_by(WeatherData.city, WeatherData.timestamp.desc())
+        )
+        async with AsyncSessionLocal() as session:
+            rows = [row_to_dict(record) for record in (await session.scalars(query))]
+        self.apply(rows)
+        logger.info("Latest state rebuilt for %d cities", len(self._rows))
+        return rows
+
+
+latest_state = LatestState()
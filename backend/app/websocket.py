@@ -1,6 +1,359 @@
 from fastapi import WebSocket
+from collections import OrderedDict
+import asyncio
+import json
+import logging
+import os
+from common.metrics import counter, gauge, histogram
+
+logger = logging.getLogger(__name__)
+
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))
+WS_SEND_TIMEOUT_S = float(os.getenv("WS_SEND_TIMEOUT_S", "5"))
+# "skip": discard the oldest queued update so the client jumps to the latest one
+# "drop": disconnect clients whose send queue overflows
+WS_SLOW_CLIENT_POLICY = os.getenv("WS_SLOW_CLIENT_POLICY", "skip")
+# Maximum number of updates per second a client receives for any one city;
+# everything in between is coalesced into the newest value.
+WS_MAX_UPDATES_PER_SEC = float(os.getenv("WS_MAX_UPDATES_PER_SEC", "2"))
+# Number of recent versions kept per city to compute deltas against
+WS_DELTA_HISTORY = int(os.getenv("WS_DELTA_HISTORY", "8"))
+
+ALL_CITIES = "*"
+
+WS_CLIENTS = gauge("ws_clients", "Connected WebSocket clients")
+WS_MESSAGES_SENT = counter("ws_messages_sent_total", "Messages sent to WebSocket clients")
+WS_MESSAGES_SKIPPED = counter("ws_messages_skipped_total", "Queued messages discarded for slow clients")
+WS_CLIENTS_DROPPED = counter("ws_clients_dropped_total", "Clients disconnected by the server", ("reason",))
+WS_SEND_SECONDS = histogram("ws_send_seconds", "Time to send one message to a client")
+WS_BROADCAST_SECONDS = histogram("ws_broadcast_seconds", "Time to record ingested rows and notify their subscribers")
+
+
+def _city_key(city: str) -> str:
+    return city.strip().casefold()
+
+
+class CityState:
+    """
+    Latest value of one city together with the recent versions needed for deltas.
+
+    Attributes:
+        seq (int): Version of the latest row
+        versions (OrderedDict): Recent rows keyed by version, oldest first
+        encoded (dict): Serialized update for the latest version keyed by the
+                        client's base version, shared by all clients at that base
+    """
+
+    def __init__(self):
+        self.seq = 0
+        self.versions = OrderedDict()
+        self.encoded = {}
+
+    def update(self, seq: int, row: dict):
+        self.seq = seq
+        self.versions[seq] = row
+        while len(self.versions) > WS_DELTA_HISTORY:
+            self.versions.popitem(last=False)
+        self.encoded.clear()
+
+    def encode(self, base_seq):
+        """
+        Returns the serialized update bringing a client from base_seq to the latest version.
+
+        A snapshot is sent when the client has no base or its base is too old,
+        otherwise only the fields that changed since the base.
+
+        Args:
+            base_seq (int or None): The version the client last received
+
+        Returns:
+            str: The JSON message
+        """
+        payload = self.encoded.get(base_seq)
+        if payload is not None:
+            return payload
+
+        row = self.versions[self.seq]
+        base = self.versions.get(base_seq) if base_seq is not None else None
+        if base is None:
+            message = {"type": "snapshot", "city": row["city"], "data": row}
+        else:
+            changed = {field: value for field, value in row.items() if base.get(field) != value}
+            message = {"type": "delta", "city": row["city"], "data": changed}
+        payload = json.dumps(message, ensure_ascii=False)
+        self.encoded[base_seq] = payload
+        return payload
+
+
+class ClientConnection:
+    """
+    A connected WebSocket client with its own subscriptions and writer task.
+
+    City updates only mark the city as dirty; the writer task sends the newest
+    value of every dirty city at most WS_MAX_UPDATES_PER_SEC times per second,
+    so a slow client coalesces updates instead of delaying anyone else.
+    Other messages go through a bounded send queue.
+    """
+
+    def __init__(self, websocket: WebSocket, hub: "BroadcastHub"):
+        self.websocket = websocket
+        self.hub = hub
+        self.cities = {ALL_CITIES}
+        self.queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+        self.skipped = 0
+        self._dirty = {}
+        self._sent = {}
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._writer())
+
+    def offer(self, payload: str) -> bool:
+        """
+        Enqueues an already serialized message without waiting.
+
+        Args:
+            payload (str): The message to send
+
+        Returns:
+            bool: False if the client overflowed and must be disconnected
+        """
+        if self.queue.full():
+            if WS_SLOW_CLIENT_POLICY == "drop":
+                return False
+            self.queue.get_nowait()
+            self.skipped += 1
+            WS_MESSAGES_SKIPPED.inc()
+        self.queue.put_nowait(payload)
+        self._wake.set()
+        return True
+
+    def mark(self, key: str):
+        """
+        Schedules the latest value of a city for delivery.
+
+        Args:
+            key (str): The normalized city key
+        """
+        self._dirty[key] = None
+        self._wake.set()
+
+    def forget(self, key: str):
+        self._dirty.pop(key, None)
+        self._sent.pop(key, None)
+
+    def forget_unsubscribed(self):
+        """
+        Forgets the delivery state of every city the client is no longer subscribed to.
+
+        Needed once "*" is dropped: the cities received through it are not in
+        client.cities, and a later subscription to one must start from a snapshot.
+        """
+        for key in (self._dirty.keys() | self._sent.keys()) - self.cities:
+            self.forget(key)
+
+    async def _send(self, payload: str):
+        with WS_SEND_SECONDS.time():
+            await asyncio.wait_for(self.websocket.send_text(payload), WS_SEND_TIMEOUT_S)
+        WS_MESSAGES_SENT.inc()
+
+    async def _writer(self):
+        interval = 1 / WS_MAX_UPDATES_PER_SEC if WS_MAX_UPDATES_PER_SEC > 0 else 0
+        try:
+            while True:
+                await self._wake.wait()
+                self._wake.clear()
+                while not self.queue.empty():
+                    await self._send(self.queue.get_nowait())
+
+                keys = list(self._dirty)
+                self._dirty.clear()
+                for key in keys:
+                    state = self.hub.cities.get(key)
+                    if state is None or self._sent.get(key) == state.seq:
+                        continue
+                    seq = state.seq
+                    await self._send(state.encode(self._sent.get(key)))
+                    self._sent[key] = seq
+                if keys and interval:
+                    await asyncio.sleep(interval)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info("Dropping WebSocket client after send failure: %s", e)
+            WS_CLIENTS_DROPPED.labels("send_failed").inc()
+            # Closed first, so the endpoint's reader loop ends too; disconnect() cancels this task
+            await _close_quietly(self.websocket)
+            self.hub.disconnect(self.websocket)
+
+    def close(self):
+        self._task.cancel()
+
+
+class BroadcastHub:
+    """
+    Fan-out hub delivering weather updates to the WebSocket clients subscribed to them.
+
+    Membership is a dict keyed by WebSocket and subscriptions are indexed by city,
+    so joining, leaving and routing an update are all O(1) per interested client.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._subscribers = {ALL_CITIES: set()}
+        self._seq = 0
+        self.cities = {}
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def connect(self, websocket: WebSocket) -> ClientConnection:
+        client = ClientConnection(websocket, self)
+        self._clients[websocket] = client
+        self._subscribers[ALL_CITIES].add(client)
+        return client
+
+    def disconnect(self, websocket: WebSocket):
+        client = self._clients.pop(websocket, None)
+        if client:
+            for key in client.cities:
+                self._unindex(key, client)
+            client.close()
+            if client.skipped:
+                logger.info("WebSocket client left after skipping %d stale updates", client.skipped)
+
+    def _unindex(self, key: str, client: ClientConnection):
+        subscribers = self._subscribers.get(key)
+        if subscribers is not None:
+            subscribers.discard(client)
+            if not subscribers and key != ALL_CITIES:
+                del self._subscribers[key]
+
+    def subscribe(self, client: ClientConnection, cities: list):
+        """
+        Subscribes a client to cities and schedules a snapshot of each.
+
+        The first explicit subscription replaces the default of receiving every city.
+
+        Args:
+            client (ClientConnection): The subscribing client; ignored if already disconnected
+            cities (list): City names, or "*" for all cities
+        """
+        if self._clients.get(client.websocket) is not client:
+            return
+        keys = {ALL_CITIES if city == ALL_CITIES else _city_key(city) for city in cities}
+        replaces_all = ALL_CITIES in client.cities and ALL_CITIES not in keys
+        for key in keys - client.cities:
+            client.cities.add(key)
+            self._subscribers.setdefault(key, set()).add(client)
+        if replaces_all:
+            # After adding the new cities, so the client keeps their delta base
+            self.unsubscribe(client, [ALL_CITIES])
+        for key in (self.cities if ALL_CITIES in keys else keys):
+            if key in self.cities:
+                client.mark(key)
+
+    def unsubscribe(self, client: ClientConnection, cities: list):
+        """
+        Removes cities from a client's subscriptions.
+
+        Args:
+            client (ClientConnection): The client
+            cities (list): City names, or "*" to stop receiving every city
+        """
+        if self._clients.get(client.websocket) is not client:
+            return
+        for city in cities:
+            key = ALL_CITIES if city == ALL_CITIES else _city_key(city)
+            if key in client.cities:
+                client.cities.discard(key)
+                self._unindex(key, client)
+                if key == ALL_CITIES:
+                    client.forget_unsubscribed()
+                else:
+                    client.forget(key)
+
+    def publish(self, message: str):
+        """
+        Queues a serialized message for every connected client.
+
+        Args:
+            message (str): The message to broadcast, serialized once by the caller
+        """
+        overflowed = [ws for ws, client in self._clients.items() if not client.offer(message)]
+        for websocket in overflowed:
+            logger.warning("Disconnecting slow WebSocket client")
+            WS_CLIENTS_DROPPED.labels("overflow").inc()
+            self.disconnect(websocket)
+            asyncio.create_task(_close_quietly(websocket))
+
+    @WS_BROADCAST_SECONDS.time()
+    async def publish_rows(self, rows: list):
+        """
+        Records ingested weather rows and notifies the clients subscribed to their cities.
+
+        Used as a listener sink of the Kafka consumer. Serialization is deferred to the
+        client writers and shared between clients, so each update is encoded once per
+        distinct base version rather than once per client.
+
+        Args:
+            rows (list): Column value dicts of the ingested batch
+        """
+        touched = set()
+        for row in rows:
+            key = _city_key(row["city"])
+            state = self.cities.get(key)
+            if state is None:
+                state = self.cities[key] = CityState()
+            self._seq += 1
+            state.update(self._seq, row)
+            touched.add(key)
+
+        for key in touched:
+            for client in self._subscribers.get(key, ()):
+                client.mark(key)
+            for client in self._subscribers[ALL_CITIES]:
+                client.mark(key)
+
+
+async def _close_quietly(websocket: WebSocket):
+    try:
+        await asyncio.wait_for(websocket.close(), WS_SEND_TIMEOUT_S)
+    except Exception:
+        pass
+
+
+hub = BroadcastHub()
+WS_CLIENTS.set_function(lambda: len(hub))
+
+
+def _handle_client_message(client: ClientConnection, text: str):
+    """
+    Applies a subscription command sent by a client.
+
+    Supported commands:
+        {"action": "subscribe", "cities": ["Kyiv", "Lviv"]}
+        {"action": "unsubscribe", "cities": ["Lviv"]}
+
+    Args:
+        client (ClientConnection): The sending client
+        text (str): The raw message
+    """
+    try:
+        command = json.loads(text)
+        action = command["action"]
+        cities = command["cities"]
+        if not isinstance(cities, list) or not all(isinstance(city, str) for city in cities):
+            raise ValueError("cities must be a list of strings")
+    except (ValueError, KeyError, TypeError) as e:
+        client.offer(json.dumps({"type": "error", "message": f"Invalid command: {e}"}))
+        return
+
+    if action == "subscribe":
+        hub.subscribe(client, cities)
+    elif action == "unsubscribe":
+        hub.unsubscribe(client, cities)
+    else:
+        client.offer(json.dumps({"type": "error", "message": f"Unknown action: {action}"}))
 
-connected_clients = []
 
 async def websocket_endpoint(websocket: WebSocket):
     """
@@ -8,30 +361,31 @@ async def websocket_endpoint(websocket: WebSocket):
 
     This function:
     1. Accepts the WebSocket connection
-    2. Adds the client to the list of connected clients
-    3. Keeps the connection alive by waiting for messages
-    4. Removes the client when the connection is closed
+    2. Registers the client with the broadcast hub (subscribed to all cities)
+    3. Applies subscribe/unsubscribe commands sent by the client
+    4. Unregisters the client when the connection is closed
 
     Args:
         websocket (WebSocket): The WebSocket connection object
     """
     await websocket.accept()
-    connected_clients.append(websocket)
+    client = hub.connect(websocket)
     try:
         while True:
-            await websocket.receive_text()
-    except:
-        connected_clients.remove(websocket)
+            _handle_client_message(client, await websocket.receive_text())
+    except Exception:
+        pass
+    finally:
+        hub.disconnect(websocket)
 
 async def broadcast_message(message: str):
     """
     Broadcasts a message to all connected WebSocket clients.
 
-    This function sends the provided message to every client in the
-    connected_clients list.
+    The message is queued on every client's send queue and delivered by
+    the per-client writer tasks, so slow clients do not block the caller.
 
     Args:
         message (str): The message to broadcast to all connected clients
     """
-    for client in connected_clients:
-        await client.send_text(message)
+    hub.publish(message)
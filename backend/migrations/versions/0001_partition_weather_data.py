@@ -0,0 +1,98 @@
+"""Time-series layout for weather_data
+
+Creates weather_data as a table range-partitioned by timestamp, with a
+composite (city, timestamp) index and a BRIN index on timestamp, and the
+partitions from the oldest existing row up to WEATHER_PARTITIONS_AHEAD periods
+ahead. A weather_data table left by earlier versions (plain table, index on id
+only) is migrated into the new layout.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+import time
+from alembic import op
+import sqlalchemy as sa
+from backend.app.partitions import (
+    WEATHER_PARTITION_DAYS, WEATHER_PARTITIONS_AHEAD, create_partition_sql, planned_partitions,
+)
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+_COLUMNS = "id, city, temperature, humidity, weather_description, timestamp"
+
+
+def _legacy_table_exists(conn) -> bool:
+    return conn.execute(sa.text(
+        "SELECT relkind FROM pg_class WHERE relname = 'weather_data' AND relkind = 'r'"
+    )).first() is not None
+
+
+def upgrade():
+    conn = op.get_bind()
+    legacy = _legacy_table_exists(conn)
+    if legacy:
+        op.execute("ALTER TABLE weather_data RENAME TO weather_data_legacy")
+        op.execute("ALTER TABLE weather_data_legacy RENAME CONSTRAINT weather_data_pkey TO weather_data_legacy_pkey")
+        op.execute("ALTER SEQUENCE IF EXISTS weather_data_id_seq RENAME TO weather_data_legacy_id_seq")
+        op.execute("DROP INDEX IF EXISTS ix_weather_data_id")
+
+    op.execute("CREATE SEQUENCE weather_data_id_seq AS bigint")
+    op.execute("""
+        CREATE TABLE weather_data (
+            id bigint NOT NULL DEFAULT nextval('weather_data_id_seq'),
+            city varchar NOT NULL,
+            temperature double precision NOT NULL,
+            humidity integer NOT NULL,
+            weather_description varchar,
+            timestamp integer NOT NULL,
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    op.execute("ALTER SEQUENCE weather_data_id_seq OWNED BY weather_data.id")
+    op.execute("CREATE INDEX ix_weather_data_city_timestamp ON weather_data (city, timestamp)")
+    op.execute("CREATE INDEX ix_weather_data_timestamp_brin ON weather_data USING brin (timestamp)")
+    # Catches rows outside every partition (clock skew, bogus timestamps) instead of failing the insert
+    op.execute("CREATE TABLE weather_data_default PARTITION OF weather_data DEFAULT")
+
+    now = int(time.time())
+    first = now
+    if legacy:
+        oldest = conn.execute(sa.text("SELECT min(timestamp) FROM weather_data_legacy")).scalar()
+        if oldest is not None:
+            first = min(oldest, now)
+    horizon = now + WEATHER_PARTITIONS_AHEAD * WEATHER_PARTITION_DAYS * 86400
+    for start, end in planned_partitions(first, horizon):
+        op.execute(create_partition_sql(start, end))
+
+    if legacy:
+        op.execute(f"INSERT INTO weather_data ({_COLUMNS}) SELECT {_COLUMNS} FROM weather_data_legacy ORDER BY timestamp")
+        op.execute("SELECT setval('weather_data_id_seq', coalesce((SELECT max(id) FROM weather_data), 0) + 1, false)")
+        op.execute("DROP TABLE weather_data_legacy")
+    op.execute("ANALYZE weather_data")
+
+
+def downgrade():
+    op.execute("ALTER TABLE weather_data RENAME TO weather_data_partitioned")
+    op.execute("ALTER TABLE weather_data_partitioned RENAME CONSTRAINT weather_data_pkey TO weather_data_partitioned_pkey")
+    op.execute("ALTER SEQUENCE weather_data_id_seq RENAME TO weather_data_partitioned_id_seq")
+    op.execute("""
+        CREATE TABLE weather_data (
+            id serial PRIMARY KEY,
+            city varchar NOT NULL,
+            temperature double precision NOT NULL,
+            humidity integer NOT NULL,
+            weather_description varchar,
+            timestamp integer NOT NULL
+        )
+    """)
+    op.execute("CREATE INDEX ix_weather_data_id ON weather_data (id)")
+    op.execute(
+        f"INSERT INTO weather_data ({_COLUMNS}) "
+        f"SELECT {_COLUMNS} FROM weather_data_partitioned ORDER BY timestamp"
+    )
+    op.execute("SELECT setval('weather_data_id_seq', coalesce((SELECT max(id) FROM weather_data), 0) + 1, false)")
+    op.execute("DROP TABLE weather_data_partitioned CASCADE")
@@ -0,0 +1,48 @@
+"""Rollup tables for weather_data
+
+Creates the 1 minute, 1 hour and 1 day rollup tables maintained by the Kafka
+consumer and backfills them from the rows already in weather_data.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+_ROLLUPS = {"weather_rollup_1m": 60, "weather_rollup_1h": 3600, "weather_rollup_1d": 86400}
+
+
+def upgrade():
+    for table, bucket_s in _ROLLUPS.items():
+        op.execute(f"""
+            CREATE TABLE {table} (
+                city varchar NOT NULL,
+                bucket integer NOT NULL,
+                samples integer NOT NULL,
+                temperature_min double precision NOT NULL,
+                temperature_max double precision NOT NULL,
+                temperature_sum double precision NOT NULL,
+                humidity_min integer NOT NULL,
+                humidity_max integer NOT NULL,
+                humidity_sum bigint NOT NULL,
+                PRIMARY KEY (city, bucket)
+            )
+        """)
+        op.execute(f"""
+            INSERT INTO {table}
+            SELECT city, timestamp / {bucket_s} * {bucket_s}, count(*),
+                   min(temperature), max(temperature), sum(temperature),
+                   min(humidity), max(humidity), sum(humidity)
+            FROM weather_data
+            GROUP BY city, timestamp / {bucket_s} * {bucket_s}
+        """)
+
+
+def downgrade():
+    for table in _ROLLUPS:
+        op.execute(f"DROP TABLE {table}")
@@ -0,0 +1,46 @@
+"""Natural key (city, timestamp) for weather_data
+
+Removes duplicate readings left by at-least-once ingestion, replaces the
+(city, timestamp) index by a unique one so the consumer can insert with
+ON CONFLICT DO NOTHING, and recomputes the rollups if duplicates were
+counted in them.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+_ROLLUPS = {"weather_rollup_1m": 60, "weather_rollup_1h": 3600, "weather_rollup_1d": 86400}
+
+
+def upgrade():
+    removed = op.get_bind().exec_driver_sql("""
+        DELETE FROM weather_data newer
+        USING weather_data older
+        WHERE newer.city = older.city AND newer.timestamp = older.timestamp AND newer.id > older.id
+    """).rowcount
+    op.execute("CREATE UNIQUE INDEX uq_weather_data_city_timestamp ON weather_data (city, timestamp)")
+    op.execute("DROP INDEX ix_weather_data_city_timestamp")
+
+    if removed:
+        for table, bucket_s in _ROLLUPS.items():
+            op.execute(f"DELETE FROM {table}")
+            op.execute(f"""
+                INSERT INTO {table}
+                SELECT city, timestamp / {bucket_s} * {bucket_s}, count(*),
+                       min(temperature), max(temperature), sum(temperature),
+                       min(humidity), max(humidity), sum(humidity)
+                FROM weather_data
+                GROUP BY city, timestamp / {bucket_s} * {bucket_s}
+            """)
+
+
+def downgrade():
+    op.execute("CREATE INDEX ix_weather_data_city_timestamp ON weather_data (city, timestamp)")
+    op.execute("DROP INDEX uq_weather_data_city_timestamp")
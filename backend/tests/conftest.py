@@ -0,0 +1,6 @@
+import os
+
+# backend.app.db builds its engines from DATABASE_URL at import time. Tests that
+# need PostgreSQL connect to TEST_DATABASE_URL and are skipped without it; the
+# others use their own SQLite engines or never connect.
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
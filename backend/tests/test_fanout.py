@@ -0,0 +1,61 @@
+import asyncio
+import json
+from backend.app.fanout import FanoutBus, encode_notifications
+
+# PostgreSQL rejects NOTIFY payloads of this size or more
+NOTIFY_LIMIT = 8000
+
+
+def _rows(count: int, description: str = "невеликий дощ") -> list:
+    return [{"city": f"Місто {index}", "temperature": 20.5, "humidity": 60,
+             "weather_description": description, "timestamp": 1_700_000_000 + index} for index in range(count)]
+
+
+def test_payloads_stay_under_the_notify_limit_and_round_trip():
+    for rows in (_rows(1), _rows(40), _rows(2000), _rows(300, "д" * 1500)):
+        payloads = list(encode_notifications("worker", rows))
+        assert all(len(payload.encode("utf-8")) < NOTIFY_LIMIT for payload in payloads)
+        decoded = []
+        for payload in payloads:
+            message = json.loads(payload)
+            assert message["o"] == "worker"
+            decoded.extend(message["r"])
+        assert decoded == rows
+
+
+def test_no_rows_no_payload():
+    assert list(encode_notifications("worker", [])) == []
+
+
+def _deliver(bus: FanoutBus, payload: str) -> list:
+    received = []
+
+    async def handler(rows: list):
+        received.extend(rows)
+
+    async def run():
+        bus._handlers = [handler]
+        bus._on_notification(None, 0, bus.channel, payload)
+        await asyncio.gather(*bus._dispatches)
+
+    asyncio.run(run())
+    return received
+
+
+def test_notifications_from_this_worker_are_ignored():
+    bus = FanoutBus()
+    payload, = encode_notifications(bus.worker_id, _rows(3))
+    assert _deliver(bus, payload) == []
+    assert bus.received == 0
+
+
+def test_notifications_from_other_workers_reach_the_handlers():
+    bus = FanoutBus()
+    payload, = encode_notifications("other-worker", _rows(3))
+    assert _deliver(bus, payload) == _rows(3)
+
+
+def test_malformed_notifications_are_ignored():
+    bus = FanoutBus()
+    assert _deliver(bus, "not json") == []
+    assert _deliver(bus, json.dumps({"r": []})) == []
@@ -0,0 +1,134 @@
+import asyncio
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from backend.app.db import Base
+from backend.app.kafka_consumer import Batch, DeadLetterQueue, SinkWorker, store_or_dead_letter, write_batch
+from backend.app.models import ROLLUP_MODELS, WeatherData
+from backend.app.replay import parse_time
+
+
+def _row(city: str, timestamp: int, temperature: float = 20.0, humidity=50) -> dict:
+    return {"city": city, "temperature": temperature, "humidity": humidity,
+            "weather_description": "ясно", "timestamp": timestamp}
+
+
+@pytest.fixture
+def database(tmp_path):
+    async def setup():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'weather.db'}")
+        async with engine.begin() as conn:
+            # Same layout as benchmarks/pipeline.py: SQLite only assigns ids to a
+            # single-column INTEGER PRIMARY KEY
+            await conn.exec_driver_sql("""
+                CREATE TABLE weather_data (
+                    id INTEGER PRIMARY KEY, city VARCHAR NOT NULL, temperature FLOAT NOT NULL,
+                    humidity INTEGER NOT NULL, weather_description VARCHAR, timestamp INTEGER NOT NULL
+                )
+            """)
+            await conn.exec_driver_sql(
+                "CREATE UNIQUE INDEX uq_weather_data_city_timestamp ON weather_data (city, timestamp)"
+            )
+            await conn.run_sync(Base.metadata.create_all)
+        return engine
+
+    engine = asyncio.run(setup())
+    yield engine
+    asyncio.run(engine.dispose())
+
+
+def _writer(engine):
+    sessions = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+
+    async def store(rows: list) -> list:
+        async with sessions() as session:
+            return await write_batch(session, rows)
+    return store
+
+
+async def _snapshot(engine) -> dict:
+    async with engine.connect() as conn:
+        snapshot = {"raw": (await conn.execute(select(func.count()).select_from(WeatherData))).scalar()}
+        for model in ROLLUP_MODELS:
+            rows = await conn.execute(select(model.__table__).order_by(model.city, model.bucket))
+            snapshot[model.__tablename__] = [tuple(row) for row in rows]
+    return snapshot
+
+
+class RecordingDeadLetters(DeadLetterQueue):
+    def __init__(self):
+        super().__init__(topic="")
+        self.sent = []
+
+    async def send(self, value: bytes, reason: str, source: str):
+        await super().send(value, reason, source)
+        self.sent.append((value, reason, source))
+
+
+def test_duplicate_batch_inserts_nothing_and_keeps_rollups(database):
+    async def run():
+        store = _writer(database)
+        rows = [_row("Київ", 1_700_000_000 + 60 * i, 10.0 + i) for i in range(5)] + [_row("Львів", 1_700_000_000)]
+        first = await store(rows)
+        before = await _snapshot(database)
+        second = await store(rows)
+        return first, second, before, await _snapshot(database)
+
+    first, second, before, after = asyncio.run(run())
+    assert len(first) == 6
+    assert second == []
+    assert before["raw"] == 6
+    assert after == before
+
+
+def test_partly_stored_batch_returns_only_new_rows(database):
+    async def run():
+        store = _writer(database)
+        await store([_row("Київ", 1_700_000_000)])
+        return await store([_row("Київ", 1_700_000_000), _row("Київ", 1_700_000_060)])
+
+    assert [row["timestamp"] for row in asyncio.run(run())] == [1_700_000_060]
+
+
+def test_rejected_rows_are_dead_lettered(database):
+    async def run():
+        dead_letters = RecordingDeadLetters()
+        rows = [_row("Київ", 1_700_000_000), _row("Київ", 1_700_000_060, humidity=None), _row("Львів", 1_700_000_000)]
+        inserted = await store_or_dead_letter(rows, dead_letters, _writer(database))
+        return inserted, dead_letters.sent, await _snapshot(database)
+
+    inserted, sent, snapshot = asyncio.run(run())
+    assert [row["city"] for row in inserted] == ["Київ", "Львів"]
+    assert len(sent) == 1 and sent[0][2] == "db"
+    assert b"1700000060" in sent[0][0]
+    assert snapshot["raw"] == 2
+
+
+def test_failing_commit_dead_letters_the_batch():
+    async def reject(rows: list) -> list:
+        raise IntegrityError("COMMIT", {}, Exception("constraint violated"))
+
+    async def run():
+        dead_letters = RecordingDeadLetters()
+        inserted = await store_or_dead_letter([_row("Київ", 1), _row("Львів", 2)], dead_letters, reject)
+        return inserted, dead_letters.sent
+
+    inserted, sent = asyncio.run(run())
+    assert inserted == []
+    assert len(sent) == 2
+
+
+def test_full_listener_drops_batches_without_waiting():
+    async def run():
+        sink = SinkWorker("listener", None, maxsize=1)
+        batch = Batch([_row("Київ", 1)], {}, 1)
+        return sink.offer(batch), sink.offer(batch), sink.queue.qsize()
+
+    assert asyncio.run(run()) == (True, False, 1)
+
+
+def test_parse_time_accepts_unix_and_iso_times():
+    assert parse_time("1700000000") == 1_700_000_000_000
+    assert parse_time("2023-11-14T22:13:20") == 1_700_000_000_000
+    assert parse_time("2023-11-15T00:13:20+02:00") == 1_700_000_000_000
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import pytest
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from backend.app.models import ROLLUP_MODELS
+from backend.app.partitions import (
+    DEFAULT_PARTITION, PARENT_TABLE, partition_bounds, partition_name, run_maintenance,
+)
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL (PostgreSQL) is not set")
+
+SCHEMA = "partitions_test"
+NOW = 1_760_000_000
+
+
+async def _engine():
+    # Everything lives in a schema of its own, dropped afterwards
+    admin = create_async_engine(make_url(TEST_DATABASE_URL).set(drivername="postgresql+asyncpg"))
+    async with admin.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    await admin.dispose()
+    engine = create_async_engine(
+        make_url(TEST_DATABASE_URL).set(drivername="postgresql+asyncpg"),
+        connect_args={"server_settings": {"search_path": SCHEMA}},
+    )
+    async with engine.begin() as conn:
+        await conn.execute(text(f"""
+            CREATE TABLE {PARENT_TABLE} (
+                id bigserial,
+                city varchar NOT NULL,
+                temperature double precision NOT NULL,
+                humidity integer NOT NULL,
+                weather_description varchar,
+                timestamp integer NOT NULL,
+                PRIMARY KEY (id, timestamp)
+            ) PARTITION BY RANGE (timestamp)
+        """))
+        await conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"))
+        for model in ROLLUP_MODELS:
+            await conn.run_sync(model.__table__.create)
+    return engine
+
+
+async def _maintain_with_a_stray_row():
+    engine = await _engine()
+    try:
+        # A row from the future lands in the DEFAULT partition before its partition exists
+        stray = NOW + 14 * 86400
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                f"INSERT INTO {PARENT_TABLE} (city, temperature, humidity, timestamp) VALUES ('Київ', 20, 50, :ts)"
+            ), {"ts": stray})
+
+        await run_maintenance(engine, NOW)
+        # The next round finds every partition in place and must succeed too
+        await run_maintenance(engine, NOW + 86400)
+
+        async with engine.connect() as conn:
+            in_default = (await conn.execute(text(f"SELECT count(*) FROM {DEFAULT_PARTITION}"))).scalar()
+            owner = partition_name(partition_bounds(stray)[0])
+            in_partition = (await conn.execute(text(f"SELECT count(*) FROM {owner}"))).scalar()
+            is_default = (await conn.execute(text(
+                "SELECT pg_get_expr(relpartbound, oid) FROM pg_class WHERE oid = to_regclass(:name)"
+            ), {"name": DEFAULT_PARTITION})).scalar()
+        return in_default, in_partition, is_default
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+        await engine.dispose()
+
+
+def test_maintenance_moves_rows_out_of_the_default_partition():
+    in_default, in_partition, is_default = asyncio.run(_maintain_with_a_stray_row())
+    assert in_default == 0
+    assert in_partition == 1
+    assert is_default == "DEFAULT"
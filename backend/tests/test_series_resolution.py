@@ -0,0 +1,44 @@
+from backend.app.api import _auto_resolution, _retained_models, _rollup_model
+from backend.app.models import WeatherRollup1d, WeatherRollup1h, WeatherRollup1m
+from backend.app.partitions import WEATHER_COMPACT_AFTER_DAYS, WEATHER_RETENTION_DAYS
+
+NOW = 1_760_000_000
+DAY = 86400
+POINTS = 500
+
+
+def _pick(start: int, end: int):
+    models = _retained_models(start, NOW)
+    resolution = _auto_resolution(start, end, POINTS, models)
+    return resolution, _rollup_model(resolution, models)
+
+
+def test_recent_short_window_uses_minute_rollups():
+    resolution, model = _pick(NOW - DAY, NOW)
+    assert model is WeatherRollup1m
+    assert resolution % 60 == 0
+
+
+def test_old_short_window_skips_deleted_minute_rollups():
+    start = NOW - (WEATHER_COMPACT_AFTER_DAYS + 30) * DAY
+    resolution, model = _pick(start, start + DAY)
+    assert model is WeatherRollup1h
+    assert resolution == 3600
+
+
+def test_window_crossing_the_compaction_horizon_skips_minute_rollups():
+    start = NOW - (WEATHER_COMPACT_AFTER_DAYS + 1) * DAY
+    _, model = _pick(start, NOW)
+    assert model is not WeatherRollup1m
+
+
+def test_window_past_retention_uses_daily_rollups():
+    start = NOW - (WEATHER_RETENTION_DAYS + 10) * DAY
+    resolution, model = _pick(start, start + DAY)
+    assert model is WeatherRollup1d
+    assert resolution == DAY
+
+
+def test_explicit_minute_resolution_on_old_window_falls_back_to_raw_rows():
+    models = _retained_models(NOW - (WEATHER_COMPACT_AFTER_DAYS + 30) * DAY, NOW)
+    assert _rollup_model(120, models) is None
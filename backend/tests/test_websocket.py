@@ -0,0 +1,158 @@
+import asyncio
+import json
+import pytest
+from backend.app import websocket
+from backend.app.websocket import BroadcastHub, CityState
+
+
+class RecordingWebSocket:
+    """
+    Stand-in for a Starlette WebSocket keeping every message it is sent.
+    """
+
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.messages = []
+
+    async def send_text(self, payload: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.messages.append(json.loads(payload))
+
+    async def close(self):
+        pass
+
+
+def _row(city: str, temperature: float, humidity: int = 50, timestamp: int = 1_700_000_000) -> dict:
+    return {"city": city, "temperature": temperature, "humidity": humidity,
+            "weather_description": "ясно", "timestamp": timestamp}
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit(monkeypatch):
+    monkeypatch.setattr(websocket, "WS_MAX_UPDATES_PER_SEC", 0)
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0.01)
+
+
+def test_delta_holds_only_changed_fields():
+    state = CityState()
+    state.update(1, _row("Київ", 20.0))
+    state.update(2, _row("Київ", 21.5, timestamp=1_700_000_060))
+
+    delta = json.loads(state.encode(1))
+    assert delta == {"type": "delta", "city": "Київ", "data": {"temperature": 21.5, "timestamp": 1_700_000_060}}
+    assert state.encode(1) is state.encode(1)
+
+
+def test_unknown_base_gets_a_snapshot(monkeypatch):
+    monkeypatch.setattr(websocket, "WS_DELTA_HISTORY", 2)
+    state = CityState()
+    for seq in range(1, 5):
+        state.update(seq, _row("Київ", 20.0 + seq))
+    assert json.loads(state.encode(None))["type"] == "snapshot"
+    assert json.loads(state.encode(1)) == {"type": "snapshot", "city": "Київ", "data": _row("Київ", 24.0)}
+
+
+def test_first_message_is_a_snapshot_then_deltas():
+    async def run():
+        hub = BroadcastHub()
+        ws = RecordingWebSocket()
+        hub.connect(ws)
+        await hub.publish_rows([_row("Київ", 20.0)])
+        await _settle()
+        await hub.publish_rows([_row("Київ", 22.0)])
+        await _settle()
+        hub.disconnect(ws)
+        return ws.messages
+
+    first, second = asyncio.run(run())
+    assert first == {"type": "snapshot", "city": "Київ", "data": _row("Київ", 20.0)}
+    assert second == {"type": "delta", "city": "Київ", "data": {"temperature": 22.0}}
+
+
+def test_subscriptions_filter_cities_and_star_restores_all():
+    async def run():
+        hub = BroadcastHub()
+        ws = RecordingWebSocket()
+        client = hub.connect(ws)
+        hub.subscribe(client, ["київ"])
+        await hub.publish_rows([_row("Київ", 20.0), _row("Львів", 15.0)])
+        await _settle()
+        only_kyiv = [message["city"] for message in ws.messages]
+
+        ws.messages.clear()
+        hub.subscribe(client, ["*"])
+        await _settle()
+        after_star = [(message["type"], message["city"]) for message in ws.messages]
+        hub.disconnect(ws)
+        return only_kyiv, after_star
+
+    only_kyiv, after_star = asyncio.run(run())
+    assert only_kyiv == ["Київ"]
+    assert after_star == [("snapshot", "Львів")]
+
+
+def test_resubscribing_after_dropping_star_starts_from_a_snapshot():
+    async def run():
+        hub = BroadcastHub()
+        ws = RecordingWebSocket()
+        client = hub.connect(ws)
+        await hub.publish_rows([_row("Київ", 20.0), _row("Львів", 15.0)])
+        await _settle()
+        # Replaces "*": Lviv is no longer followed and its next update is missed
+        hub.subscribe(client, ["Київ"])
+        await hub.publish_rows([_row("Львів", 16.0)])
+        await _settle()
+        ws.messages.clear()
+        hub.subscribe(client, ["Львів"])
+        await _settle()
+        hub.disconnect(ws)
+        return ws.messages
+
+    assert asyncio.run(run()) == [{"type": "snapshot", "city": "Львів", "data": _row("Львів", 16.0)}]
+
+
+def test_slow_client_gets_coalesced_updates(monkeypatch):
+    monkeypatch.setattr(websocket, "WS_MAX_UPDATES_PER_SEC", 20)
+
+    async def run():
+        hub = BroadcastHub()
+        slow, fast = RecordingWebSocket(delay=0.05), RecordingWebSocket()
+        hub.connect(slow)
+        hub.connect(fast)
+        for index in range(50):
+            await hub.publish_rows([_row("Київ", float(index))])
+            await asyncio.sleep(0.002)
+        await asyncio.sleep(0.3)
+        hub.disconnect(slow)
+        hub.disconnect(fast)
+        return slow.messages, fast.messages
+
+    slow, fast = asyncio.run(run())
+    assert len(slow) < 10
+    assert len(fast) < 50
+    for messages in (slow, fast):
+        assert messages[0]["type"] == "snapshot"
+        latest = {}
+        for message in messages:
+            latest.update(message["data"])
+        assert latest["temperature"] == 49.0
+
+
+def test_unsubscribed_cities_are_not_sent():
+    async def run():
+        hub = BroadcastHub()
+        ws = RecordingWebSocket()
+        client = hub.connect(ws)
+        hub.subscribe(client, ["Київ", "Львів"])
+        hub.unsubscribe(client, ["Львів"])
+        await hub.publish_rows([_row("Київ", 20.0), _row("Львів", 15.0)])
+        await _settle()
+        hub.disconnect(ws)
+        return [message["city"] for message in ws.messages]
+
+    assert asyncio.run(run()) == ["Київ"]
@@ -0,0 +1,77 @@
+"""
+Measures what audio preprocessing saves per voice message before upload to Deepgram.
+
+For every sample it reports the original and prepared size, the trimmed audio
+duration, the preprocessing cost and the upload time saved at a given uplink speed.
+
+Usage:
+    python benchmarks/audio_preprocessing.py [voice.ogg ...] [--uplink-mbps 10]
+
+Without files, synthetic Telegram-like voice notes (48 kHz Opus with leading and
+trailing silence around a voiced section) are generated. Requires ffmpeg.
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "telegram_bot"))
+
+from pydub.generators import Sine, WhiteNoise  # noqa: E402
+from audio_preprocessing import preprocess_audio  # noqa: E402
+
+
+def synthetic_voice_note(lead_ms: int, speech_ms: int, tail_ms: int) -> bytes:
+    """
+    Builds an OGG/Opus note resembling a Telegram voice message.
+    """
+    noise = WhiteNoise().to_audio_segment(duration=lead_ms + speech_ms + tail_ms, volume=-60)
+    speech = Sine(220).to_audio_segment(duration=speech_ms, volume=-12)
+    speech = speech.overlay(Sine(660).to_audio_segment(duration=speech_ms, volume=-18))
+    note = noise.overlay(speech, position=lead_ms).set_frame_rate(48000).set_channels(1)
+    output = io.BytesIO()
+    note.export(output, format="ogg", codec="libopus", bitrate="32k")
+    return output.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="OGG/Opus voice notes to measure")
+    parser.add_argument("--uplink-mbps", type=float, default=10, help="Uplink used to estimate upload time")
+    parser.add_argument("--repeat", type=int, default=5, help="Preprocessing runs per sample")
+    args = parser.parse_args()
+
+    if args.files:
+        samples = [(os.path.basename(path), open(path, "rb").read()) for path in args.files]
+    else:
+        samples = [
+            (f"synthetic {lead}/{speech}/{tail} ms", synthetic_voice_note(lead, speech, tail))
+            for lead, speech, tail in [(800, 1200, 1500), (1500, 2000, 2500), (300, 4000, 300), (2000, 20000, 1000)]
+        ]
+
+    bytes_per_ms = args.uplink_mbps * 1_000_000 / 8 / 1000
+    print(f"{'sample':32} {'bytes in':>9} {'bytes out':>9} {'audio ms in':>11} {'audio ms out':>12} "
+          f"{'prep ms':>8} {'upload ms saved':>15}")
+    saved_bytes, saved_ms = [], []
+    for name, data in samples:
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            prepared = preprocess_audio(data)
+            timings.append((time.perf_counter() - started) * 1000)
+        prep_ms = statistics.median(timings)
+        upload_saved = (len(data) - len(prepared.data)) / bytes_per_ms
+        saved_bytes.append(len(data) - len(prepared.data))
+        saved_ms.append(upload_saved - prep_ms)
+        print(f"{name:32} {len(data):9} {len(prepared.data):9} {prepared.original_duration_ms or 0:11} "
+              f"{prepared.duration_ms or 0:12} {prep_ms:8.1f} {upload_saved:15.1f}")
+
+    print(f"\nmean bytes saved per message: {statistics.mean(saved_bytes):.0f}")
+    print(f"mean net ms saved per message at {args.uplink_mbps} Mbit/s "
+          f"(upload saved minus preprocessing): {statistics.mean(saved_ms):.1f}")
+
+
+if __name__ == "__main__":
+    main()
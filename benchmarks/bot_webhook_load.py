@@ -0,0 +1,224 @@
+"""
+Load test of the bot in webhook mode with synthetic updates.
+
+The bot runs in-process in webhook mode (bot.main() with BOT_MODE=webhook)
+against local stand-ins of the Telegram Bot API, OpenWeatherMap and Deepgram
+(see benchmarks/standins.py). Updates are posted to the webhook the way
+Telegram sends them:
+
+    light users  --users users, each sending --light-updates updates at random
+                 times over --duration seconds
+    heavy user   one user sending --heavy-updates updates at once at the start
+
+Every update is sent from its own chat, so each reply identifies the update it
+answers. Updates that get no reply were dropped by the update pool (rate limit
+or full queue). When all updates are sent the bot is stopped with SIGTERM,
+which measures the graceful drain.
+
+It reports the webhook acknowledgement latency, the reply latency of light and
+heavy users separately, and how many updates were answered and dropped.
+
+Usage:
+    python benchmarks/bot_webhook_load.py [--users 200] [--heavy-updates 100]
+    python benchmarks/bot_webhook_load.py --kind voice --workers 8 --stt-latency-ms 800
+
+--kind start answers /start commands; --kind voice sends voice notes through
+the whole recognition path and requires ffmpeg.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import sys
+import time
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(1, os.path.join(REPO_ROOT, "telegram_bot"))
+
+import aiohttp  # noqa: E402
+from common.logging_config import configure_logging  # noqa: E402
+from benchmarks.pipeline import percentile, popular_settlements, synthetic_voice_note  # noqa: E402
+from benchmarks.standins import FakeDeepgram, FakeOpenWeatherMap, FakeTelegramBotAPI  # noqa: E402
+
+BOT_TOKEN = "123456:" + "B" * 35
+WEBHOOK_SECRET = "benchmark-secret"
+HEAVY_USER_ID = 1
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def synthetic_update(update_id: int, user_id: int, kind: str) -> dict:
+    """
+    Builds a message update from user_id, sent from a chat of its own.
+    """
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": -update_id, "type": "group", "title": f"load-{update_id}"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"user-{user_id}"},
+    }
+    if kind == "voice":
+        file_id = f"voice-{update_id}"
+        message["voice"] = {"file_id": file_id, "file_unique_id": file_id, "duration": 2, "mime_type": "audio/ogg"}
+    else:
+        message["text"] = "/start"
+    return {"update_id": update_id, "message": message}
+
+
+def latency_summary(latencies: list) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "answered": len(ordered),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+    }
+
+
+async def wait_for_port(port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+            continue
+        writer.close()
+        return
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kind", choices=("start", "voice"), default="start", help="Updates to send")
+    parser.add_argument("--users", type=int, default=200, help="Light users")
+    parser.add_argument("--light-updates", type=int, default=2, help="Updates sent by each light user")
+    parser.add_argument("--heavy-updates", type=int, default=100, help="Updates sent at once by the heavy user")
+    parser.add_argument("--duration", type=float, default=5, help="Seconds over which light users send")
+    parser.add_argument("--workers", type=int, help="BOT_WORKERS of the bot")
+    parser.add_argument("--user-rate", type=float, help="BOT_USER_RATE_PER_MIN of the bot")
+    parser.add_argument("--user-queue", type=int, help="BOT_USER_QUEUE_SIZE of the bot")
+    parser.add_argument("--cities", type=int, default=100, help="Distinct cities named in voice notes")
+    parser.add_argument("--telegram-latency-ms", type=float, default=30, help="Latency of the fake Bot API")
+    parser.add_argument("--api-latency-ms", type=float, default=50, help="Latency of the fake weather API")
+    parser.add_argument("--stt-latency-ms", type=float, default=300, help="Latency of the fake Deepgram API")
+    parser.add_argument("--output", help="JSON file to save the results to")
+    parser.add_argument("--log-level", default="WARNING", help="Log level of the bot")
+    args = parser.parse_args()
+    if args.kind == "voice" and not shutil.which("ffmpeg"):
+        parser.error("--kind voice requires ffmpeg")
+
+    audio = await asyncio.to_thread(synthetic_voice_note, 440) if args.kind == "voice" else b""
+    telegram_server = FakeTelegramBotAPI(audio, latency_ms=args.telegram_latency_ms,
+                                         jitter_ms=args.telegram_latency_ms / 5)
+    weather_server = FakeOpenWeatherMap(latency_ms=args.api_latency_ms, jitter_ms=args.api_latency_ms / 5)
+    speech_server = FakeDeepgram([settlement.name for settlement in popular_settlements(args.cities)],
+                                 latency_ms=args.stt_latency_ms, jitter_ms=args.stt_latency_ms / 5)
+    for server in (telegram_server, weather_server, speech_server):
+        await server.start()
+
+    # Read by the bot at import time, so set before importing it
+    port = free_port()
+    os.environ.update({
+        "TELEGRAM_BOT_TOKEN": BOT_TOKEN,
+        "TELEGRAM_API_URL": telegram_server.url,
+        "BOT_MODE": "webhook",
+        "WEBHOOK_HOST": "127.0.0.1",
+        "WEBHOOK_PORT": str(port),
+        "WEBHOOK_SECRET": WEBHOOK_SECRET,
+        "METRICS_PORT": "0",
+        "WEATHER_API_KEY": "benchmark",
+        "WEATHER_API_URL": f"{weather_server.url}/data/2.5/weather",
+        "DEEPGRAM_API_KEY": "benchmark",
+        "DEEPGRAM_API_URL": speech_server.url,
+    })
+    for name, value in (("BOT_WORKERS", args.workers), ("BOT_USER_RATE_PER_MIN", args.user_rate),
+                        ("BOT_USER_QUEUE_SIZE", args.user_queue)):
+        if value is not None:
+            os.environ[name] = str(value)
+    import bot as bot_module
+    from update_pool import BOT_UPDATES
+    # The bot configures logging on import
+    configure_logging("benchmark", level=args.log_level.upper(), log_format="text")
+
+    bot_task = asyncio.create_task(bot_module.main())
+    await wait_for_port(port)
+    webhook_url = f"http://127.0.0.1:{port}{bot_module.WEBHOOK_PATH}"
+
+    # (send time, update id, user id), the heavy user's burst first
+    plan = [(0.0, index + 1, HEAVY_USER_ID) for index in range(args.heavy_updates)]
+    for user_id in range(2, args.users + 2):
+        for _ in range(args.light_updates):
+            plan.append((random.uniform(0, args.duration), len(plan) + 1, user_id))
+    plan.sort()
+    sent_at, acks = {}, []
+
+    async def send(session: aiohttp.ClientSession, update_id: int, user_id: int):
+        started = time.perf_counter()
+        sent_at[update_id] = started
+        async with session.post(webhook_url, json=synthetic_update(update_id, user_id, args.kind),
+                                headers={"X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET}) as response:
+            response.raise_for_status()
+        acks.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=100)) as session:
+        sends = []
+        for offset, update_id, user_id in plan:
+            delay = started + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            sends.append(asyncio.create_task(send(session, update_id, user_id)))
+        await asyncio.gather(*sends)
+
+    stopping = time.perf_counter()
+    signal.raise_signal(signal.SIGTERM)
+    await bot_task
+    drained = time.perf_counter()
+    for server in (telegram_server, weather_server, speech_server):
+        await server.stop()
+
+    light, heavy = [], []
+    for _, update_id, user_id in plan:
+        replies = telegram_server.replies.get(-update_id)
+        if replies:
+            (heavy if user_id == HEAVY_USER_ID else light).append(replies[0] - sent_at[update_id])
+    answered = len(light) + len(heavy)
+    results = {
+        "kind": args.kind,
+        "updates": len(plan),
+        "answered": answered,
+        "dropped": len(plan) - answered,
+        "rejected": BOT_UPDATES.labels("rejected").value,
+        "user_overflow": BOT_UPDATES.labels("user_overflow").value,
+        "failed": BOT_UPDATES.labels("failed").value,
+        "updates_per_s": round(answered / max(drained - started, 1e-9), 1),
+        "drain_s": round(drained - stopping, 3),
+        "webhook_ack": latency_summary(acks),
+        "light_users": latency_summary(light),
+        "heavy_user": latency_summary(heavy),
+    }
+    print(f"{results['updates']} updates, {answered} answered, {results['dropped']} dropped "
+          f"({results['user_overflow']} over a user's queue, {results['rejected']} over the pool), "
+          f"{results['updates_per_s']} answered/s, drained in {results['drain_s']} s")
+    for name in ("webhook_ack", "light_users", "heavy_user"):
+        summary = results[name]
+        print(f"{name:12} {summary['answered']:6}  p50 {summary['p50_ms']:9.2f} ms  "
+              f"p95 {summary['p95_ms']:9.2f} ms  p99 {summary['p99_ms']:9.2f} ms")
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
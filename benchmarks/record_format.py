@@ -0,0 +1,89 @@
+"""
+Compares the msgpack weather record format with the legacy JSON one.
+
+For a set of synthetic records it reports bytes per message (raw and inside a
+gzip-compressed producer batch) and the decode cost per message on the
+consumer: the legacy json.loads path, and decode_record (with validation) for
+both formats.
+
+Usage:
+    python benchmarks/record_format.py [--records 10000] [--batch 500]
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common.weather_record import decode_record, encode_record  # noqa: E402
+
+CITIES = ["Київ", "Львів", "Харків", "Одеса", "Дніпро", "Запоріжжя", "Івано-Франківськ", "Кам'янець-Подільський"]
+DESCRIPTIONS = ["ясно", "хмарно", "уривчасті хмари", "невеликий дощ", "сніг"]
+
+
+def synthetic_records(count: int) -> list:
+    records = []
+    for index in range(count):
+        city = random.choice(CITIES)
+        records.append({
+            "city": city,
+            "city_key": f"{city.lower()}/oblast",
+            "temperature": round(random.uniform(-20, 35), 2),
+            "feels_like": round(random.uniform(-25, 38), 2),
+            "humidity": random.randint(10, 100),
+            "wind_speed": round(random.uniform(0, 20), 2),
+            "weather_description": random.choice(DESCRIPTIONS),
+            "timestamp": 1_700_000_000 + index * 60,
+        })
+    return records
+
+
+def per_message_us(decode, messages: list, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for message in messages:
+            decode(message)
+        best = min(best, time.perf_counter() - started)
+    return best / len(messages) * 1_000_000
+
+
+def batch_bytes(messages: list, batch: int) -> float:
+    total = sum(len(gzip.compress(b"".join(messages[i:i + batch]))) for i in range(0, len(messages), batch))
+    return total / len(messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=10000, help="Number of synthetic records")
+    parser.add_argument("--batch", type=int, default=500, help="Records per compressed producer batch")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs, the best one is reported")
+    args = parser.parse_args()
+
+    records = synthetic_records(args.records)
+    formats = {
+        "json": [encode_record(record, "json") for record in records],
+        "msgpack": [encode_record(record, "msgpack") for record in records],
+    }
+    decoders = [
+        ("json", "json.loads (legacy, unvalidated)", lambda data: json.loads(data.decode("utf-8"))),
+        ("json", "decode_record", decode_record),
+        ("msgpack", "decode_record", decode_record),
+    ]
+
+    print(f"{'format':8} {'bytes/msg':>9} {'gzip bytes/msg':>14}")
+    for name, messages in formats.items():
+        raw = sum(map(len, messages)) / len(messages)
+        print(f"{name:8} {raw:9.1f} {batch_bytes(messages, args.batch):14.1f}")
+
+    print(f"\n{'format':8} {'decoder':34} {'us/msg':>7}")
+    for name, label, decode in decoders:
+        print(f"{name:8} {label:34} {per_message_us(decode, formats[name], args.repeat):7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Local stand-ins for the external services of the pipeline, used by benchmarks/pipeline.py
+and benchmarks/bot_webhook_load.py.
+
+FakeOpenWeatherMap, FakeDeepgram and FakeTelegramBotAPI are aiohttp servers
+answering like the real APIs after a configurable latency. InProcessTopic and
+InProcessConsumer replace Kafka with in-memory partition logs that speak the
+subset of the AIOKafkaConsumer interface WeatherConsumer uses, and record the
+latency from produce to offset commit of every message.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import namedtuple
+from aiohttp import web
+
+TopicPartition = namedtuple("TopicPartition", "topic partition")
+Message = namedtuple("Message", "topic partition offset timestamp key value produced_at")
+
+
+class FakeServer:
+    """
+    An aiohttp application served on a free localhost port.
+    """
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.requests = 0
+        self.port = None
+        self._runner = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def routes(self, app: web.Application):
+        raise NotImplementedError
+
+    async def start(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        self.routes(app)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def delay(self):
+        self.requests += 1
+        latency = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            await asyncio.sleep(latency / 1000)
+
+
+class FakeOpenWeatherMap(FakeServer):
+    """
+    Answers /data/2.5/weather by name or coordinates with plausible current weather.
+    """
+
+    def routes(self, app: web.Application):
+        app.router.add_get("/data/2.5/weather", self.weather)
+
+    async def weather(self, request: web.Request) -> web.Response:
+        await self.delay()
+        place = request.query.get("q") or f"{request.query.get('lat')},{request.query.get('lon')}"
+        seed = int(hashlib.md5(place.encode("utf-8")).hexdigest()[:8], 16)
+        temperature = round(-10 + seed % 400 / 10, 1)
+        return web.json_response({
+            "name": place.split(",")[0],
+            "dt": int(time.time()),
+            "main": {"temp": temperature, "feels_like": temperature - 1.5, "humidity": 30 + seed % 70},
+            "wind": {"speed": round(seed % 150 / 10, 1)},
+            "weather": [{"description": "хмарно"}],
+        })
+
+
+class FakeDeepgram(FakeServer):
+    """
+    Answers /v1/listen with a transcript naming one of the given cities.
+
+    The city is derived from a hash of the uploaded audio, so identical
+    uploads always get the same transcript.
+    """
+
+    def __init__(self, cities: list, latency_ms: float = 0, jitter_ms: float = 0):
+        super().__init__(latency_ms, jitter_ms)
+        self.cities = cities
+
+    def routes(self, app: web.Application):
+        app.router.add_post("/v1/listen", self.listen)
+
+    async def listen(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        await self.delay()
+        city = self.cities[int(hashlib.md5(body).hexdigest()[:8], 16) % len(self.cities)]
+        transcript = f"Яка погода у місті {city}"
+        return web.json_response({
+            "metadata": {"request_id": hashlib.md5(body).hexdigest(), "duration": 2.0, "channels": 1},
+            "results": {"channels": [{"alternatives": [{"transcript": transcript, "confidence": 0.97, "words": []}]}]},
+        })
+
+
+class FakeTelegramBotAPI(FakeServer):
+    """
+    Answers the Bot API methods the bot calls, and records when each chat is answered.
+
+    Voice files are served from the audio given at construction, whatever
+    their file_id.
+
+    Attributes:
+        replies (dict): chat id -> time.perf_counter() of every message sent to it, in order
+    """
+
+    def __init__(self, audio: bytes = b"", latency_ms: float = 0, jitter_ms: float = 0):
+        super().__init__(latency_ms, jitter_ms)
+        self.audio = audio
+        self.replies = {}
+        self._message_id = 0
+
+    def routes(self, app: web.Application):
+        app.router.add_post("/bot{token}/{method}", self.method)
+        app.router.add_get("/file/bot{token}/{path:.+}", self.file)
+
+    async def method(self, request: web.Request) -> web.Response:
+        params = dict(await request.post())
+        await self.delay()
+        method = request.match_info["method"].lower()
+        if method == "getme":
+            result = {"id": 1, "is_bot": True, "first_name": "Benchmark", "username": "benchmark_bot"}
+        elif method == "sendmessage":
+            chat_id = int(params["chat_id"])
+            self.replies.setdefault(chat_id, []).append(time.perf_counter())
+            self._message_id += 1
+            result = {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": params.get("text", ""),
+            }
+        elif method == "getfile":
+            file_id = params["file_id"]
+            result = {"file_id": file_id, "file_unique_id": file_id, "file_size": len(self.audio),
+                      "file_path": f"voice/{file_id}.oga"}
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def file(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.audio, content_type="audio/ogg")
+
+
+class InProcessTopic:
+    """
+    An in-memory Kafka topic: one append-only log per partition.
+
+    Attributes:
+        commit_latencies (list): Seconds from produce to offset commit, one per committed message
+    """
+
+    def __init__(self, name: str, partitions: int = 3):
+        self.name = name
+        self.logs = [[] for _ in range(partitions)]
+        self.commit_latencies = []
+        self.committed = 0
+        self._appended = asyncio.Event()
+        self._next = 0
+
+    def produce(self, value: bytes, key: str = None):
+        """
+        Appends a record, to the key's partition if given, round-robin otherwise.
+        """
+        if key is not None:
+            partition = int(hashlib.md5(key.encode("utf-8")).hexdigest()[:8], 16) % len(self.logs)
+        else:
+            partition = self._next % len(self.logs)
+            self._next += 1
+        log = self.logs[partition]
+        log.append(Message(self.name, partition, len(log), int(time.time() * 1000), key, value, time.perf_counter()))
+        self._appended.set()
+
+    @property
+    def produced(self) -> int:
+        return sum(map(len, self.logs))
+
+
+class InProcessConsumer:
+    """
+    Stand-in for AIOKafkaConsumer reading an InProcessTopic with manual commits.
+    """
+
+    def __init__(self, topic: InProcessTopic):
+        self.topic = topic
+        self._tps = [TopicPartition(topic.name, partition) for partition in range(len(topic.logs))]
+        self._positions = {tp: 0 for tp in self._tps}
+        self._committed = {tp: 0 for tp in self._tps}
+        self._paused = set()
+
+    @classmethod
+    def factory(cls, topic: InProcessTopic):
+        """
+        Returns a callable accepting AIOKafkaConsumer's arguments, for WeatherConsumer(consumer_factory=...).
+        """
+        return lambda *topics, **config: cls(topic)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def assignment(self) -> set:
+        return set(self._tps)
+
+    def highwater(self, tp: TopicPartition) -> int:
+        return len(self.topic.logs[tp.partition])
+
+    def pause(self, *tps):
+        self._paused.update(tps)
+
+    def resume(self, *tps):
+        self._paused.difference_update(tps)
+
+    def _take(self, max_records: int) -> dict:
+        batch = {}
+        for tp in self._tps:
+            if tp in self._paused or max_records <= 0:
+                continue
+            log = self.topic.logs[tp.partition]
+            start = self._positions[tp]
+            messages = log[start:start + max_records]
+            if messages:
+                batch[tp] = messages
+                self._positions[tp] = start + len(messages)
+                max_records -= len(messages)
+        return batch
+
+    async def getmany(self, *partitions, timeout_ms: int = 0, max_records: int = None) -> dict:
+        max_records = max_records or 1_000_000
+        batch = self._take(max_records)
+        if batch or timeout_ms <= 0:
+            return batch
+        self.topic._appended.clear()
+        try:
+            await asyncio.wait_for(self.topic._appended.wait(), timeout_ms / 1000)
+        except asyncio.TimeoutError:
+            return {}
+        return self._take(max_records)
+
+    async def commit(self, offsets: dict):
+        now = time.perf_counter()
+        for tp, offset in offsets.items():
+            log = self.topic.logs[tp.partition]
+            for message in log[self._committed[tp]:offset]:
+                self.topic.commit_latencies.append(now - message.produced_at)
+            self.topic.committed += max(offset - self._committed[tp], 0)
+            self._committed[tp] = max(self._committed[tp], offset)
+
+
+class FakeWebSocket:
+    """
+    Stand-in for a Starlette WebSocket recording the latency of every update it is sent.
+
+    The benchmark stamps rows with time.perf_counter_ns() // 1000 as their
+    timestamp, so the latency is measured from publish to send.
+    """
+
+    def __init__(self):
+        self.received = 0
+        self.latencies = []
+
+    async def send_text(self, payload: str):
+        sent_us = json.loads(payload).get("data", {}).get("timestamp")
+        if sent_us:
+            self.received += 1
+            self.latencies.append((time.perf_counter_ns() // 1000 - sent_us) / 1_000_000)
+
+    async def close(self):
+        pass
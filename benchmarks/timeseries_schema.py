@@ -0,0 +1,124 @@
+"""
+Compares query latency on the old and the partitioned weather_data layout as history grows.
+
+Both layouts are built in a scratch schema of the database in DATABASE_URL:
+weather_data_flat mirrors the original table (plain table, index on id only),
+weather_data is the layout of migration 0001 (range partitions by timestamp,
+(city, timestamp) and BRIN indexes). Synthetic readings for --cities cities,
+one every 10 minutes, are appended in steps; after every step the typical
+dashboard queries are timed on both tables.
+
+Usage:
+    DATABASE_URL=postgresql://... python benchmarks/timeseries_schema.py [--steps 1000000,2000000,4000000,8000000]
+
+The scratch schema is dropped at the end unless --keep is given.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import text  # noqa: E402
+from backend.app.db import engine  # noqa: E402
+from backend.app.partitions import create_partition_sql, planned_partitions  # noqa: E402
+
+SCHEMA = "bench_timeseries"
+INTERVAL_S = 600
+BASE_TIMESTAMP = 1_700_000_000
+
+QUERIES = {
+    "latest reading of a city":
+        "SELECT * FROM {table} WHERE city = :city ORDER BY timestamp DESC LIMIT 1",
+    "city history, last 24 h":
+        "SELECT timestamp, temperature FROM {table} WHERE city = :city AND timestamp >= :now - 86400 ORDER BY timestamp",
+    "all cities, last hour":
+        "SELECT city, temperature FROM {table} WHERE timestamp >= :now - 3600",
+    "city history, 7 days a month ago":
+        "SELECT timestamp, temperature FROM {table} WHERE city = :city "
+        "AND timestamp BETWEEN :now - 37 * 86400 AND :now - 30 * 86400",
+}
+
+
+def create_tables(conn, last_timestamp: int):
+    conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+    conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    conn.execute(text(f"SET search_path TO {SCHEMA}"))
+    conn.execute(text("""
+        CREATE TABLE weather_data_flat (
+            id serial PRIMARY KEY, city varchar NOT NULL, temperature double precision NOT NULL,
+            humidity integer NOT NULL, weather_description varchar, timestamp integer NOT NULL
+        )
+    """))
+    conn.execute(text("""
+        CREATE TABLE weather_data (
+            id bigserial, city varchar NOT NULL, temperature double precision NOT NULL,
+            humidity integer NOT NULL, weather_description varchar, timestamp integer NOT NULL,
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """))
+    conn.execute(text("CREATE INDEX ON weather_data (city, timestamp)"))
+    conn.execute(text("CREATE INDEX ON weather_data USING brin (timestamp)"))
+    for start, end in planned_partitions(BASE_TIMESTAMP, last_timestamp):
+        conn.execute(text(create_partition_sql(start, end)))
+
+
+def append_rows(conn, first: int, count: int, cities: int):
+    for table in ("weather_data_flat", "weather_data"):
+        conn.execute(text(f"""
+            INSERT INTO {table} (city, temperature, humidity, weather_description, timestamp)
+            SELECT 'city_' || (i % :cities), 10 + 15 * sin(i / 1000.0), 40 + i % 50, 'clear sky',
+                   :base + (i / :cities) * :interval
+            FROM generate_series(:first, :last) AS i
+        """), {"cities": cities, "base": BASE_TIMESTAMP, "interval": INTERVAL_S,
+               "first": first, "last": first + count - 1})
+        conn.execute(text(f"ANALYZE {table}"))
+
+
+def time_query(conn, sql: str, params: dict, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.execute(text(sql), params).fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", default="1000000,2000000,4000000,8000000",
+                        help="Comma-separated total row counts to measure at")
+    parser.add_argument("--cities", type=int, default=1000, help="Number of distinct cities")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per query and step")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch schema")
+    args = parser.parse_args()
+    steps = sorted(int(step) for step in args.steps.split(","))
+
+    last_timestamp = BASE_TIMESTAMP + (steps[-1] // args.cities) * INTERVAL_S
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        create_tables(conn, last_timestamp)
+        try:
+            print(f"{'rows':>10}  {'query':34} {'flat ms':>9} {'partitioned ms':>15}")
+            loaded = 0
+            for total in steps:
+                started = time.perf_counter()
+                append_rows(conn, loaded, total - loaded, args.cities)
+                loaded = total
+                print(f"{'':>10}  (loaded in {time.perf_counter() - started:.1f} s)")
+
+                now = BASE_TIMESTAMP + ((loaded - 1) // args.cities) * INTERVAL_S
+                params = {"city": f"city_{args.cities // 2}", "now": now}
+                for name, sql in QUERIES.items():
+                    flat = time_query(conn, sql.format(table="weather_data_flat"), params, args.repeat)
+                    partitioned = time_query(conn, sql.format(table="weather_data"), params, args.repeat)
+                    print(f"{loaded:>10}  {name:34} {flat:9.2f} {partitioned:15.2f}")
+        finally:
+            if not args.keep:
+                conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
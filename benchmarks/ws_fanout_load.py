@@ -0,0 +1,143 @@
+"""
+Measures how many WebSocket dashboard clients a backend core can serve.
+
+Synthetic updates are published on the Postgres fan-out channel, exactly as a
+backend worker relays what it ingested, so every worker of the backend under
+test delivers them to its own clients. For each client count the script
+connects that many clients, publishes --rate city updates per second for
+--duration seconds and reports delivered messages per second, the share of
+expected messages delivered and the end-to-end latency from NOTIFY to client.
+
+Run the backend with its own scratch database and without per-city
+coalescing, so every update is a message:
+    BACKEND_FANOUT=postgres WS_MAX_UPDATES_PER_SEC=0 \\
+        uvicorn backend.app.main:app --port 8000 --workers 4
+
+Usage:
+    DATABASE_URL=postgresql://... python benchmarks/ws_fanout_load.py \\
+        --url ws://localhost:8000/ws --cores 4 --clients 250,500,1000,2000,4000
+
+The clients-per-core figure is the largest client count that kept p99
+latency under --max-p99-ms with at least 99% of messages delivered,
+divided by --cores.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import asyncpg  # noqa: E402
+import websockets  # noqa: E402
+from sqlalchemy.engine import make_url  # noqa: E402
+from backend.app.fanout import FANOUT_CHANNEL, encode_notifications  # noqa: E402
+
+
+class Client:
+    def __init__(self):
+        self.received = 0
+        self.latencies = []
+        self.failed = False
+
+    async def run(self, url: str, connected: asyncio.Event, stop: asyncio.Event):
+        try:
+            async with websockets.connect(url, max_queue=None) as websocket:
+                connected.set()
+                while not stop.is_set():
+                    try:
+                        message = json.loads(await asyncio.wait_for(websocket.recv(), 0.5))
+                    except asyncio.TimeoutError:
+                        continue
+                    sent_ms = message.get("data", {}).get("timestamp")
+                    if sent_ms:
+                        self.received += 1
+                        self.latencies.append(time.time() * 1000 - sent_ms)
+        except Exception:
+            self.failed = True
+            connected.set()
+
+
+async def publish(dsn: str, rate: float, cities: int, duration: float) -> int:
+    """
+    Publishes rate updates per second in 10 ms ticks; returns the number sent.
+    """
+    connection = await asyncpg.connect(dsn)
+    sent = 0
+    started = time.monotonic()
+    try:
+        while (elapsed := time.monotonic() - started) < duration:
+            due = int(elapsed * rate) - sent
+            if due > 0:
+                now_ms = int(time.time() * 1000)
+                rows = [
+                    {"city": f"loadtest-{(sent + i) % cities}", "temperature": 20.0, "humidity": 50,
+                     "weather_description": "load test", "timestamp": now_ms}
+                    for i in range(due)
+                ]
+                for payload in encode_notifications("loadtest", rows):
+                    await connection.execute("SELECT pg_notify($1, $2)", FANOUT_CHANNEL, payload)
+                sent += due
+            await asyncio.sleep(0.01)
+    finally:
+        await connection.close()
+    return sent
+
+
+async def run_step(args, dsn: str, count: int) -> dict:
+    stop = asyncio.Event()
+    clients = [Client() for _ in range(count)]
+    tasks = []
+    for client in clients:
+        connected = asyncio.Event()
+        tasks.append(asyncio.create_task(client.run(args.url, connected, stop)))
+        await connected.wait()
+
+    sent = await publish(dsn, args.rate, args.cities, args.duration)
+    await asyncio.sleep(args.drain)
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    latencies = sorted(latency for client in clients for latency in client.latencies)
+    received = sum(client.received for client in clients)
+    live = sum(not client.failed for client in clients)
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) >= 2 else [float("nan")] * 99
+    return {
+        "clients": count,
+        "failed": count - live,
+        "msgs_per_s": received / args.duration,
+        "delivered": received / max(sent * live, 1),
+        "p50_ms": quantiles[49],
+        "p99_ms": quantiles[98],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="ws://localhost:8000/ws", help="WebSocket endpoint of the backend")
+    parser.add_argument("--clients", default="250,500,1000,2000", help="Comma-separated client counts")
+    parser.add_argument("--cores", type=int, default=1, help="CPU cores (workers) of the backend under test")
+    parser.add_argument("--rate", type=float, default=50, help="City updates published per second")
+    parser.add_argument("--cities", type=int, default=100, help="Distinct synthetic cities")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of publishing per step")
+    parser.add_argument("--drain", type=float, default=2, help="Seconds to wait for late messages")
+    parser.add_argument("--max-p99-ms", type=float, default=250, help="Latency target for clients per core")
+    args = parser.parse_args()
+
+    dsn = make_url(os.environ["DATABASE_URL"]).set(drivername="postgresql").render_as_string(hide_password=False)
+    print(f"{'clients':>8} {'failed':>6} {'msgs/s':>10} {'delivered':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    best = 0
+    for count in sorted(int(value) for value in args.clients.split(",")):
+        result = await run_step(args, dsn, count)
+        print(f"{result['clients']:8} {result['failed']:6} {result['msgs_per_s']:10.0f} "
+              f"{result['delivered']:9.1%} {result['p50_ms']:8.1f} {result['p99_ms']:8.1f}")
+        if result["failed"] == 0 and result["delivered"] >= 0.99 and result["p99_ms"] <= args.max_p99_ms:
+            best = count
+    print(f"\nclients per core within p99 {args.max_p99_ms:.0f} ms: {best / args.cores:.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,337 @@
+"""
+In-process metrics shared by the backend, the producer and the bot.
+
+Counters, gauges and histograms live in a process-wide registry and are
+rendered in the Prometheus text exposition format: by the backend's
+/metrics route, and by start_metrics_server() in services without a web
+framework. Updating a metric is a dict lookup and an addition, cheap enough
+for per-message hot paths; metrics are meant to be updated from the event
+loop thread.
+
+Metrics are created (or looked up) by name, so modules can declare the ones
+they update at import time:
+
+    DB_WRITE_SECONDS = histogram("weather_db_write_seconds", "Time to store a batch")
+
+    with DB_WRITE_SECONDS.time():
+        ...
+
+    @STAGE_SECONDS.labels("stt").time()
+    async def transcribe(...):
+        ...
+"""
+import asyncio
+import bisect
+import functools
+import logging
+import math
+import os
+import time
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger(__name__)
+
+# Port of the standalone metrics endpoint of the producer and the bot; 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans a cache hit to a slow upstream call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Timer:
+    """
+    Times a block or a function into a histogram, as a context manager or a decorator.
+    """
+
+    def __init__(self, histogram: "Histogram"):
+        self._histogram = histogram
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._started)
+
+    def __call__(self, function):
+        histogram = self._histogram
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def timed_coroutine(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - started)
+            return timed_coroutine
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return timed
+
+
+class Metric(ABC):
+    """
+    A named metric, optionally split into children by label values.
+
+    A metric without label names is updated directly; one with label names
+    through labels(), which returns (and caches) the child for those values.
+    """
+
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+
+    def labels(self, *values):
+        """
+        Returns the child metric for the given label values, in labelnames order.
+        """
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        """
+        Returns a new unlabelled metric of the same kind, used as the child for one set of label values.
+        """
+
+    @abstractmethod
+    def _child_samples(self):
+        """
+        Yields (suffix, extra label, value) for this metric's own value.
+        """
+
+    def _samples(self):
+        """
+        Yields (suffix, label values, extra label, value) for every child.
+        """
+        children = self._children.items() if self.labelnames else [((), self)]
+        for values, child in children:
+            for suffix, extra, value in child._child_samples():
+                yield suffix, values, extra, value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """
+    A value that only goes up, e.g. messages processed. Names end in "_total".
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0
+
+    def _new_child(self):
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def _child_samples(self):
+        yield "", None, self.value
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down, e.g. connected clients.
+
+    A gauge can also be bound to a function with set_function(), which is
+    called on every scrape instead of tracking the value on the hot path.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0
+        self._function = None
+
+    def _new_child(self):
+        return Gauge(self.name, self.documentation)
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set_function(self, function):
+        """
+        Reports the return value of function at scrape time.
+        """
+        self._function = function
+
+    def _child_samples(self):
+        if self._function is None:
+            yield "", None, self.value
+            return
+        try:
+            yield "", None, self._function()
+        except Exception:
+            logger.exception("Gauge %s callback failed", self.name)
+
+
+class Histogram(Metric):
+    """
+    Counts observations in cumulative buckets, e.g. latencies in seconds.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def _new_child(self):
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def time(self) -> Timer:
+        """
+        Returns a Timer recording into this histogram.
+        """
+        return Timer(self)
+
+    def _child_samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            cumulative += count
+            yield "_bucket", f'le="{_format_value(bound)}"', cumulative
+        yield "_sum", None, self.sum
+        yield "_count", None, cumulative
+
+
+class Registry:
+    """
+    The set of metrics a process exposes.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+
+    def get_or_create(self, cls, name: str, documentation: str, labelnames: tuple = (), **options):
+        """
+        Returns the metric registered under name, creating it on first use.
+
+        Raises:
+            ValueError: If name is already registered as another kind of metric
+        """
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, documentation, labelnames, **options)
+        elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"Metric {name} is already registered as a {metric.kind} with labels {metric.labelnames}")
+        return metric
+
+    def render(self) -> str:
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+    return registry.get_or_create(Counter, name, documentation, labelnames)
+
+
+def gauge(name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+    return registry.get_or_create(Gauge, name, documentation, labelnames)
+
+
+def histogram(name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    return registry.get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+
+def render() -> str:
+    return registry.render()
+
+
+async def _serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5)
+        method, path = request.split(b" ", 2)[:2]
+        if method == b"GET" and path.split(b"?")[0] == b"/metrics":
+            status, content_type, body = "200 OK", CONTENT_TYPE, render().encode("utf-8")
+        else:
+            status, content_type, body = "404 Not Found", "text/plain", b"Not Found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode("ascii") + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(port: int = METRICS_PORT, host: str = "0.0.0.0"):
+    """
+    Serves GET /metrics on a small HTTP server running on the current event loop.
+
+    Args:
+        port (int): Port to listen on; nothing is started when 0
+        host (str): Interface to listen on
+
+    Returns:
+        asyncio.AbstractServer or None: The server, to be closed on shutdown
+    """
+    if not port:
+        return None
+    server = await asyncio.start_server(_serve, host, port)
+    logger.info("Serving metrics on %s:%d/metrics", host, port)
+    return server
@@ -0,0 +1,78 @@
+import json
+import msgpack
+import pytest
+from common.weather_record import FIELDS_V1, RecordError, decode_record, encode_record
+
+RECORD = {
+    "city": "Київ",
+    "city_key": "kyiv/kyiv",
+    "temperature": 21.5,
+    "feels_like": 20.0,
+    "humidity": 55,
+    "wind_speed": 3.2,
+    "weather_description": "уривчасті хмари",
+    "timestamp": 1_700_000_000,
+}
+
+
+def test_msgpack_round_trip():
+    data = encode_record(RECORD, "msgpack")
+    assert data[:1] != b"{"
+    assert decode_record(data) == RECORD
+
+
+def test_optional_fields_may_be_missing():
+    record = {"city": "Львів", "temperature": 10, "humidity": 80, "timestamp": 1_700_000_000}
+    decoded = decode_record(encode_record(record, "msgpack"))
+    assert decoded == {**{name: None for name, _ in FIELDS_V1}, **record}
+
+
+def test_legacy_json_is_decoded():
+    legacy = {"city": "Одеса", "temperature": 18.0, "humidity": 70, "weather_description": "ясно",
+              "timestamp": 1_700_000_000}
+    assert decode_record(json.dumps(legacy, ensure_ascii=False).encode("utf-8")) == legacy
+    assert decode_record(encode_record(RECORD, "json")) == RECORD
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    encode_record(RECORD, "msgpack")[:-5],
+    json.dumps(RECORD).encode("utf-8")[:-3],
+    b"[1, 2]",
+])
+def test_truncated_or_malformed_input_is_rejected(data):
+    with pytest.raises(RecordError):
+        decode_record(data)
+
+
+def test_unknown_version_is_rejected():
+    values = [99, *(RECORD[name] for name, _ in FIELDS_V1)]
+    with pytest.raises(RecordError, match="Unsupported schema version 99"):
+        decode_record(msgpack.packb(values, use_bin_type=True))
+
+
+def test_wrong_field_count_is_rejected():
+    values = [1, *(RECORD[name] for name, _ in FIELDS_V1)][:-1]
+    with pytest.raises(RecordError, match="Expected 8 fields"):
+        decode_record(msgpack.packb(values, use_bin_type=True))
+
+
+@pytest.mark.parametrize("field", ["city", "temperature", "humidity", "timestamp"])
+def test_missing_required_fields_are_rejected(field):
+    record = {name: value for name, value in RECORD.items() if name != field}
+    with pytest.raises(RecordError, match=f"Invalid {field}"):
+        decode_record(json.dumps(record).encode("utf-8"))
+    with pytest.raises(RecordError):
+        encode_record(record)
+
+
+def test_wrong_types_are_rejected():
+    for field, value in (("humidity", 55.5), ("humidity", True), ("timestamp", "now"), ("city", None)):
+        values = [1, *({**RECORD, field: value}[name] for name, _ in FIELDS_V1)]
+        with pytest.raises(RecordError, match=f"Invalid {field}"):
+            decode_record(msgpack.packb(values, use_bin_type=True))
+
+
+def test_record_error_is_a_value_error():
+    # The backend consumer dead-letters records on ValueError
+    assert issubclass(RecordError, ValueError)
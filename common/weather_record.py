@@ -0,0 +1,116 @@
+"""
+Wire format of the records published on 'weather-topic'.
+
+A record is a msgpack array whose first element is the schema version,
+followed by the fields of that version in a fixed order. Field names are not
+repeated in every message, and the first byte (a msgpack array header) can
+never be "{", so consumers tell binary records from legacy JSON ones without
+a side channel.
+
+Version 1 fields:
+    city (str), city_key (str or None), temperature (float), feels_like (float or None),
+    humidity (int), wind_speed (float or None), weather_description (str or None),
+    timestamp (int)
+
+A new version appends or changes fields under a new number; decoders keep
+accepting every older version so producers and consumers can be rolled out
+in any order.
+"""
+import json
+import os
+import msgpack
+
+SCHEMA_VERSION = 1
+# "msgpack" or "json"; json lets a producer keep talking to consumers that predate this module
+WEATHER_RECORD_FORMAT = os.getenv("WEATHER_RECORD_FORMAT", "msgpack")
+
+_NUMBER = (int, float)
+_OPTIONAL_STR = (str, type(None))
+_OPTIONAL_NUMBER = (int, float, type(None))
+
+# (name, accepted types) in wire order
+FIELDS_V1 = (
+    ("city", str),
+    ("city_key", _OPTIONAL_STR),
+    ("temperature", _NUMBER),
+    ("feels_like", _OPTIONAL_NUMBER),
+    ("humidity", int),
+    ("wind_speed", _OPTIONAL_NUMBER),
+    ("weather_description", _OPTIONAL_STR),
+    ("timestamp", int),
+)
+_SCHEMAS = {1: FIELDS_V1}
+
+
+class RecordError(ValueError):
+    """
+    Raised when a record cannot be decoded or does not match its schema.
+    """
+
+
+def _validate(record: dict, fields) -> dict:
+    for name, types in fields:
+        value = record.get(name)
+        # bool is an int subclass but never a valid reading
+        if not isinstance(value, types) or isinstance(value, bool):
+            raise RecordError(f"Invalid {name}: {value!r}")
+    return record
+
+
+def encode_record(record: dict, record_format: str = WEATHER_RECORD_FORMAT) -> bytes:
+    """
+    Serializes a weather record for Kafka.
+
+    Args:
+        record (dict): The record; optional fields may be missing
+        record_format (str): "msgpack" for the versioned binary format, "json" for the legacy one
+
+    Returns:
+        bytes: The message value
+
+    Raises:
+        RecordError: If the record does not match the current schema
+    """
+    _validate(record, FIELDS_V1)
+    if record_format == "json":
+        return json.dumps(record, ensure_ascii=False).encode("utf-8")
+    return msgpack.packb([SCHEMA_VERSION, *(record.get(name) for name, _ in FIELDS_V1)], use_bin_type=True)
+
+
+def decode_record(data: bytes) -> dict:
+    """
+    Parses and validates a weather record of any supported version.
+
+    Legacy JSON objects are accepted as well and validated against the
+    current schema.
+
+    Args:
+        data (bytes): The message value
+
+    Returns:
+        dict: The record keyed by field name
+
+    Raises:
+        RecordError: If the message is malformed or fails validation
+    """
+    if data[:1] == b"{":
+        try:
+            record = json.loads(data)
+        except ValueError as e:
+            raise RecordError(f"Malformed JSON record: {e}")
+        if not isinstance(record, dict):
+            raise RecordError("JSON record is not an object")
+        return _validate(record, FIELDS_V1)
+
+    try:
+        values = msgpack.unpackb(data, raw=False, strict_map_key=True)
+    except Exception as e:
+        raise RecordError(f"Malformed msgpack record: {e}")
+    if not isinstance(values, list) or not values:
+        raise RecordError("Record is not a versioned array")
+    fields = _SCHEMAS.get(values[0])
+    if fields is None:
+        raise RecordError(f"Unsupported schema version {values[0]!r}")
+    if len(values) - 1 != len(fields):
+        raise RecordError(f"Expected {len(fields)} fields for version {values[0]}, got {len(values) - 1}")
+    return _validate({name: value for (name, _), value in zip(fields, values[1:])}, fields)
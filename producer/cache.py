@@ -0,0 +1,274 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class CacheBackend(ABC):
+    """
+    Storage interface used by TTLCache.
+
+    The in-process InMemoryBackend is the default. A shared implementation
+    (e.g. Redis) only has to provide these four coroutines with the same
+    semantics, so several bot/producer replicas can share one cache.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        """
+        Returns the value stored under key, or None if it is missing or expired.
+        """
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: float):
+        """
+        Stores value under key for ttl seconds.
+        """
+
+    @abstractmethod
+    async def delete(self, key: str):
+        """
+        Removes key if present.
+        """
+
+    @abstractmethod
+    async def expires_at(self, key: str) -> Optional[float]:
+        """
+        Returns the Unix time at which key expires, or None if it is missing or expired.
+        """
+
+
+class InMemoryBackend(CacheBackend):
+    """
+    Size-bounded in-process cache with per-entry expiry and LRU eviction.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        """
+        Args:
+            max_size (int): Maximum number of entries kept before evicting the least recently used
+        """
+        self.max_size = max_size
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float):
+        self._entries[key] = (value, time.time() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    async def expires_at(self, key: str) -> Optional[float]:
+        # Unlike get(), does not count as a use for the LRU order
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry[1]
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    Size-bounded cache persisted in a local SQLite file, so entries survive restarts.
+
+    Values must be JSON-serializable. Queries run in a worker thread; the least
+    recently read entries are evicted once max_size is exceeded.
+    """
+
+    def __init__(self, path: str, max_size: int = 10000):
+        """
+        Args:
+            path (str): Path of the SQLite database file
+            max_size (int): Maximum number of entries kept
+        """
+        self.max_size = max_size
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+        self._db.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def _get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        return json.loads(row[0])
+
+    def _set(self, key: str, value: Any, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now + ttl, now),
+            )
+            excess = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_size
+            if excess > 0:
+                self._db.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                    (excess,),
+                )
+                self.evictions += excess
+            self._db.commit()
+
+    def _delete(self, key: str):
+        with self._lock:
+            self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._db.commit()
+
+    def _expires_at(self, key: str) -> Optional[float]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT expires_at FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: Any, ttl: float):
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._delete, key)
+
+    async def expires_at(self, key: str) -> Optional[float]:
+        return await asyncio.to_thread(self._expires_at, key)
+
+
+class TTLCache:
+    """
+    Read-through cache with single-flight loading and negative caching.
+
+    Concurrent misses for the same key share one in-flight load instead of
+    each calling the upstream. Results recognised as negative (errors) are
+    kept for a shorter TTL so a failing upstream is not hammered but recovers quickly.
+    """
+
+    def __init__(self, backend: CacheBackend = None, ttl: float = 600, negative_ttl: float = 30,
+                 is_negative: Callable[[Any], bool] = None):
+        """
+        Args:
+            backend (CacheBackend): Storage for cached values, in-memory LRU by default
+            ttl (float): Seconds a successful result stays cached
+            negative_ttl (float): Seconds a negative result stays cached
+            is_negative: Predicate telling whether a loaded value is a negative result
+        """
+        self.backend = backend if backend is not None else InMemoryBackend()
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.is_negative = is_negative or (lambda value: False)
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def get_or_load(self, key: str, load: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Returns the cached value for key, loading it with load() on a miss.
+
+        Args:
+            key (str): The cache key
+            load: Coroutine function fetching the value from the upstream
+
+        Returns:
+            Any: The cached or freshly loaded value
+        """
+        value = await self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(key, load))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded so that a cancelled caller does not abort the load for everyone else
+        return await asyncio.shield(task)
+
+    async def _load(self, key: str, load: Callable[[], Awaitable[Any]]) -> Any:
+        value = await load()
+        if value is not None:
+            await self.put(key, value)
+        return value
+
+    async def put(self, key: str, value: Any, ttl: float = None):
+        """
+        Stores a value obtained elsewhere under key, replacing the cached one.
+
+        Args:
+            key (str): The cache key
+            value (Any): The value, not None
+            ttl (float): Seconds to keep it, by default ttl or negative_ttl depending on the value
+        """
+        if ttl is None:
+            ttl = self.negative_ttl if self.is_negative(value) else self.ttl
+        await self.backend.set(key, value, ttl)
+
+    async def expires_at(self, key: str) -> Optional[float]:
+        """
+        Returns the Unix time at which the cached value of key expires, or None if there is none.
+        """
+        return await self.backend.expires_at(key)
+
+    async def invalidate(self, key: str):
+        await self.backend.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns hit/miss counters of the cache.
+
+        Returns:
+            Dict[str, Any]: hits, misses, coalesced (misses that joined an in-flight
+            load), hit_rate and, for the local backends, size and evictions
+        """
+        lookups = self.hits + self.misses + self.coalesced
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+        if isinstance(self.backend, (InMemoryBackend, SQLiteBackend)):
+            stats["size"] = len(self.backend)
+            stats["evictions"] = self.backend.evictions
+        return stats
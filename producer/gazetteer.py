@@ -0,0 +1,313 @@
+import csv
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_GAZETTEER_PATH = os.path.join(os.path.dirname(__file__), "data", "ua_settlements.csv")
+# Optional GeoNames country dump (e.g. UA.txt) with every Ukrainian city and village
+GEONAMES_PATH = os.getenv("GAZETTEER_GEONAMES_PATH")
+GAZETTEER_MIN_SIMILARITY = float(os.getenv("GAZETTEER_MIN_SIMILARITY", "0.72"))
+
+# Official Ukrainian romanization (KMU 2010); letters first in a word use the second form
+_TRANSLIT = {
+    "а": "a", "б": "b", "в": "v", "г": "h", "ґ": "g", "д": "d", "е": "e", "є": "ie",
+    "ж": "zh", "з": "z", "и": "y", "і": "i", "ї": "i", "й": "i", "к": "k", "л": "l",
+    "м": "m", "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch", "ь": "",
+    "ю": "iu", "я": "ia", "'": "",
+    # Russian letters, so that Russian spellings in transcripts fold to the same skeleton
+    "ы": "y", "э": "e", "ё": "e", "ъ": "",
+}
+_TRANSLIT_INITIAL = {"є": "ye", "ї": "yi", "й": "y", "ю": "yu", "я": "ya"}
+
+# Looser folding used for matching only: г/ґ and и/і/ї/й collapse, so Russian and
+# Ukrainian spellings ("Ужгород"/"Uzhgorod", "Киев"/"Kyiv") land close together
+_FOLD = dict(_TRANSLIT, **{"г": "g", "и": "i", "й": "i", "є": "e", "ю": "u", "я": "a"})
+
+# Case endings stripped when stemming, longest first
+_SUFFIXES = sorted([
+    "ому", "ого", "ими", "ій", "ий", "их", "ою", "ею", "єю", "ові", "еві", "єві",
+    "ами", "ями", "ах", "ях", "ам", "ям", "ом", "ем", "єм",
+    "і", "ї", "у", "ю", "а", "я", "е", "є", "и", "о", "ь",
+], key=len, reverse=True)
+_VOWELS = set("аеєиіїоуюя")
+_APOSTROPHES = re.compile(r"[ʼ’`´]")
+_NON_WORD = re.compile(r"[^\w']+")
+
+
+def transliterate(text: str) -> str:
+    """
+    Romanizes Ukrainian text using the official KMU 2010 rules.
+
+    Args:
+        text (str): Text in Ukrainian
+
+    Returns:
+        str: The romanized text, e.g. "Київ" -> "Kyiv", "Запоріжжя" -> "Zaporizhzhia"
+    """
+    result = []
+    at_word_start = True
+    for char in _APOSTROPHES.sub("'", text):
+        lower = char.lower()
+        if at_word_start and lower in _TRANSLIT_INITIAL:
+            latin = _TRANSLIT_INITIAL[lower]
+        else:
+            latin = _TRANSLIT.get(lower, lower)
+        if lower == "г" and result and result[-1].lower().endswith("z"):
+            latin = "gh"
+        if char != lower and latin:
+            latin = latin[0].upper() + latin[1:]
+        result.append(latin)
+        at_word_start = not char.isalpha() and char != "'"
+    return "".join(result)
+
+
+def _words(text: str) -> List[str]:
+    text = _APOSTROPHES.sub("'", text.lower()).replace("-", " ")
+    return [word.strip("'") for word in _NON_WORD.split(text) if word.strip("'")]
+
+
+def _fold(word: str) -> str:
+    return "".join(_FOLD.get(char, char) for char in word)
+
+
+def _stems(word: str) -> List[str]:
+    """
+    Returns the word and every stem left after removing one case ending.
+
+    All candidates are kept because the right cut is ambiguous without a
+    dictionary ("Львові" is "Львов-і", not "Льв-ові").
+    """
+    stems = [word]
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            stems.append(word[:-len(suffix)])
+    return stems
+
+
+def _alternations(stem: str) -> List[str]:
+    """
+    Returns the stem variants produced by the і/ї -> о/е/є vowel alternation
+    of Ukrainian nouns (Київ -> Києва, Львів -> Львова, Ріг -> Рогу).
+    """
+    if len(stem) >= 3 and stem[-1] not in _VOWELS and stem[-2] in ("і", "ї"):
+        replacements = ("о", "е") if stem[-2] == "і" else ("є",)
+        return [stem[:-2] + vowel + stem[-1] for vowel in replacements]
+    return []
+
+
+def _exact_key(words: Iterable[str]) -> str:
+    return " ".join(_fold(word) for word in words)
+
+
+def _stem_keys(words: List[str]) -> List[str]:
+    variants = []
+    for word in words:
+        stems = _stems(word)
+        variants.append(stems + [variant for stem in stems for variant in _alternations(stem)])
+    keys = [""]
+    for options in variants:
+        keys = [f"{key} {_fold(option)}".strip() for key in keys for option in options]
+    return keys
+
+
+def _trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Settlement:
+    """
+    A populated place of Ukraine.
+
+    Attributes:
+        name (str): Ukrainian name
+        name_en (str): Romanized name
+        oblast (str): Oblast (region) the settlement belongs to
+        lat (float): Latitude
+        lon (float): Longitude
+        population (int): Approximate population, used to rank ambiguous matches
+        key (str): Stable identifier, unique within the gazetteer
+    """
+
+    __slots__ = ("name", "name_en", "oblast", "lat", "lon", "population", "key")
+
+    def __init__(self, name: str, oblast: str, lat: float, lon: float, population: int = 0):
+        self.name = name
+        self.name_en = transliterate(name)
+        self.oblast = oblast
+        self.lat = lat
+        self.lon = lon
+        self.population = population
+        self.key = f"{self.name_en}/{transliterate(oblast)}".lower().replace(" ", "-")
+
+    def __repr__(self) -> str:
+        return f"Settlement({self.name!r}, {self.oblast!r}, {self.lat}, {self.lon})"
+
+
+class Gazetteer:
+    """
+    In-memory index of Ukrainian settlements for case-, inflection- and typo-tolerant lookup.
+
+    Every name and alternative name is indexed three ways:
+    1. its exact folded spelling
+    2. the stems of its words, so inflected forms ("у Львові", "Києва") match
+    3. character trigrams of the stemmed form, used as a fuzzy fallback
+    The first two are plain dict lookups; trigram scoring only touches the
+    candidates sharing a trigram with the query.
+    """
+
+    def __init__(self, settlements: Iterable[Tuple[Settlement, List[str]]]):
+        """
+        Args:
+            settlements: Pairs of a Settlement and its alternative names
+        """
+        self.settlements: Dict[str, Settlement] = {}
+        self._exact: Dict[str, List[Settlement]] = {}
+        self._stemmed: Dict[str, List[Settlement]] = {}
+        self._trigram_index: Dict[str, set] = {}
+        self._trigram_counts: Dict[str, int] = {}
+        self.max_words = 1
+        for settlement, alt_names in settlements:
+            self.add(settlement, alt_names)
+
+    def __len__(self) -> int:
+        return len(self.settlements)
+
+    def add(self, settlement: Settlement, alt_names: Iterable[str] = ()):
+        base_key, suffix = settlement.key, 1
+        while settlement.key in self.settlements:
+            suffix += 1
+            settlement.key = f"{base_key}-{suffix}"
+        self.settlements[settlement.key] = settlement
+        for name in (settlement.name, settlement.name_en, *alt_names):
+            words = _words(name)
+            if not words:
+                continue
+            self.max_words = max(self.max_words, len(words))
+            self._exact.setdefault(_exact_key(words), []).append(settlement)
+            for key in _stem_keys(words):
+                self._stemmed.setdefault(key, []).append(settlement)
+                trigrams = _trigrams(key)
+                self._trigram_counts[key] = len(trigrams)
+                for trigram in trigrams:
+                    self._trigram_index.setdefault(trigram, set()).add(key)
+
+    def get(self, key: str) -> Optional[Settlement]:
+        return self.settlements.get(key)
+
+    @staticmethod
+    def _best(candidates: List[Settlement]) -> Settlement:
+        return max(candidates, key=lambda settlement: settlement.population)
+
+    def _fuzzy(self, key: str) -> Tuple[float, Optional[str]]:
+        query = _trigrams(key)
+        counts: Dict[str, int] = {}
+        for trigram in query:
+            for candidate in self._trigram_index.get(trigram, ()):
+                counts[candidate] = counts.get(candidate, 0) + 1
+        best_score, best_key = 0.0, None
+        for candidate, common in counts.items():
+            score = 2 * common / (len(query) + self._trigram_counts[candidate])
+            if score > best_score:
+                best_score, best_key = score, candidate
+        return best_score, best_key
+
+    def match(self, text: str) -> Optional[Settlement]:
+        """
+        Finds the settlement mentioned in free text such as a voice transcript.
+
+        Word windows are tried longest first, so "Кривий Ріг" wins over "Ріг".
+        Exact spellings beat inflected forms, which beat fuzzy matches;
+        ties go to the more populous settlement.
+
+        Args:
+            text (str): The text to search, e.g. "Яка погода у Львові?"
+
+        Returns:
+            Settlement or None: The best match, or None if nothing is similar enough
+        """
+        words = _words(text)
+        windows = [
+            words[start:start + size]
+            for size in range(min(self.max_words, len(words)), 0, -1)
+            for start in range(len(words) - size + 1)
+        ]
+        for window in windows:
+            candidates = self._exact.get(_exact_key(window))
+            if candidates:
+                return self._best(candidates)
+        for window in windows:
+            for key in _stem_keys(window):
+                candidates = self._stemmed.get(key)
+                if candidates:
+                    return self._best(candidates)
+
+        best_score, best_key = 0.0, None
+        queries = {stem_key for window in windows for stem_key in _stem_keys(window)}
+        for query in queries:
+            score, key = self._fuzzy(query)
+            if score > best_score:
+                best_score, best_key = score, key
+        if best_key is not None and best_score >= GAZETTEER_MIN_SIMILARITY:
+            return self._best(self._stemmed[best_key])
+        return None
+
+
+def _read_csv(path: str):
+    with open(path, encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            settlement = Settlement(
+                row["name"], row["oblast"], float(row["lat"]), float(row["lon"]),
+                int(row["population"] or 0),
+            )
+            alt_names = [name for name in row["alt_names"].split("|") if name]
+            yield settlement, alt_names
+
+
+_UKRAINIAN_LETTERS = re.compile(r"[іїєґІЇЄҐ]")
+_CYRILLIC = re.compile(r"[а-яА-ЯіїєґІЇЄҐ]")
+
+
+def _read_geonames(path: str):
+    """
+    Reads populated places (feature class P) from a GeoNames country dump.
+
+    The Ukrainian name is taken from the alternate names; the oblast is left as the
+    GeoNames admin1 code because the dump does not carry region names.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 15 or fields[6] != "P":
+                continue
+            alternates = [name for name in fields[3].split(",") if name]
+            cyrillic = [name for name in alternates if _CYRILLIC.search(name)]
+            ukrainian = next((name for name in cyrillic if _UKRAINIAN_LETTERS.search(name)), None)
+            name = ukrainian or (cyrillic[0] if cyrillic else fields[1])
+            settlement = Settlement(
+                name, f"UA-{fields[10]}", float(fields[4]), float(fields[5]),
+                int(fields[14] or 0),
+            )
+            yield settlement, [fields[1], fields[2], *cyrillic]
+
+
+@lru_cache(maxsize=1)
+def get_gazetteer() -> Gazetteer:
+    """
+    Returns the process-wide gazetteer, loading it on first use.
+
+    The bundled list of cities and towns is always loaded; if GAZETTEER_GEONAMES_PATH
+    points to a GeoNames dump, every populated place in it is indexed as well.
+
+    Returns:
+        Gazetteer: The shared gazetteer
+    """
+    gazetteer = Gazetteer(_read_csv(DEFAULT_GAZETTEER_PATH))
+    if GEONAMES_PATH:
+        known = {(s.name, round(s.lat, 1), round(s.lon, 1)) for s in gazetteer.settlements.values()}
+        for settlement, alt_names in _read_geonames(GEONAMES_PATH):
+            if (settlement.name, round(settlement.lat, 1), round(settlement.lon, 1)) not in known:
+                gazetteer.add(settlement, alt_names)
+    return gazetteer
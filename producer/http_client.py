@@ -0,0 +1,126 @@
+import aiohttp
+import asyncio
+import json
+import logging
+import random
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class PooledHTTPClient:
+    """
+    Long-lived aiohttp client with keep-alive pooling, DNS caching, timeouts,
+    bounded concurrency and jittered retries.
+
+    The underlying ClientSession is created by start() and released by close();
+    requests made before start() open it lazily.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 20, dns_ttl: int = 300,
+                 total_timeout: float = 10, connect_timeout: float = 3,
+                 max_concurrency: int = 20, retries: int = 3,
+                 backoff_base: float = 0.2, backoff_max: float = 5):
+        """
+        Args:
+            limit (int): Maximum number of pooled connections
+            limit_per_host (int): Maximum number of pooled connections per host
+            dns_ttl (int): Seconds resolved addresses are cached
+            total_timeout (float): Timeout of a single attempt in seconds
+            connect_timeout (float): Timeout for establishing a connection in seconds
+            max_concurrency (int): Maximum number of requests in flight at once
+            retries (int): Additional attempts after a 429/5xx response or a network error
+            backoff_base (float): Base delay of the exponential backoff in seconds
+            backoff_max (float): Upper bound of a single backoff delay in seconds
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.timeout = aiohttp.ClientTimeout(total=total_timeout, connect=connect_timeout)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self):
+        """
+        Opens the pooled session. Safe to call more than once.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                use_dns_cache=True,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self):
+        """
+        Closes the session and every pooled connection.
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        # "Full jitter": spreads retries of concurrent callers over the whole window
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    async def _read_error_body(response: aiohttp.ClientResponse) -> Any:
+        # Error pages of proxies and gateways are often HTML or plain text
+        text = await response.text(errors="replace")
+        try:
+            return json.loads(text)
+        except ValueError:
+            return text
+
+    async def get_json(self, url: str, params: Dict[str, Any] = None) -> Tuple[int, Any]:
+        """
+        Performs a GET request and decodes the JSON body, retrying transient failures.
+
+        Only successful responses must carry JSON; the body of an error response
+        is decoded if it is JSON and returned as text otherwise.
+
+        Args:
+            url (str): The request URL
+            params (Dict[str, Any]): Query string parameters
+
+        Returns:
+            Tuple[int, Any]: The HTTP status and the decoded body of the last attempt
+
+        Raises:
+            aiohttp.ClientError: If every attempt failed with a network error
+            asyncio.TimeoutError: If every attempt timed out
+            ValueError: If a successful response is not valid JSON
+        """
+        await self.start()
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    async with self._session.get(url, params=params) as response:
+                        status = response.status
+                        retry_after = response.headers.get("Retry-After")
+                        if response.ok:
+                            return status, await response.json(content_type=None)
+                        data = await self._read_error_body(response)
+                if status not in RETRY_STATUSES or attempt >= self.retries:
+                    return status, data
+                logger.warning("HTTP %s from %s, retrying (attempt %d)", status, url, attempt + 1)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt >= self.retries:
+                    raise
+                retry_after = None
+                logger.warning("Request to %s failed: %r, retrying (attempt %d)", url, e, attempt + 1)
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+            attempt += 1
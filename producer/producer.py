@@ -0,0 +1,217 @@
+import asyncio
+import heapq
+import logging
+import os
+import random
+import signal
+import time
+from typing import List
+from aiokafka import AIOKafkaProducer
+from common.logging_config import configure_logging
+from common.metrics import counter, start_metrics_server
+from common.weather_record import encode_record
+from producer.gazetteer import Settlement, get_gazetteer
+from producer.rate_limit import TokenBucket
+from producer.weather_api_client import fetch_weather_record, start_http_client, close_http_client
+
+logger = logging.getLogger(__name__)
+
+KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092")
+KAFKA_TOPIC = os.getenv("KAFKA_TOPIC", "weather-topic")
+KAFKA_LINGER_MS = int(os.getenv("KAFKA_LINGER_MS", "50"))
+KAFKA_MAX_BATCH_BYTES = int(os.getenv("KAFKA_MAX_BATCH_BYTES", str(64 * 1024)))
+KAFKA_COMPRESSION = os.getenv("KAFKA_COMPRESSION", "gzip")
+
+# Comma-separated city names, or a file with one name per line; every gazetteer settlement by default
+PRODUCER_CITIES = os.getenv("PRODUCER_CITIES")
+PRODUCER_CITIES_FILE = os.getenv("PRODUCER_CITIES_FILE")
+PRODUCER_INTERVAL_S = float(os.getenv("PRODUCER_INTERVAL_S", "600"))
+PRODUCER_JITTER = float(os.getenv("PRODUCER_JITTER", "0.1"))
+PRODUCER_CONCURRENCY = int(os.getenv("PRODUCER_CONCURRENCY", "16"))
+# Upstream rate cap in calls per minute (60 on the OpenWeatherMap free plan) and the share of it we use
+WEATHER_API_CALLS_PER_MIN = float(os.getenv("WEATHER_API_CALLS_PER_MIN", "60"))
+WEATHER_API_BUDGET_SHARE = float(os.getenv("WEATHER_API_BUDGET_SHARE", "0.9"))
+PRODUCER_STATS_INTERVAL_S = float(os.getenv("PRODUCER_STATS_INTERVAL_S", "60"))
+
+PRODUCER_RECORDS = counter("producer_records_total", "Weather records by outcome", ("outcome",))
+
+
+def load_cities() -> List[Settlement]:
+    """
+    Resolves the configured city list against the gazetteer.
+
+    Returns:
+        List[Settlement]: The settlements to poll, without duplicates
+    """
+    gazetteer = get_gazetteer()
+    if PRODUCER_CITIES_FILE:
+        with open(PRODUCER_CITIES_FILE, encoding="utf-8") as f:
+            names = [line.strip() for line in f]
+    elif PRODUCER_CITIES:
+        names = PRODUCER_CITIES.split(",")
+    else:
+        return list(gazetteer.settlements.values())
+
+    settlements = {}
+    for name in filter(None, (name.strip() for name in names)):
+        settlement = gazetteer.match(name)
+        if settlement is None:
+            logger.warning("Unknown city %r, skipping", name)
+            continue
+        settlements[settlement.key] = settlement
+    return list(settlements.values())
+
+
+class WeatherProducer:
+    """
+    Polls the weather of many cities on a jittered schedule and publishes it to Kafka.
+
+    Each city is due every PRODUCER_INTERVAL_S seconds (+/- PRODUCER_JITTER), with first
+    polls spread over one interval so the load is even. Due cities are fetched by at most
+    PRODUCER_CONCURRENCY tasks, paced by a token bucket kept under the API rate cap, and
+    published keyed by city so all updates of a city land in one partition in order.
+    """
+
+    def __init__(self, cities: List[Settlement]):
+        self.cities = cities
+        self.bucket = TokenBucket(rate=WEATHER_API_CALLS_PER_MIN * WEATHER_API_BUDGET_SHARE / 60)
+        self._semaphore = asyncio.Semaphore(PRODUCER_CONCURRENCY)
+        self._stopping = asyncio.Event()
+        self._kafka = None
+        self._tasks = set()
+        self._fetched = self._fetch_errors = self._published = self._publish_errors = 0
+        self._window_start = time.monotonic()
+
+        required_rate = len(cities) / PRODUCER_INTERVAL_S
+        if required_rate > self.bucket.rate:
+            logger.warning(
+                "%d cities every %.0f s need %.2f calls/s but the budget is %.2f; polls will lag",
+                len(cities), PRODUCER_INTERVAL_S, required_rate, self.bucket.rate,
+            )
+
+    def _next_due(self, now: float) -> float:
+        return now + PRODUCER_INTERVAL_S * random.uniform(1 - PRODUCER_JITTER, 1 + PRODUCER_JITTER)
+
+    async def start(self):
+        self._kafka = AIOKafkaProducer(
+            bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+            linger_ms=KAFKA_LINGER_MS,
+            max_batch_size=KAFKA_MAX_BATCH_BYTES,
+            compression_type=KAFKA_COMPRESSION,
+            key_serializer=lambda key: key.encode("utf-8"),
+            value_serializer=encode_record,
+        )
+        await self._kafka.start()
+        await start_http_client()
+        logger.info("Producer started: %d cities, topic %s", len(self.cities), KAFKA_TOPIC)
+
+    def request_stop(self):
+        """
+        Asks run() to return after the current poll is scheduled.
+        """
+        self._stopping.set()
+
+    async def stop(self):
+        """
+        Stops scheduling, waits for in-flight polls and flushes pending Kafka batches.
+        """
+        self._stopping.set()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._kafka:
+            await self._kafka.stop()
+        await close_http_client()
+        logger.info("Producer stopped")
+
+    async def run(self):
+        """
+        Runs the polling schedule until stop() is called.
+        """
+        now = time.monotonic()
+        schedule = [
+            (now + PRODUCER_INTERVAL_S * index / max(len(self.cities), 1), index)
+            for index in range(len(self.cities))
+        ]
+        heapq.heapify(schedule)
+        while not self._stopping.is_set() and schedule:
+            due, index = schedule[0]
+            delay = due - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+            heapq.heapreplace(schedule, (self._next_due(max(due, time.monotonic())), index))
+
+            await self.bucket.acquire()
+            await self._semaphore.acquire()
+            task = asyncio.create_task(self._poll(self.cities[index]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            self._report_stats()
+
+    async def _poll(self, settlement: Settlement):
+        try:
+            try:
+                record = await fetch_weather_record(settlement)
+            except Exception as e:
+                self._fetch_errors += 1
+                PRODUCER_RECORDS.labels("fetch_failed").inc()
+                logger.warning("Fetching %s failed: %s", settlement.name, e)
+                return
+            self._fetched += 1
+            try:
+                delivery = await self._kafka.send(KAFKA_TOPIC, record, key=settlement.key)
+            except Exception as e:
+                self._publish_errors += 1
+                PRODUCER_RECORDS.labels("publish_failed").inc()
+                logger.error("Publishing %s failed: %s", settlement.name, e)
+                return
+        finally:
+            self._semaphore.release()
+        delivery.add_done_callback(self._on_delivery)
+
+    def _on_delivery(self, future: asyncio.Future):
+        if future.cancelled() or future.exception():
+            self._publish_errors += 1
+            PRODUCER_RECORDS.labels("publish_failed").inc()
+            logger.error("Kafka delivery failed: %s", future.exception() if not future.cancelled() else "cancelled")
+        else:
+            self._published += 1
+            PRODUCER_RECORDS.labels("published").inc()
+
+    def _report_stats(self):
+        elapsed = time.monotonic() - self._window_start
+        if elapsed < PRODUCER_STATS_INTERVAL_S:
+            return
+        logger.info(
+            "Fetched %.2f/s (%d errors), published %.2f/s (%d errors), %d polls in flight",
+            self._fetched / elapsed, self._fetch_errors, self._published / elapsed,
+            self._publish_errors, len(self._tasks),
+        )
+        self._fetched = self._fetch_errors = self._published = self._publish_errors = 0
+        self._window_start = time.monotonic()
+
+
+async def main():
+    """
+    Entry point of the producer service; runs until SIGINT/SIGTERM.
+    """
+    producer = WeatherProducer(load_cities())
+    metrics_server = await start_metrics_server()
+    await producer.start()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, producer.request_stop)
+    try:
+        await producer.run()
+    finally:
+        await producer.stop()
+        if metrics_server:
+            metrics_server.close()
+
+
+if __name__ == "__main__":
+    configure_logging("producer")
+    asyncio.run(main())
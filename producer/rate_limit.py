@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Asynchronous token bucket rate limiter.
+
+    Tokens refill continuously at `rate` per second up to `capacity`; acquire()
+    waits until a token is available, so callers are smoothed to the target rate
+    with bursts of at most `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        Args:
+            rate (float): Tokens added per second
+            capacity (float): Maximum number of stored tokens, defaults to one second's worth
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """
+        Takes tokens if they are available right now.
+
+        Returns:
+            bool: Whether the tokens were taken
+        """
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens: float = 1) -> float:
+        """
+        Seconds until tokens will be available, 0 if they are now.
+        """
+        self._refill()
+        return max(0.0, (tokens - self._tokens) / self.rate)
+
+    async def acquire(self, tokens: float = 1):
+        """
+        Waits until tokens are available and takes them.
+
+        Waiters are served in order, so a steady stream of callers cannot starve one.
+        """
+        async with self._lock:
+            while not self.try_acquire(tokens):
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
@@ -0,0 +1,113 @@
+import asyncio
+import pytest
+from producer.cache import CacheBackend, InMemoryBackend, SQLiteBackend, TTLCache
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        CacheBackend()
+
+
+def test_concurrent_misses_share_one_load():
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"temperature": 20}
+
+    async def run():
+        cache = TTLCache()
+        results = await asyncio.gather(*(cache.get_or_load("kyiv", load) for _ in range(10)))
+        return results, cache.stats()
+
+    results, stats = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(result == {"temperature": 20} for result in results)
+    assert stats["misses"] == 1 and stats["coalesced"] == 9
+
+
+def test_cancelled_caller_does_not_abort_the_shared_load():
+    async def load():
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    async def run():
+        cache = TTLCache()
+        first = asyncio.create_task(cache.get_or_load("kyiv", load))
+        second = asyncio.create_task(cache.get_or_load("kyiv", load))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "ok"
+
+
+def test_negative_entries_expire_after_the_negative_ttl():
+    values = iter([{"error": "upstream down"}, {"temperature": 20}])
+
+    async def load():
+        return next(values)
+
+    async def run():
+        cache = TTLCache(ttl=60, negative_ttl=0.05, is_negative=lambda value: "error" in value)
+        first = await cache.get_or_load("kyiv", load)
+        cached = await cache.get_or_load("kyiv", load)
+        await asyncio.sleep(0.1)
+        return first, cached, await cache.get_or_load("kyiv", load)
+
+    first, cached, refreshed = asyncio.run(run())
+    assert first == cached == {"error": "upstream down"}
+    assert refreshed == {"temperature": 20}
+
+
+def test_in_memory_backend_evicts_least_recently_used():
+    async def run():
+        backend = InMemoryBackend(max_size=2)
+        await backend.set("a", 1, 60)
+        await backend.set("b", 2, 60)
+        await backend.get("a")
+        await backend.set("c", 3, 60)
+        return [await backend.get(key) for key in "abc"], backend.evictions
+
+    assert asyncio.run(run()) == ([1, None, 3], 1)
+
+
+def test_sqlite_backend_round_trip_survives_reopening(tmp_path):
+    path = str(tmp_path / "cache.db")
+    value = {"city": "Київ", "temperature": 20.5, "tags": ["ясно"]}
+
+    async def run():
+        await SQLiteBackend(path).set("kyiv", value, 60)
+        reopened = SQLiteBackend(path)
+        return await reopened.get("kyiv"), await reopened.expires_at("kyiv"), await reopened.get("lviv")
+
+    stored, expires_at, missing = asyncio.run(run())
+    assert stored == value
+    assert expires_at is not None
+    assert missing is None
+
+
+def test_sqlite_backend_expires_entries(tmp_path):
+    async def run():
+        backend = SQLiteBackend(str(tmp_path / "cache.db"))
+        await backend.set("kyiv", {"temperature": 20}, 0.05)
+        fresh = await backend.get("kyiv")
+        await asyncio.sleep(0.1)
+        return fresh, await backend.get("kyiv"), await backend.expires_at("kyiv")
+
+    assert asyncio.run(run()) == ({"temperature": 20}, None, None)
+
+
+def test_sqlite_backend_evicts_least_recently_read(tmp_path):
+    async def run():
+        backend = SQLiteBackend(str(tmp_path / "cache.db"), max_size=2)
+        await backend.set("a", 1, 60)
+        await asyncio.sleep(0.01)
+        await backend.set("b", 2, 60)
+        await asyncio.sleep(0.01)
+        await backend.get("a")
+        await backend.set("c", 3, 60)
+        return [await backend.get(key) for key in "abc"], len(backend)
+
+    assert asyncio.run(run()) == ([1, None, 3], 2)
@@ -0,0 +1,63 @@
+import pytest
+from producer.gazetteer import Gazetteer, Settlement, get_gazetteer, transliterate
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("Київ", "Kyiv"),
+    ("Запоріжжя", "Zaporizhzhia"),
+    ("Біла Церква", "Bila Tserkva"),
+    ("Хмельницький", "Khmelnytskyi"),
+    ("Ізмаїл", "Izmail"),
+    ("Щастя", "Shchastia"),
+    ("Юрій", "Yurii"),
+    ("Яготин", "Yahotyn"),
+    ("Згорани", "Zghorany"),
+    ("Зв'ягель", "Zviahel"),
+])
+def test_transliteration_follows_the_kmu_table(name, expected):
+    assert transliterate(name) == expected
+
+
+@pytest.mark.parametrize("text, key", [
+    # Exact spellings, any case, in English too
+    ("Київ", "kyiv/kyiv"),
+    ("ЛЬВІВ", "lviv/lvivska"),
+    ("Kyiv", "kyiv/kyiv"),
+    # Inflected forms and names inside a sentence
+    ("у Києві", "kyiv/kyiv"),
+    ("Києва", "kyiv/kyiv"),
+    ("в Харкові", "kharkiv/kharkivska"),
+    ("Одесі", "odesa/odeska"),
+    ("у Запоріжжі", "zaporizhzhia/zaporizka"),
+    ("Черкасах", "cherkasy/cherkaska"),
+    ("Хмельницькому", "khmelnytskyi/khmelnytska"),
+    ("Рівного", "rivne/rivnenska"),
+    ("Івано-Франківську", "ivano-frankivsk/ivano-frankivska"),
+    ("в Білій Церкві", "bila-tserkva/kyivska"),
+    ("Кривому Розі", "kryvyi-rih/dnipropetrovska"),
+    ("Яка погода у місті Вінниця", "vinnytsia/vinnytska"),
+    # Recognition errors and Russian spellings
+    ("Лвів", "lviv/lvivska"),
+    ("Кремечук", "kremenchuk/poltavska"),
+    ("Вініця", "vinnytsia/vinnytska"),
+    ("Бiла Церква", "bila-tserkva/kyivska"),
+    ("Чернигів", "chernihiv/chernihivska"),
+    ("Хмельницкий", "khmelnytskyi/khmelnytska"),
+    ("Днипро", "dnipro/dnipropetrovska"),
+])
+def test_names_resolve_to_the_expected_settlement(text, key):
+    settlement = get_gazetteer().match(text)
+    assert settlement is not None and settlement.key == key
+
+
+@pytest.mark.parametrize("text", ["Абракадабра", "Погода", "", "   "])
+def test_unknown_names_resolve_to_none(text):
+    assert get_gazetteer().match(text) is None
+
+
+def test_duplicate_names_get_distinct_keys_and_the_larger_wins():
+    small = Settlement("Миколаївка", "Донецька", 48.0, 37.0, population=1000)
+    large = Settlement("Миколаївка", "Донецька", 48.8, 37.6, population=15000)
+    gazetteer = Gazetteer([(small, []), (large, [])])
+    assert (small.key, large.key) == ("mykolaivka/donetska", "mykolaivka/donetska-2")
+    assert gazetteer.match("у Миколаївці") is large
@@ -0,0 +1,27 @@
+import asyncio
+from producer import weather_api_client
+
+
+def test_unknown_city_is_not_sent_to_the_api(monkeypatch):
+    async def get_json(*args, **kwargs):
+        raise AssertionError("the weather API must not be called")
+
+    monkeypatch.setattr(weather_api_client.http_client, "get_json", get_json)
+    result = asyncio.run(weather_api_client.get_weather_by_city("  Абракадабра "))
+    assert result == {"error": "Місто не знайдено: Абракадабра"}
+
+
+def test_known_city_is_queried_by_coordinates(monkeypatch):
+    calls = []
+
+    async def get_json(url, params=None):
+        calls.append(params)
+        return 200, {"name": "Lviv", "dt": 1_700_000_000, "main": {"temp": 5.0, "feels_like": 3.0, "humidity": 80},
+                     "wind": {"speed": 4.0}, "weather": [{"description": "хмарно"}]}
+
+    monkeypatch.setattr(weather_api_client, "WEATHER_API_KEY", "test")
+    monkeypatch.setattr(weather_api_client.http_client, "get_json", get_json)
+    monkeypatch.setattr(weather_api_client, "weather_cache", weather_api_client.TTLCache())
+    result = asyncio.run(weather_api_client.get_weather_by_city("у Львові"))
+    assert result["city"] == "Львів" and result["temp"] == 5.0
+    assert len(calls) == 1 and "q" not in calls[0] and {"lat", "lon"} <= calls[0].keys()
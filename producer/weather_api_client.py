@@ -1,31 +1,93 @@
-import aiohttp
 import os
 import logging
 from datetime import datetime
 from typing import Dict, Any
+from common.metrics import counter, gauge, histogram
+from producer.cache import TTLCache, InMemoryBackend
+from producer.http_client import PooledHTTPClient
+from producer.gazetteer import Settlement, get_gazetteer
 
-# Налаштування детального логування
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('weather_api.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
-WEATHER_API_URL = "https://api.openweathermap.org/data/2.5/weather"
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", "https://api.openweathermap.org/data/2.5/weather")
+
+WEATHER_CACHE_TTL_S = float(os.getenv("WEATHER_CACHE_TTL_S", "600"))
+WEATHER_CACHE_NEGATIVE_TTL_S = float(os.getenv("WEATHER_CACHE_NEGATIVE_TTL_S", "30"))
+WEATHER_CACHE_MAX_SIZE = int(os.getenv("WEATHER_CACHE_MAX_SIZE", "1024"))
+
+WEATHER_HTTP_MAX_CONNECTIONS = int(os.getenv("WEATHER_HTTP_MAX_CONNECTIONS", "50"))
+WEATHER_HTTP_MAX_CONCURRENCY = int(os.getenv("WEATHER_HTTP_MAX_CONCURRENCY", "20"))
+WEATHER_HTTP_TIMEOUT_S = float(os.getenv("WEATHER_HTTP_TIMEOUT_S", "5"))
+WEATHER_HTTP_RETRIES = int(os.getenv("WEATHER_HTTP_RETRIES", "2"))
+
+WEATHER_API_REQUESTS = counter("weather_api_requests_total", "Weather API calls, by outcome", ("outcome",))
+WEATHER_API_SECONDS = histogram("weather_api_request_seconds", "Latency of weather API calls")
+
+# Shared by every caller in the process; pass another CacheBackend to share it between replicas
+weather_cache = TTLCache(
+    backend=InMemoryBackend(max_size=WEATHER_CACHE_MAX_SIZE),
+    ttl=WEATHER_CACHE_TTL_S,
+    negative_ttl=WEATHER_CACHE_NEGATIVE_TTL_S,
+    is_negative=lambda result: "error" in result,
+)
+gauge("weather_cache_hit_ratio", "Share of weather lookups served from the cache").set_function(
+    lambda: weather_cache.stats()["hit_rate"]
+)
+gauge("weather_cache_entries", "Entries in the weather cache").set_function(
+    lambda: weather_cache.stats().get("size", 0)
+)
+
+# One pooled client per process; opened by start_http_client() at service startup
+http_client = PooledHTTPClient(
+    limit=WEATHER_HTTP_MAX_CONNECTIONS,
+    limit_per_host=WEATHER_HTTP_MAX_CONNECTIONS,
+    total_timeout=WEATHER_HTTP_TIMEOUT_S,
+    max_concurrency=WEATHER_HTTP_MAX_CONCURRENCY,
+    retries=WEATHER_HTTP_RETRIES,
+)
+
+
+async def start_http_client():
+    """
+    Opens the pooled HTTP client used for weather API calls.
+    """
+    await http_client.start()
+
+
+async def close_http_client():
+    """
+    Closes the pooled HTTP client and its connections.
+    """
+    await http_client.close()
+
+
+def normalize_city(city: str) -> str:
+    """
+    Normalizes a city name to the form sent to the weather API.
+
+    Args:
+        city (str): The city name, in Ukrainian or English
+
+    Returns:
+        str: The romanized name of the matching gazetteer settlement, otherwise the trimmed input
+    """
+    settlement = get_gazetteer().match(city)
+    return settlement.name_en if settlement else " ".join(city.split())
 
 
 async def get_weather_by_city(city: str) -> Dict[str, Any]:
     """
-    Retrieves weather data for a specified city with detailed logging of each step.
+    Retrieves weather data for a specified city, served from weather_cache when fresh.
+
+    The city is resolved through the gazetteer and queried by coordinates; names the
+    gazetteer does not know get an error without any API call. Concurrent requests for
+    the same city share a single upstream call, and errors are cached for
+    WEATHER_CACHE_NEGATIVE_TTL_S.
 
     Args:
         city (str): The name of the city to get weather data for.
-                   Supports Ukrainian city names which are normalized to English.
+                   Ukrainian names may be inflected or misspelled.
 
     Returns:
         Dict[str, Any]: A dictionary containing weather data with the following keys:
@@ -41,55 +103,182 @@ async def get_weather_by_city(city: str) -> Dict[str, Any]:
     Raises:
         ValueError: If the API key is not found or if the API returns an error
     """
-    logger.debug(f"Початок обробки запиту для міста: {city}")
+    settlement = get_gazetteer().match(city)
+    if settlement is None:
+        normalized_city = " ".join(city.split())
+        logger.info("No settlement found for %s", normalized_city)
+        return {"error": f"Місто не знайдено: {normalized_city}"}
+    return await get_weather_for_settlement(settlement)
+
+
+async def get_weather_for_settlement(settlement: Settlement) -> Dict[str, Any]:
+    """
+    Retrieves weather data for a gazetteer settlement by its coordinates.
+
+    Results are cached under the settlement key, so every spelling of the
+    same place shares one cache entry.
+
+    Args:
+        settlement (Settlement): The settlement to get weather data for
+
+    Returns:
+        Dict[str, Any]: The weather data named after the settlement's Ukrainian name.
+                        See get_weather_by_city() for the structure.
+    """
+    return await weather_cache.get_or_load(settlement.key, lambda: fetch_weather_for_settlement(settlement))
+
+
+async def fetch_weather_for_settlement(settlement: Settlement) -> Dict[str, Any]:
+    """
+    Fetches the weather of a settlement from the API, bypassing weather_cache.
+
+    Used to refresh cache entries ahead of their expiry; the caller decides
+    whether to store the result.
+
+    Args:
+        settlement (Settlement): The settlement to get weather data for
+
+    Returns:
+        Dict[str, Any]: The weather data, or {"error": ...} if the request failed.
+                        See get_weather_by_city() for the structure.
+    """
+    params = {"lat": settlement.lat, "lon": settlement.lon}
+    return await _fetch_weather(settlement.name, params, display_name=settlement.name)
+
+
+def weather_from_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Converts a 'weather-topic' record into the weather data cached for the bot.
+
+    Args:
+        record (Dict[str, Any]): A decoded record, see fetch_weather_record()
+
+    Returns:
+        Dict[str, Any]: The weather data in the format of get_weather_by_city()
+    """
+    return {
+        "city": record["city"],
+        "temp": record["temperature"],
+        "feels_like": record.get("feels_like"),
+        "humidity": record["humidity"],
+        "description": record.get("weather_description") or "",
+        "wind_speed": record.get("wind_speed"),
+        "time": datetime.fromtimestamp(record["timestamp"]).strftime("%H:%M")
+    }
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """
+    Returns the hit/miss counters of the weather cache.
+    """
+    return weather_cache.stats()
+
+
+async def _request_weather(city: str, location: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Calls the weather API for one location.
+
+    Args:
+        city (str): The city name as requested, used in logs
+        location (Dict[str, Any]): Location query parameters, either "q" or "lat"/"lon"
+
+    Returns:
+        Dict[str, Any]: The raw API response
+
+    Raises:
+        ValueError: If the API key is not found or if the API returns an error
+    """
+    if not WEATHER_API_KEY:
+        error_msg = "WEATHER_API_KEY не знайдено"
+        logger.critical(error_msg)
+        raise ValueError(error_msg)
+
+    params = {
+        **location,
+        "appid": WEATHER_API_KEY,
+        "units": "metric",
+        "lang": "ua"
+    }
+    logger.debug("Запит погоди для %s: %s", city, location)
+
     try:
-        if not WEATHER_API_KEY:
-            error_msg = "WEATHER_API_KEY не знайдено"
-            logger.critical(error_msg)
-            raise ValueError(error_msg)
-
-        city_mapping = {
-            "київ": "Kyiv",
-            "львів": "Lviv",
-            "харків": "Kharkiv",
-            "одеса": "Odesa",
-            "луцьк": "Lutsk"
-        }
-        normalized_city = city_mapping.get(city.lower(), city)
-        logger.debug(f"Нормалізована назва міста: {normalized_city}")
-
-        params = {
-            "q": f"{normalized_city},UA",
-            "appid": WEATHER_API_KEY,
-            "units": "metric",
-            "lang": "ua"
+        with WEATHER_API_SECONDS.time():
+            status, data = await http_client.get_json(WEATHER_API_URL, params=params)
+    except Exception:
+        WEATHER_API_REQUESTS.labels("failed").inc()
+        raise
+    WEATHER_API_REQUESTS.labels("ok" if status == 200 else "error").inc()
+    logger.debug("Відповідь для %s, статус: %s", city, status)
+
+    if status != 200:
+        message = data.get('message', 'Невідома помилка') if isinstance(data, dict) else 'Невідома помилка'
+        error_msg = f"Помилка API: {message}"
+        logger.error("%s. Статус: %s", error_msg, status)
+        raise ValueError(error_msg)
+    return data
+
+
+async def _fetch_weather(city: str, location: Dict[str, Any], display_name: str = None) -> Dict[str, Any]:
+    """
+    Retrieves and formats the weather for one location.
+
+    Args:
+        city (str): The city name as requested, used in logs
+        location (Dict[str, Any]): Location query parameters, either "q" or "lat"/"lon"
+        display_name (str): Name returned as "city" instead of the one reported by the API
+
+    Returns:
+        Dict[str, Any]: The weather data, or {"error": ...} if the request failed.
+                        See get_weather_by_city() for the structure.
+    """
+    try:
+        data = await _request_weather(city, location)
+        return {
+            "city": display_name or data["name"],
+            "temp": data["main"]["temp"],
+            "feels_like": data["main"]["feels_like"],
+            "humidity": data["main"]["humidity"],
+            "description": data["weather"][0]["description"],
+            "wind_speed": data["wind"]["speed"],
+            "time": datetime.fromtimestamp(data["dt"]).strftime("%H:%M")
         }
-        logger.debug(f"Параметри запиту: {params}")
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(WEATHER_API_URL, params=params) as response:
-                logger.debug(f"Отримано відповідь, статус: {response.status}")
-
-                if response.status != 200:
-                    error_data = await response.json()
-                    error_msg = f"Помилка API: {error_data.get('message', 'Невідома помилка')}"
-                    logger.error(f"{error_msg}. Статус: {response.status}")
-                    raise ValueError(error_msg)
-
-                data = await response.json()
-                logger.debug("Успішно отримано дані погоди")
-                logger.debug(f"Структура відповіді: {data.keys()}")
-
-                return {
-                    "city": data["name"],
-                    "temp": data["main"]["temp"],
-                    "feels_like": data["main"]["feels_like"],
-                    "humidity": data["main"]["humidity"],
-                    "description": data["weather"][0]["description"],
-                    "wind_speed": data["wind"]["speed"],
-                    "time": datetime.fromtimestamp(data["dt"]).strftime("%H:%M")
-                }
 
     except Exception as e:
-        logger.error(f"Критична помилка для міста {city}: {str(e)}", exc_info=True)
+        logger.error("Критична помилка для міста %s: %s", city, e, exc_info=True)
         return {"error": str(e)}
+
+
+async def fetch_weather_record(settlement: Settlement) -> Dict[str, Any]:
+    """
+    Fetches the current weather of a settlement as a 'weather-topic' record.
+
+    Bypasses weather_cache: the producer polls each city on its own schedule.
+
+    Args:
+        settlement (Settlement): The settlement to poll
+
+    Returns:
+        Dict[str, Any]: A record with the following keys:
+            - city: Ukrainian name of the settlement
+            - city_key: Gazetteer key of the settlement
+            - temperature: Temperature in Celsius
+            - feels_like: "Feels like" temperature in Celsius
+            - humidity: Humidity percentage
+            - wind_speed: Wind speed in m/s
+            - weather_description: Weather description
+            - timestamp: Unix time of the observation
+
+    Raises:
+        ValueError: If the API key is not found or if the API returns an error
+    """
+    data = await _request_weather(settlement.name, {"lat": settlement.lat, "lon": settlement.lon})
+    return {
+        "city": settlement.name,
+        "city_key": settlement.key,
+        "temperature": data["main"]["temp"],
+        "feels_like": data["main"]["feels_like"],
+        "humidity": data["main"]["humidity"],
+        "wind_speed": data["wind"]["speed"],
+        "weather_description": data["weather"][0]["description"],
+        "timestamp": data["dt"],
+    }
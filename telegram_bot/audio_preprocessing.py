@@ -0,0 +1,130 @@
+import asyncio
+import io
+import logging
+import os
+from pydub import AudioSegment
+
+logger = logging.getLogger(__name__)
+
+AUDIO_SAMPLE_RATE = int(os.getenv("AUDIO_SAMPLE_RATE", "16000"))
+AUDIO_MAX_DURATION_S = float(os.getenv("AUDIO_MAX_DURATION_S", "15"))
+AUDIO_FRAME_MS = int(os.getenv("AUDIO_FRAME_MS", "20"))
+AUDIO_PADDING_MS = int(os.getenv("AUDIO_PADDING_MS", "150"))
+# A frame counts as speech when it is this many dB above the noise floor...
+AUDIO_VAD_MARGIN_DB = float(os.getenv("AUDIO_VAD_MARGIN_DB", "12"))
+# ...and at least this loud, so a recording of pure room noise is treated as silence
+AUDIO_VAD_MIN_DBFS = float(os.getenv("AUDIO_VAD_MIN_DBFS", "-50"))
+# "ogg": Opus at AUDIO_OPUS_BITRATE, smallest upload; "wav": 16-bit PCM, no lossy re-encode
+STT_UPLOAD_FORMAT = os.getenv("STT_UPLOAD_FORMAT", "ogg")
+AUDIO_OPUS_BITRATE = os.getenv("AUDIO_OPUS_BITRATE", "24k")
+
+
+class PreparedAudio:
+    """
+    Audio ready to be uploaded for transcription.
+
+    Attributes:
+        data (bytes): The encoded audio
+        mimetype (str): MIME type of data
+        duration_ms (int): Duration of the prepared audio
+        original_size (int): Size of the audio before preprocessing, in bytes
+        original_duration_ms (int or None): Duration before preprocessing, None if it could not be decoded
+    """
+
+    def __init__(self, data: bytes, mimetype: str, duration_ms: int, original_size: int,
+                 original_duration_ms: int = None):
+        self.data = data
+        self.mimetype = mimetype
+        self.duration_ms = duration_ms
+        self.original_size = original_size
+        self.original_duration_ms = original_duration_ms
+
+    @property
+    def is_silent(self) -> bool:
+        return self.duration_ms == 0
+
+
+def _speech_bounds(segment: AudioSegment):
+    """
+    Finds the first and last speech frame with a cheap energy-based VAD.
+
+    Args:
+        segment (AudioSegment): Mono audio
+
+    Returns:
+        tuple: (start_ms, end_ms) of the speech, or None if the audio is silent
+    """
+    levels = [
+        segment[position:position + AUDIO_FRAME_MS].dBFS
+        for position in range(0, len(segment), AUDIO_FRAME_MS)
+    ]
+    audible = sorted(level for level in levels if level != float("-inf"))
+    if not audible:
+        return None
+    noise_floor = audible[len(audible) // 10]
+    threshold = max(noise_floor + AUDIO_VAD_MARGIN_DB, AUDIO_VAD_MIN_DBFS)
+    speech = [index for index, level in enumerate(levels) if level >= threshold]
+    if not speech:
+        return None
+    start = max(speech[0] * AUDIO_FRAME_MS - AUDIO_PADDING_MS, 0)
+    end = min((speech[-1] + 1) * AUDIO_FRAME_MS + AUDIO_PADDING_MS, len(segment))
+    return start, end
+
+
+def preprocess_audio(data: bytes, source_format: str = "ogg") -> PreparedAudio:
+    """
+    Prepares a voice note for speech-to-text.
+
+    Decodes the Opus/OGG voice note, downmixes it to mono, resamples it to
+    AUDIO_SAMPLE_RATE, trims leading and trailing silence, caps the duration at
+    AUDIO_MAX_DURATION_S and re-encodes it as STT_UPLOAD_FORMAT.
+    If the audio cannot be decoded it is passed through unchanged.
+
+    This is CPU-bound; use preprocess_audio_async from the event loop.
+
+    Args:
+        data (bytes): The voice note as downloaded from Telegram
+        source_format (str): Container format of data
+
+    Returns:
+        PreparedAudio: The audio to upload
+    """
+    try:
+        segment = AudioSegment.from_file(io.BytesIO(data), format=source_format)
+    except Exception as e:
+        logger.warning("Audio decoding failed, uploading original: %s", e)
+        return PreparedAudio(data, f"audio/{source_format}", None, len(data))
+
+    original_duration = len(segment)
+    segment = segment.set_channels(1).set_frame_rate(AUDIO_SAMPLE_RATE).set_sample_width(2)
+
+    bounds = _speech_bounds(segment)
+    if bounds is None:
+        return PreparedAudio(b"", f"audio/{STT_UPLOAD_FORMAT}", 0, len(data), original_duration)
+    start, end = bounds
+    end = min(end, start + int(AUDIO_MAX_DURATION_S * 1000))
+    segment = segment[start:end]
+
+    output = io.BytesIO()
+    if STT_UPLOAD_FORMAT == "wav":
+        segment.export(output, format="wav")
+    else:
+        segment.export(output, format="ogg", codec="libopus", bitrate=AUDIO_OPUS_BITRATE)
+    return PreparedAudio(output.getvalue(), f"audio/{STT_UPLOAD_FORMAT}", len(segment), len(data), original_duration)
+
+
+async def preprocess_audio_async(data: bytes, source_format: str = "ogg") -> PreparedAudio:
+    """
+    Runs preprocess_audio in a worker thread so the event loop stays responsive.
+
+    Decoding and encoding happen in ffmpeg subprocesses and audioop, both of which
+    release the GIL, so several voice notes can be prepared in parallel.
+
+    Args:
+        data (bytes): The voice note as downloaded from Telegram
+        source_format (str): Container format of data
+
+    Returns:
+        PreparedAudio: The audio to upload
+    """
+    return await asyncio.to_thread(preprocess_audio, data, source_format)
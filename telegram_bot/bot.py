@@ -1,26 +1,61 @@
 import os
 import asyncio
+import hmac
+import signal
+from aiohttp import web
 from aiogram import Bot, Dispatcher, F
-from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, Update
 from aiogram.enums import ContentType
 from aiogram.fsm.storage.memory import MemoryStorage
 import logging
-from voice_handler import handle_voice_query
+from voice_handler import handle_voice_query, get_transcript_cache_stats
+from update_pool import UpdatePool
+from prefetch import weather_prefetcher
+from producer.weather_api_client import start_http_client, close_http_client
+from common.logging_config import configure_logging
+from common.metrics import start_metrics_server
 from dotenv import load_dotenv
 
-# Logging settings
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
+configure_logging("telegram_bot")
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+# "polling" (a single instance) or "webhook" (Telegram pushes updates to WEBHOOK_BASE_URL)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Public HTTPS URL the webhook is registered with; the webhook is left as is when unset
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+# Sent back by Telegram in the X-Telegram-Bot-Api-Secret-Token header of every update
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8081"))
+# Seconds given to queued updates to be answered on shutdown
+BOT_DRAIN_TIMEOUT_S = float(os.getenv("BOT_DRAIN_TIMEOUT_S", "30"))
+# Alternative Bot API server (self-hosted, or a stand-in for benchmarks); api.telegram.org when unset
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+# FSM storage shared by all instances of the bot in webhook mode; in-memory when unset
+BOT_REDIS_URL = os.getenv("BOT_REDIS_URL")
+
+
+def create_storage():
+    """
+    Returns the FSM storage: Redis when BOT_REDIS_URL is set, so that several
+    webhook instances share it, otherwise in-memory.
+    """
+    if BOT_REDIS_URL:
+        from aiogram.fsm.storage.redis import RedisStorage
+        return RedisStorage.from_url(BOT_REDIS_URL)
+    return MemoryStorage()
+
 
 # Initializing the Telegram bot
-bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher(storage=MemoryStorage())
+session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
+bot = Bot(token=BOT_TOKEN, session=session)
+dp = Dispatcher(storage=create_storage())
+update_pool = UpdatePool(lambda update: dp.feed_update(bot, update))
 
 async def download_voice_message(message: Message) -> bytes:
     """
@@ -39,7 +74,7 @@ async def download_voice_message(message: Message) -> bytes:
         file = await bot.download(message.voice.file_id)
         return file.read() if hasattr(file, 'read') else file
     except Exception as e:
-        logger.error(f"Voice download error: {e}")
+        logger.error("Voice download error: %s", e)
         raise
 
 @dp.message(F.content_type == ContentType.VOICE)
@@ -48,35 +83,36 @@ async def voice_message_handler(message: Message):
     Handles voice messages received by the Telegram bot.
 
     This handler:
-    1. Downloads the voice message
-    2. Processes it using the voice handler to extract weather information
-    3. Sends the weather information back to the user
+    1. Processes the voice message using the voice handler to extract weather information
+       (the file is downloaded only if it has not been transcribed before)
+    2. Sends the weather information back to the user
 
     Args:
         message (Message): The Telegram message containing the voice file
     """
     try:
-        logger.info(f"Отримано голосове повідомлення від {message.from_user.id}")
-
-        voice_data = await download_voice_message(message)
-        logger.debug("Отримано голосове повідомлення, починаю обробку.")
+        logger.info("Отримано голосове повідомлення від %s", message.from_user.id)
 
-        result = await handle_voice_query(voice_data)
-        logger.info(f"Результат обробки: {result}")
+        result = await handle_voice_query(
+            file_unique_id=message.voice.file_unique_id,
+            download=lambda: download_voice_message(message),
+        )
+        logger.info("Результат обробки: %s", result)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Transcript cache: %s", get_transcript_cache_stats())
 
         if result.get("status") == "success":
             # We use ready-made formatted text from voice_handler
             await message.answer(result["speech_response"])
         else:
             error_msg = result.get("message", "Невідома помилка")
-            logger.error(f"Помилка обробки: {error_msg}")
+            logger.error("Помилка обробки: %s", error_msg)
             await message.answer(f"❌ {error_msg}")
 
     except asyncio.TimeoutError:
-        error_msg = "Час очікування вичерпано"
-        logger.error(error_msg)
+        logger.warning("Час очікування вичерпано")
         await message.answer("⌛ Перевищено час обробки запиту. Спробуйте ще раз.")
-    except Exception as e:
+    except Exception:
         logger.exception("Критична помилка при обробці повідомлення")
         await message.answer("⚠️ Сталася несподівана помилка. Спробуйте пізніше.")
 
@@ -99,15 +135,108 @@ async def start_command(message: Message):
         parse_mode="Markdown"
     )
 
+def update_user_id(update: Update) -> int:
+    """
+    Returns the id of the user an update comes from, or of its chat when it has no sender.
+    """
+    event = update.event
+    user = getattr(event, "from_user", None)
+    if user is not None:
+        return user.id
+    chat = getattr(event, "chat", None)
+    return chat.id if chat is not None else 0
+
+
+async def handle_webhook(request: web.Request) -> web.Response:
+    """
+    Receives an update pushed by Telegram and queues it in the update pool.
+
+    Telegram is answered right away, before the update is handled: it waits
+    for the answer before sending the next update, and resends updates that
+    are not answered in time. Updates the pool cannot take are dropped with
+    a 200 as well, since resending them would only add to the load.
+
+    Args:
+        request (web.Request): The POST request carrying the update as JSON
+
+    Returns:
+        web.Response: 200 once queued, 401 for a wrong secret, 400 for a malformed update
+    """
+    if WEBHOOK_SECRET and not hmac.compare_digest(
+            request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), WEBHOOK_SECRET):
+        return web.Response(status=401)
+    try:
+        update = Update.model_validate(await request.json(), context={"bot": bot})
+    except ValueError:
+        logger.warning("Malformed update received on the webhook")
+        return web.Response(status=400)
+    update_pool.submit(update_user_id(update), update)
+    return web.Response()
+
+
+async def run_webhook():
+    """
+    Serves the webhook until SIGTERM or SIGINT, then drains the update pool.
+
+    On shutdown the HTTP server stops first, so no new updates are accepted,
+    then the updates already queued are answered for up to BOT_DRAIN_TIMEOUT_S
+    seconds. Updates Telegram had not delivered yet stay on its side and go
+    to the next instance.
+    """
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handle_webhook)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+
+    update_pool.start()
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    logger.info("Serving the webhook on %s:%d%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+    if WEBHOOK_BASE_URL:
+        await bot.set_webhook(
+            WEBHOOK_BASE_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopping.set)
+    try:
+        await stopping.wait()
+    finally:
+        logger.info("Stopping the webhook, %d updates to answer", update_pool.pending)
+        await runner.cleanup()
+        await update_pool.close(BOT_DRAIN_TIMEOUT_S)
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await dp.storage.close()
+        await bot.session.close()
+
+
 async def main():
     """
-    Starts the Telegram bot and begins polling for messages.
+    Starts the Telegram bot in polling or webhook mode, depending on BOT_MODE.
 
     This is the main entry point for the bot application.
+    The pooled weather API client, the metrics endpoint and the weather
+    prefetcher are started before the bot and stopped when it stops.
     The function runs until interrupted or an error occurs.
     """
     logger.info("Запуск бота...")
-    await dp.start_polling(bot)
+    await start_http_client()
+    metrics_server = await start_metrics_server()
+    await weather_prefetcher.start()
+    try:
+        if BOT_MODE == "webhook":
+            await run_webhook()
+        else:
+            await dp.start_polling(bot)
+    finally:
+        await weather_prefetcher.stop()
+        if metrics_server:
+            metrics_server.close()
+        await close_http_client()
     logger.info("Бот зупинено")
 
 if __name__ == "__main__":
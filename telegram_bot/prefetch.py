@@ -0,0 +1,260 @@
+import asyncio
+import heapq
+import logging
+import math
+import os
+import time
+from aiokafka import AIOKafkaConsumer
+from common.metrics import counter, gauge
+from common.weather_record import RecordError, decode_record
+from producer.gazetteer import get_gazetteer
+from producer.rate_limit import TokenBucket
+from producer.weather_api_client import (
+    WEATHER_CACHE_TTL_S, fetch_weather_for_settlement, weather_cache, weather_from_record,
+)
+
+logger = logging.getLogger(__name__)
+
+# Cities kept warm in the weather cache; 0 disables prefetching
+PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", "20"))
+# A query counts half as much after this many seconds
+PREFETCH_HALF_LIFE_S = float(os.getenv("PREFETCH_HALF_LIFE_S", "3600"))
+# Decayed query count below which a city is not worth an API call
+PREFETCH_MIN_SCORE = float(os.getenv("PREFETCH_MIN_SCORE", "2"))
+# Entries are refreshed when they expire within this many seconds; keep it above PREFETCH_INTERVAL_S
+PREFETCH_LEAD_S = float(os.getenv("PREFETCH_LEAD_S", "60"))
+PREFETCH_INTERVAL_S = float(os.getenv("PREFETCH_INTERVAL_S", "15"))
+# Weather API calls per minute the prefetcher may spend, on top of the users' own lookups
+PREFETCH_CALLS_PER_MIN = float(os.getenv("PREFETCH_CALLS_PER_MIN", "5"))
+# Cities whose query counts are tracked
+PREFETCH_MAX_TRACKED = int(os.getenv("PREFETCH_MAX_TRACKED", "10000"))
+# Kafka the producer publishes to; records of popular cities are cached as they arrive. Not consumed when unset
+KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS")
+KAFKA_TOPIC = os.getenv("KAFKA_TOPIC", "weather-topic")
+
+PREFETCH_REFRESHES = counter("weather_prefetch_refreshes_total", "Weather cache entries refreshed ahead of expiry, "
+                             "by outcome", ("outcome",))
+PREFETCH_RECORDS = counter("weather_prefetch_records_total", "Weather topic records seen by the prefetcher, "
+                           "by outcome", ("outcome",))
+
+
+class PopularityTracker:
+    """
+    Counts queries per city with exponential decay.
+
+    Every query adds 1 to the city's score, and scores halve every
+    half_life_s seconds, so the ranking follows what is asked now rather
+    than what was asked since startup. Scores are decayed lazily, when a
+    city is queried or the ranking is read.
+    """
+
+    def __init__(self, half_life_s: float = PREFETCH_HALF_LIFE_S, max_size: int = PREFETCH_MAX_TRACKED):
+        """
+        Args:
+            half_life_s (float): Seconds after which a query counts half as much
+            max_size (int): Cities tracked before the least popular are forgotten
+        """
+        self._decay = math.log(2) / half_life_s
+        self._max_size = max_size
+        self._scores = {}
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def _score(self, key: str, now: float) -> float:
+        score, updated = self._scores.get(key, (0.0, now))
+        return score * math.exp(-self._decay * (now - updated))
+
+    def record(self, key: str, weight: float = 1.0):
+        """
+        Counts a query for the city with the given gazetteer key.
+        """
+        now = time.monotonic()
+        self._scores[key] = (self._score(key, now) + weight, now)
+        if len(self._scores) > self._max_size:
+            self._prune(now)
+
+    def top(self, count: int, min_score: float = 0.0) -> list:
+        """
+        Returns the most queried cities, most popular first.
+
+        Args:
+            count (int): Maximum number of cities
+            min_score (float): Decayed score a city needs to be included
+
+        Returns:
+            list: (key, score) pairs
+        """
+        now = time.monotonic()
+        scores = ((key, self._score(key, now)) for key in self._scores)
+        return [(key, score) for key, score in heapq.nlargest(count, scores, key=lambda item: item[1])
+                if score >= min_score]
+
+    def _prune(self, now: float):
+        # Keeps the most popular three quarters, so pruning does not run on every new city
+        keep = heapq.nlargest(self._max_size * 3 // 4, self._scores, key=lambda key: self._score(key, now))
+        self._scores = {key: self._scores[key] for key in keep}
+
+
+class WeatherPrefetcher:
+    """
+    Keeps the weather of the most queried cities in weather_cache, so their
+    queries are answered from memory.
+
+    Every PREFETCH_INTERVAL_S seconds the PREFETCH_TOP_N most popular cities
+    whose cache entry is missing or expires within PREFETCH_LEAD_S are
+    fetched again, most popular first, as long as the PREFETCH_CALLS_PER_MIN
+    budget allows; the rest wait for the next round. A failed refresh keeps
+    the entry that is still cached.
+
+    When KAFKA_BOOTSTRAP_SERVERS is set, the records the producer publishes
+    for these cities are cached as they arrive, for the rest of their TTL
+    counted from publication. The producer polls every city anyway, so popular
+    cities usually stay fresh without any call of our own.
+    """
+
+    def __init__(self, popularity: PopularityTracker, top_n: int = PREFETCH_TOP_N,
+                 calls_per_min: float = PREFETCH_CALLS_PER_MIN, lead_s: float = PREFETCH_LEAD_S,
+                 interval_s: float = PREFETCH_INTERVAL_S, min_score: float = PREFETCH_MIN_SCORE,
+                 consumer_factory=AIOKafkaConsumer):
+        """
+        Args:
+            popularity (PopularityTracker): Query counts of the cities
+            top_n (int): Cities kept warm
+            calls_per_min (float): Weather API calls per minute the prefetcher may spend
+            lead_s (float): Seconds before expiry at which an entry is refreshed
+            interval_s (float): Seconds between refresh rounds
+            min_score (float): Decayed query count a city needs to be kept warm
+            consumer_factory: Called like AIOKafkaConsumer to create the Kafka client
+        """
+        self.popularity = popularity
+        self.top_n = top_n
+        self.lead_s = lead_s
+        self.interval_s = interval_s
+        self.min_score = min_score
+        self.bucket = TokenBucket(rate=calls_per_min / 60, capacity=max(1.0, calls_per_min / 60 * interval_s))
+        self.hot_keys = set()
+        self._consumer_factory = consumer_factory
+        self._consumer = None
+        self._tasks = []
+
+        # Every hot city refreshed once per TTL, if the producer does not cover it
+        required_per_min = top_n * 60 / max(WEATHER_CACHE_TTL_S - lead_s, 1)
+        if top_n and required_per_min > calls_per_min:
+            logger.warning(
+                "Keeping %d cities warm needs up to %.1f calls/min but the budget is %.1f; "
+                "the least popular will expire", top_n, required_per_min, calls_per_min,
+            )
+        gauge("weather_prefetch_hot_cities", "Cities currently kept warm").set_function(lambda: len(self.hot_keys))
+        gauge("weather_prefetch_tracked_cities", "Cities with a query count").set_function(lambda: len(popularity))
+
+    async def start(self):
+        """
+        Starts the refresh loop and, with KAFKA_BOOTSTRAP_SERVERS set, the weather topic reader.
+        """
+        if self.top_n <= 0:
+            return
+        self._tasks.append(asyncio.create_task(self._refresh_loop(), name="weather-prefetch"))
+        if KAFKA_BOOTSTRAP_SERVERS:
+            # No group: every bot instance reads every partition from the end and never commits
+            self._consumer = self._consumer_factory(
+                KAFKA_TOPIC,
+                bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+                group_id=None,
+                auto_offset_reset="latest",
+                enable_auto_commit=False,
+            )
+            await self._consumer.start()
+            self._tasks.append(asyncio.create_task(self._consume(), name="weather-prefetch-kafka"))
+        logger.info("Prefetching the weather of up to %d popular cities", self.top_n)
+
+    async def stop(self):
+        """
+        Stops refreshing and disconnects from Kafka. Entries already cached stay.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._consumer:
+            await self._consumer.stop()
+            self._consumer = None
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Weather prefetch round failed")
+            await asyncio.sleep(self.interval_s)
+
+    async def refresh(self):
+        """
+        Runs one refresh round over the currently most popular cities.
+        """
+        hot = self.popularity.top(self.top_n, self.min_score)
+        self.hot_keys = {key for key, _ in hot}
+        gazetteer = get_gazetteer()
+        for key, _ in hot:
+            expires_at = await weather_cache.expires_at(key)
+            if expires_at is not None and expires_at - time.time() > self.lead_s:
+                continue
+            settlement = gazetteer.get(key)
+            if settlement is None:
+                continue
+            if not self.bucket.try_acquire():
+                PREFETCH_REFRESHES.labels("over_budget").inc()
+                logger.debug("Prefetch budget spent, %s waits for the next round", key)
+                return
+            weather = await fetch_weather_for_settlement(settlement)
+            if weather_cache.is_negative(weather):
+                PREFETCH_REFRESHES.labels("error").inc()
+                continue
+            await weather_cache.put(key, weather)
+            PREFETCH_REFRESHES.labels("ok").inc()
+
+    async def cache_record(self, record: dict, published_at: float):
+        """
+        Caches a weather topic record if its city is kept warm and it is newer than the cached entry.
+
+        Args:
+            record (dict): The decoded record
+            published_at (float): Unix time the record was published at
+        """
+        key = record.get("city_key")
+        if key not in self.hot_keys:
+            PREFETCH_RECORDS.labels("cold").inc()
+            return
+        ttl = WEATHER_CACHE_TTL_S - (time.time() - published_at)
+        expires_at = await weather_cache.expires_at(key)
+        if ttl <= 0 or (expires_at is not None and expires_at >= time.time() + ttl):
+            PREFETCH_RECORDS.labels("stale").inc()
+            return
+        await weather_cache.put(key, weather_from_record(record), ttl)
+        PREFETCH_RECORDS.labels("cached").inc()
+
+    async def _consume(self):
+        while True:
+            try:
+                polled = await self._consumer.getmany(timeout_ms=1000)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Reading the weather topic failed")
+                await asyncio.sleep(1)
+                continue
+            for messages in polled.values():
+                for message in messages:
+                    try:
+                        record = decode_record(message.value)
+                    except RecordError as e:
+                        PREFETCH_RECORDS.labels("invalid").inc()
+                        logger.debug("Skipping weather record at offset %d: %s", message.offset, e)
+                        continue
+                    await self.cache_record(record, message.timestamp / 1000)
+
+
+city_popularity = PopularityTracker()
+weather_prefetcher = WeatherPrefetcher(city_popularity)
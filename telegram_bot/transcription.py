@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+STT_MAX_CONCURRENCY = int(os.getenv("STT_MAX_CONCURRENCY", "4"))
+STT_MAX_QUEUE = int(os.getenv("STT_MAX_QUEUE", "32"))
+STT_TIMEOUT_S = float(os.getenv("STT_TIMEOUT_S", "30"))
+
+
+class TranscriptionOverloaded(Exception):
+    """
+    Raised when the transcription queue is full and a request is rejected.
+    """
+
+
+class TranscriptionStage:
+    """
+    Bounded, non-blocking stage in front of the speech-to-text service.
+
+    At most max_concurrency transcriptions run at once and at most max_queue more
+    wait for a slot; anything beyond that is rejected immediately with
+    TranscriptionOverloaded instead of piling up behind a slow upstream.
+    Each call is limited to timeout seconds, including time spent waiting.
+    """
+
+    def __init__(self, max_concurrency: int = STT_MAX_CONCURRENCY, max_queue: int = STT_MAX_QUEUE,
+                 timeout: float = STT_TIMEOUT_S):
+        """
+        Args:
+            max_concurrency (int): Number of transcriptions allowed in flight
+            max_queue (int): Number of requests allowed to wait for a free slot
+            timeout (float): Seconds a request may take end to end
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.rejected = 0
+        self._pending = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of requests currently running or waiting.
+        """
+        return self._pending
+
+    async def run(self, transcribe, *args, **kwargs):
+        """
+        Runs one transcription through the stage.
+
+        Args:
+            transcribe: Coroutine function performing the transcription
+            *args: Positional arguments for transcribe
+            **kwargs: Keyword arguments for transcribe
+
+        Returns:
+            The result of transcribe
+
+        Raises:
+            TranscriptionOverloaded: If the stage is already at capacity
+            asyncio.TimeoutError: If the request did not finish within the timeout
+        """
+        if self._pending >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            logger.warning("Transcription rejected, %d requests pending", self._pending)
+            raise TranscriptionOverloaded()
+
+        self._pending += 1
+        try:
+            return await asyncio.wait_for(self._run_limited(transcribe, *args, **kwargs), self.timeout)
+        finally:
+            self._pending -= 1
+
+    async def _run_limited(self, transcribe, *args, **kwargs):
+        async with self._semaphore:
+            return await transcribe(*args, **kwargs)
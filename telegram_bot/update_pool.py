@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from common.metrics import counter, gauge, histogram
+from producer.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "16"))
+# Updates accepted but not yet handled, across all users
+BOT_MAX_PENDING_UPDATES = int(os.getenv("BOT_MAX_PENDING_UPDATES", "1000"))
+# Updates one user may have waiting; more are dropped
+BOT_USER_QUEUE_SIZE = int(os.getenv("BOT_USER_QUEUE_SIZE", "5"))
+# Updates per minute handled for one user, with bursts of BOT_USER_BURST
+BOT_USER_RATE_PER_MIN = float(os.getenv("BOT_USER_RATE_PER_MIN", "20"))
+BOT_USER_BURST = float(os.getenv("BOT_USER_BURST", "3"))
+
+BOT_UPDATES = counter("bot_updates_total", "Telegram updates by outcome", ("outcome",))
+BOT_RATE_LIMITED = counter("bot_user_rate_limited_total", "Times a user's next update was delayed by their rate limit")
+BOT_UPDATE_WAIT_SECONDS = histogram("bot_update_wait_seconds", "Time an update waited for a worker")
+BOT_UPDATE_SECONDS = histogram("bot_update_seconds", "Time to handle an update")
+
+
+class _UserQueue:
+    """
+    Updates of one user waiting for a worker, with the user's rate limit.
+
+    Attributes:
+        updates (deque): (update, accepted at) pairs, oldest first
+        bucket (TokenBucket): The user's rate limit
+        active (bool): Whether a worker is handling one of the user's updates
+        scheduled (bool): Whether the user is in the ready queue or waiting for a token
+        idle_since (float): Monotonic time the user's last update was handled
+    """
+
+    __slots__ = ("updates", "bucket", "active", "scheduled", "idle_since")
+
+    def __init__(self, rate: float, burst: float):
+        self.updates = deque()
+        self.bucket = TokenBucket(rate=rate, capacity=burst)
+        self.active = False
+        self.scheduled = False
+        self.idle_since = time.monotonic()
+
+
+class UpdatePool:
+    """
+    Bounded pool of workers handling Telegram updates fairly across users.
+
+    Every user has a small FIFO queue of their own. Workers take users in
+    round-robin order from a ready queue, one update at a time, and a user
+    holds at most one worker at once, so a user sending many voice notes
+    gets their replies in order without making anyone else wait for all of
+    them. Each user is also limited to BOT_USER_RATE_PER_MIN updates per
+    minute: beyond that their updates wait, and beyond BOT_USER_QUEUE_SIZE
+    waiting updates they are dropped.
+    """
+
+    def __init__(self, handler, workers: int = BOT_WORKERS, max_pending: int = BOT_MAX_PENDING_UPDATES,
+                 user_queue_size: int = BOT_USER_QUEUE_SIZE, user_rate_per_min: float = BOT_USER_RATE_PER_MIN,
+                 user_burst: float = BOT_USER_BURST):
+        """
+        Args:
+            handler: Coroutine function handling one update
+            workers (int): Updates handled at once
+            max_pending (int): Updates accepted but not yet handled, across all users
+            user_queue_size (int): Updates one user may have waiting
+            user_rate_per_min (float): Updates per minute handled for one user
+            user_burst (float): Updates one user may send at once before being rate limited
+        """
+        self._handler = handler
+        self._workers = workers
+        self._max_pending = max_pending
+        self._user_queue_size = user_queue_size
+        self._user_rate = user_rate_per_min / 60
+        self._user_burst = user_burst
+        self._users = {}
+        self._ready = asyncio.Queue()
+        self._tasks = []
+        self._pending = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._closed = False
+        self._prune_at = 1024
+        gauge("bot_updates_pending", "Updates accepted but not yet handled").set_function(lambda: self._pending)
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._work(), name=f"update-worker-{index}")
+                       for index in range(self._workers)]
+
+    def submit(self, user_id: int, update) -> bool:
+        """
+        Queues an update for its user without waiting.
+
+        Args:
+            user_id (int): The user the update comes from
+            update: The update, passed to the handler as is
+
+        Returns:
+            bool: False if the update was dropped because the pool is closing or full
+        """
+        if self._closed or self._pending >= self._max_pending:
+            BOT_UPDATES.labels("rejected").inc()
+            logger.warning("Dropping update of user %s: %d updates pending", user_id, self._pending)
+            return False
+        state = self._users.get(user_id)
+        if state is None:
+            if len(self._users) >= self._prune_at:
+                self._prune()
+            state = self._users[user_id] = _UserQueue(self._user_rate, self._user_burst)
+        if len(state.updates) >= self._user_queue_size:
+            BOT_UPDATES.labels("user_overflow").inc()
+            logger.debug("Dropping update of user %s: %d of their updates waiting", user_id, len(state.updates))
+            return False
+
+        state.updates.append((update, time.monotonic()))
+        self._pending += 1
+        self._idle.clear()
+        BOT_UPDATES.labels("accepted").inc()
+        self._schedule(user_id, state)
+        return True
+
+    def _schedule(self, user_id: int, state: _UserQueue):
+        if state.active or state.scheduled or not state.updates:
+            return
+        state.scheduled = True
+        delay = state.bucket.delay()
+        if delay:
+            BOT_RATE_LIMITED.inc()
+            asyncio.get_running_loop().call_later(delay, self._retry, user_id, state)
+            return
+        state.bucket.try_acquire()
+        self._ready.put_nowait(user_id)
+
+    def _retry(self, user_id: int, state: _UserQueue):
+        state.scheduled = False
+        self._schedule(user_id, state)
+
+    def _prune(self):
+        # Users whose bucket has refilled completely carry no state worth keeping
+        now = time.monotonic()
+        refill_s = self._user_burst / self._user_rate
+        for user_id, state in list(self._users.items()):
+            if not (state.updates or state.active or state.scheduled) and now - state.idle_since >= refill_s:
+                del self._users[user_id]
+        self._prune_at = max(1024, 2 * len(self._users))
+
+    async def _work(self):
+        while True:
+            user_id = await self._ready.get()
+            state = self._users[user_id]
+            state.scheduled = False
+            state.active = True
+            update, accepted_at = state.updates.popleft()
+            BOT_UPDATE_WAIT_SECONDS.observe(time.monotonic() - accepted_at)
+            try:
+                with BOT_UPDATE_SECONDS.time():
+                    await self._handler(update)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                BOT_UPDATES.labels("failed").inc()
+                logger.exception("Handling an update of user %s failed", user_id)
+            finally:
+                state.active = False
+                state.idle_since = time.monotonic()
+                self._pending -= 1
+                if not self._pending:
+                    self._idle.set()
+                self._schedule(user_id, state)
+
+    async def close(self, timeout: float):
+        """
+        Stops accepting updates, waits for the queued ones to be handled, then stops the workers.
+
+        Args:
+            timeout (float): Maximum number of seconds to wait for the queues to drain
+        """
+        self._closed = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Update pool did not drain within %.1f s, %d updates dropped", timeout, self._pending)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -1,18 +1,32 @@
 import os
+import asyncio
+import hashlib
 import logging
 from dotenv import load_dotenv
-from deepgram import DeepgramClient, PrerecordedOptions
-from producer.weather_api_client import get_weather_by_city
+from deepgram import DeepgramClient, DeepgramClientOptions, PrerecordedOptions
+from transcription import TranscriptionStage, TranscriptionOverloaded
+from audio_preprocessing import preprocess_audio_async
+from prefetch import city_popularity
+from common.metrics import counter, gauge, histogram
+from producer.cache import TTLCache, InMemoryBackend, SQLiteBackend
+from producer.gazetteer import get_gazetteer
+from producer.weather_api_client import get_weather_for_settlement
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+TRANSCRIPT_CACHE_TTL_S = float(os.getenv("TRANSCRIPT_CACHE_TTL_S", str(7 * 24 * 3600)))
+TRANSCRIPT_CACHE_MAX_SIZE = int(os.getenv("TRANSCRIPT_CACHE_MAX_SIZE", "10000"))
+# Path of a SQLite file to keep the cache across restarts; in-memory only when unset
+TRANSCRIPT_CACHE_PATH = os.getenv("TRANSCRIPT_CACHE_PATH")
+# Alternative Deepgram endpoint (self-hosted, or a stand-in for benchmarks); api.deepgram.com when unset
+DEEPGRAM_API_URL = os.getenv("DEEPGRAM_API_URL")
+
+# Stages: download, preprocess, stt, city_resolution, weather_api, and total for the whole reply
+VOICE_STAGE_SECONDS = histogram("voice_stage_seconds", "Time spent in each stage of a voice reply", ("stage",))
+VOICE_REPLIES = counter("voice_replies_total", "Voice messages answered, by result", ("result",))
+
 
 class VoiceHandler:
     """
@@ -37,23 +51,34 @@ class VoiceHandler:
             raise ValueError("DEEPGRAM_API_KEY is missing")
 
         try:
-            self.deepgram = DeepgramClient(api_key)
+            config = DeepgramClientOptions(url=DEEPGRAM_API_URL) if DEEPGRAM_API_URL else None
+            self.deepgram = DeepgramClient(api_key, config)
             self.content_type = "audio/ogg"
+            self.transcription = TranscriptionStage()
             logger.info("Deepgram client initialized successfully")
         except Exception as e:
-            logger.error(f"Deepgram initialization error: {str(e)}")
+            logger.error("Deepgram initialization error: %s", e)
             raise
 
-        # Previously known Ukrainian cities
-        self.ukrainian_cities = [
-            "київ", "львів", "харків", "одеса", "дніпро", "вінниця",
-            "луцьк", "житомир", "ужгород", "тернопіль", "чернівці", "миколаїв",
-            "чернігів", "черкаси", "суми", "полтава", "івано-франківськ", "хмельницький"
-        ]
+        # Audio identity -> transcript and resolved settlement, so repeated or forwarded
+        # voice notes skip the download and the STT call
+        if TRANSCRIPT_CACHE_PATH:
+            backend = SQLiteBackend(TRANSCRIPT_CACHE_PATH, max_size=TRANSCRIPT_CACHE_MAX_SIZE)
+        else:
+            backend = InMemoryBackend(max_size=TRANSCRIPT_CACHE_MAX_SIZE)
+        self.transcript_cache = TTLCache(backend=backend, ttl=TRANSCRIPT_CACHE_TTL_S)
+
+        # Preloaded so that the first voice message does not pay for building the index
+        self.gazetteer = get_gazetteer()
+        logger.info("Gazetteer loaded with %d settlements", len(self.gazetteer))
 
     async def _transcribe_audio(self, audio_data: bytes):
         """
-        Transcribes audio data to text using Deepgram API.
+        Transcribes audio data to text using the asynchronous Deepgram API client.
+
+        The audio is preprocessed (mono 16 kHz, silence trimmed, duration capped) and
+        uploaded through the bounded transcription stage, so neither step blocks
+        the event loop and concurrent voice messages are limited and queued.
 
         Args:
             audio_data (bytes): The binary audio data to transcribe
@@ -61,22 +86,15 @@ class VoiceHandler:
         Returns:
             str or None: The transcribed text if successful, None otherwise
 
+        Raises:
+            TranscriptionOverloaded: If too many transcriptions are already pending
+            asyncio.TimeoutError: If the transcription did not finish in time
+
         Note:
             Uses Ukrainian language model for transcription
         """
         try:
-            source = {"buffer": audio_data, "mimetype": self.content_type}
-            options = PrerecordedOptions(
-                model="nova-2",
-                language="uk",
-                punctuate=True,
-                smart_format=True,
-                detect_entities=True,
-                diarize=False,
-                encoding="linear16"
-            )
-
-            response = self.deepgram.listen.prerecorded.v("1").transcribe_file(source, options)
+            response = await self.transcription.run(self._prepare_and_transcribe, audio_data)
 
             if not response or not hasattr(response, 'results'):
                 logger.error("Empty or invalid response from Deepgram API")
@@ -86,23 +104,82 @@ class VoiceHandler:
             alternative = channel.alternatives[0]
             transcript = alternative.transcript
 
-            logger.info(f"Transcript: {transcript}")
+            logger.info("Transcript: %s", transcript)
             return transcript
 
+        except (TranscriptionOverloaded, asyncio.TimeoutError):
+            raise
         except Exception as e:
-            logger.error(f"Transcription error: {str(e)}", exc_info=True)
+            logger.error("Transcription error: %s", e, exc_info=True)
             return None
 
-    async def _resolve_city_and_get_weather(self, transcript: str):
+    async def _prepare_and_transcribe(self, audio_data: bytes):
         """
-        Attempts to identify a city name from the transcript and retrieve weather data.
+        Preprocesses the audio in a worker thread and uploads it to Deepgram.
+
+        Args:
+            audio_data (bytes): The voice note as downloaded from Telegram
 
-        The method uses two approaches:
-        1. First tries to use the entire transcript as a city name
-        2. If that fails, searches for known Ukrainian city names within the transcript
+        Returns:
+            The Deepgram response, or None if the recording contains no speech
+        """
+        with VOICE_STAGE_SECONDS.labels("preprocess").time():
+            prepared = await preprocess_audio_async(audio_data, self.content_type.split("/")[1])
+        if prepared.is_silent:
+            logger.info("Voice message contains no speech, skipping transcription")
+            return None
+        logger.debug("Prepared audio: %s -> %d bytes, %s -> %s ms", prepared.original_size, len(prepared.data),
+                     prepared.original_duration_ms, prepared.duration_ms)
+
+        source = {"buffer": prepared.data, "mimetype": prepared.mimetype}
+        # The upload is a self-describing container, so no raw encoding is declared
+        options = PrerecordedOptions(
+            model="nova-2",
+            language="uk",
+            punctuate=True,
+            smart_format=True,
+            detect_entities=True,
+            diarize=False,
+        )
+        with VOICE_STAGE_SECONDS.labels("stt").time():
+            return await self.deepgram.listen.asyncrest.v("1").transcribe_file(source, options)
+
+    async def _recognize(self, audio_data: bytes = None, download=None):
+        """
+        Downloads (if needed) and transcribes a voice message and resolves the city in it.
+
+        Args:
+            audio_data (bytes): The binary audio data, if already available
+            download: Coroutine function returning the audio data otherwise
+
+        Returns:
+            dict or None: {"transcript": str, "city_key": str or None}, or None if
+                          nothing could be recognized
+        """
+        if audio_data is None:
+            with VOICE_STAGE_SECONDS.labels("download").time():
+                audio_data = await download()
+        transcript = await self._transcribe_audio(audio_data)
+        if not transcript:
+            return None
+        # Timed once per reply, by _resolve_city_and_get_weather()
+        settlement = self.gazetteer.match(transcript)
+        return {"transcript": transcript, "city_key": settlement.key if settlement else None}
+
+    async def _resolve_city_and_get_weather(self, transcript: str, city_key: str = None):
+        """
+        Identifies the settlement named in the transcript and retrieves its weather data.
+
+        The settlement is resolved offline through the gazetteer, which tolerates case,
+        inflection ("у Львові") and small recognition errors. Exactly one weather API
+        call is made, by the settlement's coordinates, and only if a settlement was found.
+        The query is counted towards the settlement's popularity, which decides the
+        cities the prefetcher keeps warm.
 
         Args:
             transcript (str): The transcribed text to analyze
+            city_key (str): Key of the settlement already resolved from this transcript, if any;
+                            the transcript is matched again if the gazetteer no longer has it
 
         Returns:
             tuple: A tuple containing (city_name, weather_data) if successful,
@@ -111,25 +188,25 @@ class VoiceHandler:
         if not transcript:
             return None, None
 
-        text = transcript.replace('.', '').strip().lower()
+        with VOICE_STAGE_SECONDS.labels("city_resolution").time():
+            # A cached key may no longer exist once the gazetteer is reloaded
+            settlement = self.gazetteer.get(city_key) if city_key else None
+            if settlement is None:
+                settlement = self.gazetteer.match(transcript)
+        if not settlement:
+            logger.info("No settlement found in transcript: %s", transcript)
+            return None, None
+        city_popularity.record(settlement.key)
 
-        # Attempt 1: we assume that the entire text is the name of the city
-        direct_city = text
-        weather = await get_weather_by_city(direct_city)
+        with VOICE_STAGE_SECONDS.labels("weather_api").time():
+            weather = await get_weather_for_settlement(settlement)
         if weather and "temp" in weather:
-            return direct_city.capitalize(), weather
-
-        # Attempt 2: Search in a list of cities
-        for city in self.ukrainian_cities:
-            if city in text:
-                city_name = city.capitalize()
-                weather = await get_weather_by_city(city_name)
-                if weather and "temp" in weather:
-                    return city_name, weather
+            return settlement.name, weather
 
         return None, None
 
-    async def process_voice(self, audio_data: bytes):
+    @VOICE_STAGE_SECONDS.labels("total").time()
+    async def process_voice(self, audio_data: bytes = None, file_unique_id: str = None, download=None):
         """
         Processes voice data to extract weather information for a city.
 
@@ -139,8 +216,15 @@ class VoiceHandler:
         3. Retrieves weather data for the identified city
         4. Formats the response
 
+        Steps 1 and 2 are cached by audio identity: the Telegram file_unique_id when
+        given, otherwise a hash of the audio. A repeated voice note skips the download
+        and the STT call; its weather is still fetched through the normal path.
+
         Args:
             audio_data (bytes): The binary audio data to process
+            file_unique_id (str): Telegram's stable identifier of the voice file
+            download: Coroutine function returning the audio data, called only on a cache miss
+                      (required when audio_data is not given)
 
         Returns:
             dict: A dictionary containing the processing results with the following structure:
@@ -160,16 +244,25 @@ class VoiceHandler:
                   }
         """
         try:
-            transcript = await self._transcribe_audio(audio_data)
-            if not transcript:
+            if file_unique_id:
+                cache_key = f"tg:{file_unique_id}"
+            else:
+                cache_key = f"sha256:{hashlib.sha256(audio_data).hexdigest()}"
+            recognized = await self.transcript_cache.get_or_load(
+                cache_key, lambda: self._recognize(audio_data, download)
+            )
+            if not recognized:
+                VOICE_REPLIES.labels("unrecognized").inc()
                 return {
                     "status": "error",
                     "message": "Не вдалося розпізнати аудіо. Спробуйте ще раз",
                     "recognized_text": None
                 }
 
-            city, weather = await self._resolve_city_and_get_weather(transcript)
+            transcript = recognized["transcript"]
+            city, weather = await self._resolve_city_and_get_weather(transcript, recognized["city_key"])
             if not city or not weather:
+                VOICE_REPLIES.labels("no_city").inc()
                 return {
                     "status": "error",
                     "message": "Не вдалося визначити місто або отримати погоду. Спробуйте іншу назву",
@@ -186,6 +279,7 @@ class VoiceHandler:
                 f"🕒 Оновлено: {weather.get('time', 'N/A')}"
             )
 
+            VOICE_REPLIES.labels("success").inc()
             return {
                 "status": "success",
                 "city": city,
@@ -194,8 +288,24 @@ class VoiceHandler:
                 "speech_response": response_text
             }
 
+        except TranscriptionOverloaded:
+            VOICE_REPLIES.labels("overloaded").inc()
+            return {
+                "status": "error",
+                "message": "Забагато запитів одночасно. Спробуйте за хвилину",
+                "recognized_text": None
+            }
+        except asyncio.TimeoutError:
+            logger.warning("Transcription timed out")
+            VOICE_REPLIES.labels("timeout").inc()
+            return {
+                "status": "error",
+                "message": "Розпізнавання зайняло забагато часу. Спробуйте ще раз",
+                "recognized_text": None
+            }
         except Exception as e:
-            logger.error(f"Critical error: {str(e)}", exc_info=True)
+            logger.error("Critical error: %s", e, exc_info=True)
+            VOICE_REPLIES.labels("failed").inc()
             return {
                 "status": "error",
                 "message": "Технічна помилка. Спробуйте пізніше",
@@ -204,9 +314,12 @@ class VoiceHandler:
 
 
 voice_handler = VoiceHandler()
+gauge("stt_pending", "Transcriptions running or waiting for a slot").set_function(
+    lambda: voice_handler.transcription.pending
+)
 
 
-async def handle_voice_query(audio_data: bytes):
+async def handle_voice_query(audio_data: bytes = None, file_unique_id: str = None, download=None):
     """
     A convenience function that processes voice data using the singleton VoiceHandler instance.
 
@@ -214,9 +327,18 @@ async def handle_voice_query(audio_data: bytes):
 
     Args:
         audio_data (bytes): The binary audio data to process
+        file_unique_id (str): Telegram's stable identifier of the voice file
+        download: Coroutine function returning the audio data on a cache miss
 
     Returns:
         dict: The result of voice processing. See VoiceHandler.process_voice() for details
               on the return value structure.
     """
-    return await voice_handler.process_voice(audio_data)
+    return await voice_handler.process_voice(audio_data, file_unique_id=file_unique_id, download=download)
+
+
+def get_transcript_cache_stats() -> dict:
+    """
+    Returns the hit/miss counters of the transcript cache.
+    """
+    return voice_handler.transcript_cache.stats()